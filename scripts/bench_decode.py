@@ -0,0 +1,55 @@
+# Benchmark JSON decoder backends on typical source payload shapes
+
+import json
+import time
+import random
+
+from tosser import decoder
+
+ROUNDS = 5
+RECORDS = 20000
+
+
+def _payloads():
+    """Encoded documents by shape name"""
+
+    rng = random.Random(0)
+    records = [
+        {
+            'id': i,
+            'status': ['new', 'open', 'closed'][i % 3],
+            'amount': round(rng.random() * 1000, 2),
+            'user': {'name': f'user {i}', 'email': f'user{i}@example.com', 'address': {'city': 'x', 'zip': f'{i:05d}'}},
+            'tags': ['a', 'b', 'c'][:i % 4],
+        }
+        for i in range(RECORDS)
+    ]
+    return {
+        'records': json.dumps({'metadata': {}, 'data': records}).encode('utf-8'),
+        'wide': json.dumps({'metadata': {}, 'data': {f'field_{i}': f'value_{i}' for i in range(RECORDS)}}).encode('utf-8'),
+        'numeric': json.dumps({'metadata': {}, 'data': {'readings': [rng.random() for _ in range(RECORDS * 10)]}}).encode('utf-8'),
+        'nested': json.dumps({'metadata': {}, 'data': [[[{'v': i}]] for i in range(RECORDS)]}).encode('utf-8'),
+    }
+
+
+def bench(name: str, payload: bytes) -> float:
+    """Return MB/s decoding `payload` with backend `name`"""
+
+    decoder.set_decoder(name)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        decoder.loads(payload)
+    elapsed = time.perf_counter() - start
+    return len(payload) * ROUNDS / elapsed / 1e6
+
+
+def main():
+    payloads = _payloads()
+    names = decoder.available_decoders()
+    print(f'{"shape":<10}' + ''.join(f'{name:>12}' for name in names) + '    MB/s')
+    for shape, payload in payloads.items():
+        print(f'{shape:<10}' + ''.join(f'{bench(name, payload):>12.1f}' for name in names))
+
+
+if __name__ == '__main__':
+    main()
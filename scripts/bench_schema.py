@@ -0,0 +1,78 @@
+# Benchmark schema contribution cost as table width grows
+
+import time
+
+from tosser.map import TosserMap
+from tosser.object import TosserObject
+from tosser.schema import TosserSchema
+
+WIDTHS = [100, 1000, 5000, 10000]
+ROUNDS = 3
+BATCH_SIZES = [0, 256, 4096]
+BATCH_OBJECTS = 2000
+
+
+def _make_map() -> TosserMap:
+    return TosserMap(
+        m_schema='data',
+        m_root_table='root',
+        m_key_templ='{table}_id',
+        m_tables={},
+    )
+
+
+def bench_width(width: int) -> float:
+    """Return seconds per leaf for contributing objects `width` columns wide"""
+
+    obj = TosserObject(metadata={}, data={f'field_{i}': f'value_{i}' for i in range(width)})
+    schema = TosserSchema(map=_make_map(), path='bench.toss')
+    schema.begin()
+
+    # first pass creates the columns, following passes hit existing ones
+    schema.contribute(obj)
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        schema.contribute(obj)
+    elapsed = time.perf_counter() - start
+
+    schema.end()
+    return elapsed / (ROUNDS * width)
+
+
+def bench_batch(batch_size: int) -> float:
+    """Return seconds per leaf for contributing many objects with repeating values"""
+
+    objs = [
+        TosserObject(metadata={}, data={
+            'id': i,
+            'status': ['new', 'open', 'closed'][i % 3],
+            'amount': f'{i % 100}.50',
+            'created': f'2023-01-{i % 28 + 1:02d}',
+            'tags': ['a', 'b', 'c'],
+        })
+        for i in range(BATCH_OBJECTS)
+    ]
+    schema = TosserSchema(map=_make_map(), path='bench.toss')
+    schema.batch_size = batch_size
+    schema.begin()
+
+    start = time.perf_counter()
+    for obj in objs:
+        schema.contribute(obj)
+    schema.end()
+    elapsed = time.perf_counter() - start
+
+    return elapsed / (BATCH_OBJECTS * 7)
+
+
+def main():
+    for width in WIDTHS:
+        per_leaf = bench_width(width)
+        print(f'columns={width:>6}  {per_leaf * 1e6:8.2f} us/leaf')
+    for batch_size in BATCH_SIZES:
+        per_leaf = bench_batch(batch_size)
+        print(f'batch={batch_size:>6}    {per_leaf * 1e6:8.2f} us/leaf')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# JSON decoder backends, the fastest one installed decodes source, config and schema files
+
+import json
+import logging
+import dataclasses
+from typing import IO, Any, Callable, Dict, List, Optional, Union
+
+from tosser.logs import LOG_MAIN
+from tosser.util import resolve_config
+
+# backends tried in order when none is chosen
+DECODER_PREFERENCE = ['orjson', 'simdjson', 'ujson', 'json']
+
+_log = logging.getLogger(LOG_MAIN)
+
+
+@dataclasses.dataclass
+class JsonDecoder:
+    """Decode function of a JSON library, taking str or UTF-8 bytes"""
+
+    name: str
+    loads: Callable[[Union[str, bytes]], Any]
+
+
+def _orjson() -> JsonDecoder:
+    import orjson
+    return JsonDecoder(name='orjson', loads=orjson.loads)
+
+
+def _simdjson() -> JsonDecoder:
+    import simdjson
+    return JsonDecoder(name='simdjson', loads=simdjson.loads)
+
+
+def _ujson() -> JsonDecoder:
+    import ujson
+    return JsonDecoder(name='ujson', loads=ujson.loads)
+
+
+def _stdlib() -> JsonDecoder:
+    return JsonDecoder(name='json', loads=json.loads)
+
+
+# backend name -> constructor, raising ImportError when the library is missing
+JSON_DECODERS: Dict[str, Callable[[], JsonDecoder]] = {
+    'orjson': _orjson,
+    'simdjson': _simdjson,
+    'ujson': _ujson,
+    'json': _stdlib,
+}
+
+_decoder: Optional[JsonDecoder] = None
+
+
+def available_decoders() -> List[str]:
+    """Names of the backends that can be loaded here, in order of preference"""
+
+    names = []
+    for name in DECODER_PREFERENCE:
+        try:
+            JSON_DECODERS[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def set_decoder(name: Optional[str] = None) -> JsonDecoder:
+    """
+    Use the backend `name`, or the one named by TOSS_JSON_DECODER, or the first installed
+    backend in DECODER_PREFERENCE. A missing backend falls back to the next preferred one.
+    """
+
+    global _decoder
+
+    name = resolve_config('TOSS_JSON_DECODER', name, None)
+    candidates = DECODER_PREFERENCE if name is None else [name] + DECODER_PREFERENCE
+    for candidate in candidates:
+        constructor = JSON_DECODERS.get(candidate)
+        if constructor is None:
+            _log.warning(f'Unknown JSON decoder: {candidate}')
+            continue
+        try:
+            _decoder = constructor()
+        except ImportError:
+            if candidate == name:
+                _log.warning(f'JSON decoder {candidate} is not installed, falling back')
+            continue
+        return _decoder
+    raise AssertionError('stdlib json decoder always loads')
+
+
+def get_decoder() -> JsonDecoder:
+    if _decoder is None:
+        return set_decoder()
+    return _decoder
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Decode a JSON document with the current backend.
+    Documents a faster backend rejects but the stdlib accepts, e.g. NaN or integers
+    past 64 bits, are decoded by the stdlib, so results and errors match json.loads.
+    """
+
+    decoder = _decoder if _decoder is not None else get_decoder()
+    try:
+        return decoder.loads(data)
+    except ValueError:
+        if decoder.loads is json.loads:
+            raise
+        return json.loads(data)
+
+
+def load(f: IO[Any]) -> Any:
+    return loads(f.read())
@@ -4,6 +4,7 @@ from enum import Enum
 from typing import Union, Optional, Dict, Any
 import logging
 
+from tosser import decoder
 from tosser.parsers.common import FileParser
 from tosser.logs import LOG_DEBUG
 
@@ -46,14 +47,14 @@ class IEndpoint:
             with open(config, 'r') as f:
                 content = f.read()
                 try:
-                    file_parsed: Dict[str, Any] = json.loads(content)
+                    file_parsed: Dict[str, Any] = decoder.loads(content)
                     return file_parsed
                 except json.JSONDecodeError as e:
                     self._log.error(f'Failed to parse JSON config file \'{config}\': {e}')
                     raise e
         
         try:
-            config_parsed: Dict[str, Any] = json.loads(config)
+            config_parsed: Dict[str, Any] = decoder.loads(config)
             return config_parsed
         except json.JSONDecodeError as e:
             self._log.error(f'Failed to parse JSON config string: {e}')
@@ -2,9 +2,11 @@ from typing import Dict, Type
 
 from tosser.endpoint.source.source import ISource, SourceDriver, REQUIRED_FIELDS
 from tosser.endpoint.source.file import FileSource
+from tosser.endpoint.source.ndjson import NdjsonSource
 
 SOURCE_DRIVERS: Dict[str, Type[ISource]] = {
-    'file': FileSource
+    'file': FileSource,
+    'ndjson': NdjsonSource,
 }
 
-__all__ = ['ISource', 'SourceDriver', 'FileSource' 'SOURCE_DRIVERS', 'REQUIRED_FIELDS']
+__all__ = ['ISource', 'SourceDriver', 'FileSource', 'NdjsonSource', 'SOURCE_DRIVERS', 'REQUIRED_FIELDS']
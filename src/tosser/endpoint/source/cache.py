@@ -0,0 +1,131 @@
+# On-disk cache of decoded source files, keyed by file identity
+
+import os
+import marshal
+import hashlib
+import logging
+import threading
+from typing import Any, Optional, Tuple
+from pathlib import Path
+
+from tosser.fingerprint import SourceFingerprint, fingerprint_file
+from tosser.logs import LOG_ENDPOINT
+
+# TODO move to config
+OBJECT_CACHE_DIR = '.tosser_cache/objects' # under the working directory
+OBJECT_CACHE_BUDGET = 1 << 30 # bytes of entries kept before the least recently used are evicted
+OBJECT_CACHE_EXT = 'bin'
+OBJECT_CACHE_VERSION = 1
+
+_ENTRY_SUFFIX = f'.{OBJECT_CACHE_EXT}'
+
+
+class ObjectCache:
+    """
+    Decoded contents of source files stored with marshal, which loads several times faster than json.
+    Entries are named by a digest of the file's resolved path, size and mtime so a changed file
+    misses instead of serving stale data. Reads refresh an entry's mtime, eviction removes the
+    oldest entries once the directory grows past `budget` bytes.
+    Safe to share between the read-ahead threads of a source.
+    """
+
+    def __init__(self, path: Path, budget: int = OBJECT_CACHE_BUDGET) -> None:
+        self.path = path
+        self.budget = budget
+        self._log = logging.getLogger(LOG_ENDPOINT)
+        # bytes in the cache directory, counted on the first write
+        self._size: Optional[int] = None
+        # guards the size count and eviction
+        self._lock = threading.Lock()
+
+    def entry_path(self, file: Path, fingerprint: SourceFingerprint) -> Path:
+        key = f'{OBJECT_CACHE_VERSION}\0{file.resolve()}\0{fingerprint.size}\0{fingerprint.mtime_ns}'
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+        return self.path / f'{digest}.{OBJECT_CACHE_EXT}'
+
+    def get(self, file: Path) -> Tuple[SourceFingerprint, Optional[Any]]:
+        """Fingerprint of `file` and its cached value, None on a miss"""
+
+        fingerprint = fingerprint_file(file)
+        entry = self.entry_path(file, fingerprint)
+        try:
+            with open(entry, 'rb') as f:
+                value = marshal.load(f)
+            os.utime(entry)
+        except FileNotFoundError:
+            return fingerprint, None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            self._log.debug(f'Discarding unreadable object cache entry {entry}: {e}')
+            return fingerprint, None
+        return fingerprint, value
+
+    def put(self, file: Path, fingerprint: SourceFingerprint, value: Any) -> None:
+        """Store the decoded value of `file` as it was when `fingerprint` was taken"""
+
+        data = marshal.dumps(value)
+        if len(data) > self.budget:
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = self.entry_path(file, fingerprint)
+        temp = entry.with_name(f'{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, entry)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += len(data)
+            if self._size > self.budget:
+                self._evict(self.budget * 3 // 4)
+
+    def size(self) -> int:
+        total = 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.name.endswith(_ENTRY_SUFFIX):
+                    continue
+                try:
+                    total += entry.stat().st_size
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def evict(self, budget: Optional[int] = None) -> None:
+        """Remove least recently used entries until the cache fits in `budget`, 3/4 of the budget by default"""
+
+        if budget is None:
+            # leave headroom so the next few writes don't evict again
+            budget = self.budget * 3 // 4
+        with self._lock:
+            self._evict(budget)
+
+    def _evict(self, budget: int) -> None:
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                # temp files of writes in progress are left alone
+                if not entry.name.endswith(_ENTRY_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def clear(self) -> None:
+        if self.path.is_dir():
+            self.evict(budget=0)
@@ -0,0 +1,233 @@
+# Lazy file discovery, glob patterns matched while walking directories with os.scandir
+
+import os
+import re
+import fnmatch
+import itertools
+import datetime
+import concurrent.futures
+from typing import Any, Dict, Iterator, List, Optional, Pattern, Tuple, FrozenSet
+from pathlib import Path
+
+# TODO move to config
+DISCOVER_WORKERS = 8 # threads scanning directories ahead of the walk
+DISCOVER_BATCH = 1024 # directory entries read per scan task
+DISCOVER_AHEAD = 4 # scan tasks queued per worker
+
+_MAGIC = re.compile(r'[*?[]')
+_RECURSIVE = '**'
+_NOWHERE: FrozenSet[int] = frozenset()
+
+
+def _modified_time(value: Any) -> Optional[float]:
+    """Epoch seconds of a config value given as a number or an ISO 8601 string"""
+
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+class FileFilter:
+    """Size and modification time bounds checked against a file's stat, all optional"""
+
+    def __init__(
+            self,
+            min_size: Optional[int] = None,
+            max_size: Optional[int] = None,
+            modified_after: Any = None,
+            modified_before: Any = None
+        ) -> None:
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_after = _modified_time(modified_after)
+        self.modified_before = _modified_time(modified_before)
+
+    @property
+    def needs_stat(self) -> bool:
+        bounds = (self.min_size, self.max_size, self.modified_after, self.modified_before)
+        return any(bound is not None for bound in bounds)
+
+    def matches(self, st: os.stat_result) -> bool:
+        if self.min_size is not None and st.st_size < self.min_size:
+            return False
+        if self.max_size is not None and st.st_size > self.max_size:
+            return False
+        if self.modified_after is not None and st.st_mtime <= self.modified_after:
+            return False
+        if self.modified_before is not None and st.st_mtime >= self.modified_before:
+            return False
+        return True
+
+
+class _Pattern:
+    """Glob segments after the literal root, matched one directory level at a time like glob.glob(recursive=True)"""
+
+    def __init__(self, segments: List[str]) -> None:
+        self.segments = segments
+        self.end = len(segments)
+        self._regex: List[Optional[Pattern[str]]] = [
+            None if seg == _RECURSIVE else re.compile(fnmatch.translate(seg))
+            for seg in segments
+        ]
+        self._dotted = [seg.startswith('.') for seg in segments]
+        self._closures: Dict[FrozenSet[int], FrozenSet[int]] = {}
+
+    def closure(self, positions: FrozenSet[int]) -> FrozenSet[int]:
+        """Positions reachable by letting each ** match no directories"""
+
+        reached = self._closures.get(positions)
+        if reached is not None:
+            return reached
+        found = set(positions)
+        for i in positions:
+            while i < self.end and self.segments[i] == _RECURSIVE:
+                i += 1
+                found.add(i)
+        reached = self._closures[positions] = frozenset(found)
+        return reached
+
+    def step(self, positions: FrozenSet[int], name: str) -> FrozenSet[int]:
+        """Positions after an entry named `name`, empty when it can't match"""
+
+        hidden = name[:1] == '.'
+        reached = []
+        for i in positions:
+            if i == self.end:
+                continue
+            regex = self._regex[i]
+            if regex is None:
+                # like glob, ** matches any visible file or directory
+                if not hidden:
+                    reached.append(i)
+                continue
+            # wildcards don't match hidden names unless the segment itself starts with a dot
+            if hidden and not self._dotted[i]:
+                continue
+            if regex.match(name):
+                reached.append(i + 1)
+        if len(reached) == 0:
+            return _NOWHERE
+        return self.closure(frozenset(reached))
+
+
+def _split_root(pattern: str) -> Tuple[str, List[str]]:
+    """Literal directory a pattern starts from, and its remaining glob segments"""
+
+    parts = pattern.split(os.sep)
+    for i, part in enumerate(parts):
+        if _MAGIC.search(part):
+            root = os.sep.join(parts[:i])
+            if root == '' and pattern.startswith(os.sep):
+                root = os.sep
+            return root, [part for part in parts[i:] if part != '']
+    return pattern, []
+
+
+# (directory to scan or an open scan to continue, directory path used to join names, pattern positions)
+_ScanTask = Tuple[Any, str, FrozenSet[int]]
+# (matched files, subdirectories to walk, the rest of this directory if unread)
+_ScanResult = Tuple[List[str], List[_ScanTask], Optional[_ScanTask]]
+
+
+def _scan(task: _ScanTask, pattern: _Pattern, file_filter: FileFilter) -> _ScanResult:
+    """Read up to DISCOVER_BATCH entries of a directory, runs in a worker thread"""
+
+    target, prefix, positions = task
+    if isinstance(target, str):
+        try:
+            entries = os.scandir(target if target != '' else '.')
+        except OSError:
+            # unreadable or vanished directories are skipped like glob does
+            return [], [], None
+    else:
+        entries = target
+
+    files: List[str] = []
+    subdirs: List[_ScanTask] = []
+    n = 0
+    with_stat = file_filter.needs_stat
+    try:
+        for entry in itertools.islice(entries, DISCOVER_BATCH):
+            n += 1
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            reached = pattern.step(positions, entry.name)
+            if len(reached) == 0:
+                continue
+
+            path = entry.path if prefix != '' else entry.name
+            if is_dir:
+                if any(i < pattern.end for i in reached):
+                    subdirs.append((path, path, reached))
+            elif pattern.end in reached:
+                try:
+                    if not entry.is_file() or (with_stat and not file_filter.matches(entry.stat())):
+                        continue
+                except OSError:
+                    continue
+                files.append(path)
+        if n == DISCOVER_BATCH:
+            # hand back what was read, the rest of the directory is another task
+            return files, subdirs, (entries, prefix, positions)
+    except OSError:
+        pass
+    entries.close()
+    return files, subdirs, None
+
+
+def iter_paths(
+        pattern: str,
+        workers: int = DISCOVER_WORKERS,
+        file_filter: Optional[FileFilter] = None
+    ) -> Iterator[Path]:
+    """
+    Yield files matching a glob pattern as directories are read, in the same order a depth first walk would.
+    With `workers` above 1, directories further along the walk are scanned ahead on a thread pool.
+    """
+
+    if file_filter is None:
+        file_filter = FileFilter()
+
+    root, segments = _split_root(pattern)
+    if len(segments) == 0:
+        # nothing to match, the pattern names one file
+        if os.path.isfile(root) and (not file_filter.needs_stat or file_filter.matches(os.stat(root))):
+            yield Path(root)
+        return
+
+    glob_pattern = _Pattern(segments)
+    start: _ScanTask = (root, root, glob_pattern.closure(frozenset([0])))
+
+    pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    if workers > 1:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tosser-discover')
+
+    # walk stack, [task, future] with the future set once the task is handed to the pool
+    stack: List[List[Any]] = [[start, None]]
+    try:
+        while len(stack) > 0:
+            if pool is not None:
+                # keep the next tasks of the walk scanning in the background
+                for frame in stack[-workers * DISCOVER_AHEAD:]:
+                    if frame[1] is None:
+                        frame[1] = pool.submit(_scan, frame[0], glob_pattern, file_filter)
+
+            task, future = stack.pop()
+            files, subdirs, rest = future.result() if future is not None else _scan(task, glob_pattern, file_filter)
+
+            for path in files:
+                yield Path(path)
+            if rest is not None:
+                stack.append([rest, None])
+            stack.extend([subdir, None] for subdir in reversed(subdirs))
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        # close directories left partly read when the walk is abandoned
+        for task, future in stack:
+            if future is not None and not future.cancelled() and future.exception() is None:
+                task = future.result()[2]
+            if task is not None and not isinstance(task[0], str):
+                task[0].close()
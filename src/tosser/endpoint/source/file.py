@@ -1,16 +1,34 @@
 import os
-import glob
-from typing import AsyncGenerator, List, Dict, Union, Any
+import copy
+import mmap
+import asyncio
+import itertools
+import collections
+import concurrent.futures
+from typing import AsyncGenerator, List, Dict, Union, Any, Tuple, Deque, Iterator, Optional
 from pathlib import Path
 import logging
 import aiofiles
-import json
 
+from tosser import decoder
 from tosser.endpoint.source import ISource, SourceDriver
+from tosser.endpoint.source.source import SourceEndpointException
+from tosser.endpoint.source.discover import iter_paths, FileFilter, DISCOVER_WORKERS
+from tosser.endpoint.source.cache import ObjectCache, OBJECT_CACHE_DIR, OBJECT_CACHE_BUDGET
 from tosser.object import TosserObject
+from tosser.events import StreamedData, read_metadata
+from tosser.fingerprint import SourceFingerprint, fingerprint_file
+from tosser.metrics import STAGE_READ, STAGE_DECODE
 from tosser.parsers.common import FileParser
+from tosser.parsers.compression import decompress, open_source, detect_file_compression
+from tosser.parsers.split import array_bounds, split_array, decode_range, SPLIT_RANGE_SIZE
+from tosser.parsers.stream import iter_stream_records, JsonStreamException, STREAM_CHUNK_SIZE
 from tosser.logs import LOG_ENDPOINT
 
+# TODO move to config
+FILE_STREAM_BATCH = 256 # records parsed per executor hop when streaming
+FILE_READ_AHEAD = 8 # files read and decoded concurrently ahead of the one being yielded
+
 class FileSource(ISource):
     def __init__(self, config: Union[str, Dict[str, Any]]) -> None:
         super().__init__(config)
@@ -19,41 +37,320 @@ class FileSource(ISource):
         self.driver = SourceDriver.FILE
         self.parser: FileParser = FileParser()
         
-        self.file_list: List[Path] = self._expand_file_list(self.config['path'])
-        self._log.debug(f'Source files matched: {[str(f) for f in self.file_list]}')
+        # matched files, discovered lazily while reading unless listed up front
+        self._file_list: Optional[List[Path]] = None
+
+
+    @property
+    def file_list(self) -> List[Path]:
+        """Every matched file, walks the whole path pattern the first time"""
+
+        if self._file_list is None:
+            self._file_list = list(self._expand_file_list(self.config['path']))
+            self._log.debug(f'Source files matched: {len(self._file_list)}')
+        return self._file_list
+
+    @file_list.setter
+    def file_list(self, file_list: List[Path]) -> None:
+        self._file_list = file_list
+
+
+    def iter_files(self) -> Iterator[Path]:
+        """Matched files as they are discovered, so reading starts before the walk ends"""
+
+        if self._file_list is not None:
+            return iter(self._file_list)
+        return self._expand_file_list(self.config['path'])
 
 
     async def iter_objects(self) -> AsyncGenerator[TosserObject, None]:
-        for file in self.file_list:
-            async with aiofiles.open(file, 'r') as f:
-                contents = await f.read()
+        if self.config.get('stream', False):
+            async for obj in self._iter_stream_objects():
+                yield obj
+            return
+        if self.config.get('events', False):
+            async for obj in self._iter_event_objects():
+                yield obj
+            return
+        if self.config.get('split', False):
+            async for obj in self._iter_split_objects():
+                yield obj
+            return
+
+        loop = asyncio.get_running_loop()
+        read_ahead = max(1, self.config.get('read_ahead', FILE_READ_AHEAD))
+
+        cache = self.object_cache()
+
+        async def _load(file: Path) -> Tuple[Any, int]:
+            fingerprint: Optional[SourceFingerprint] = None
+            if cache is not None:
+                with self.metrics.time(STAGE_READ):
+                    fingerprint, cached = await loop.run_in_executor(None, cache.get, file)
+                if cached is not None:
+                    self.metrics.count('object cache hits')
+                    return cached, 0
+                self.metrics.count('object cache misses')
+
+            with self.metrics.time(STAGE_READ):
+                async with aiofiles.open(file, 'rb') as f:
+                    contents = await f.read()
+
+            def _decode() -> Any:
+                # compressed files are inflated here, off the loop while other files are read
+                raw = decompress(contents)
+                # TODO switch to using a FileParser here
+                data = decoder.loads(raw)
+                if cache is not None and fingerprint is not None:
+                    cache.put(file, fingerprint, data)
+                return data
+
+            with self.metrics.time(STAGE_DECODE):
+                data = await loop.run_in_executor(None, _decode)
+            return data, len(contents)
+
+        # files being read and decoded ahead of the one yielded, in file order
+        pending: Deque[Tuple[Path, asyncio.Future[Tuple[Any, int]]]] = collections.deque()
+        files = self.iter_files()
+        try:
+            while True:
+                while len(pending) < read_ahead:
+                    file = next(files, None)
+                    if file is None:
+                        break
+                    pending.append((file, asyncio.ensure_future(_load(file))))
+                if len(pending) == 0:
+                    break
+
+                self.metrics.peak('files in flight', len(pending))
+                file, task = pending.popleft()
+                data, size = await task
+                self.metrics.count('files read')
+                self.metrics.count('bytes read', size)
+
+                self.check_keys(data)
+
+                yield TosserObject(data=data['data'], metadata=self._metadata(file, data['metadata']))
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+
+    async def _iter_stream_objects(self) -> AsyncGenerator[TosserObject, None]:
+        """
+        Parse each file in chunks and yield its data piece by piece, see iter_stream_records.
+        Records are pulled in batches on an executor thread so reads don't block the loop.
+        """
+
+        loop = asyncio.get_running_loop()
+        chunk_size = self.config.get('chunk_size', STREAM_CHUNK_SIZE)
+
+        for file in self.iter_files():
+            with open_source(file) as f:
+                records = iter_stream_records(f, chunk_size=chunk_size)
+
+                def _next_batch() -> List[Tuple[Dict[str, Any], Any]]:
+                    return list(itertools.islice(records, FILE_STREAM_BATCH))
+
+                while True:
+                    with self.metrics.time(STAGE_DECODE):
+                        try:
+                            batch = await loop.run_in_executor(None, _next_batch)
+                        except JsonStreamException as e:
+                            raise SourceEndpointException(f'Cannot stream {file}: {e}') from e
+                    if len(batch) == 0:
+                        break
+                    for file_metadata, data in batch:
+                        yield TosserObject(data=data, metadata=self._metadata(file, file_metadata))
+                self.metrics.count('files read')
+                self.metrics.count('characters read', f.tell())
+
+
+    async def _iter_event_objects(self) -> AsyncGenerator[TosserObject, None]:
+        """
+        Yield an object per file whose data stays on disk, traversed as it is parsed by the
+        schema and shredder, see tosser.events. Only the metadata is read here.
+        """
+
+        loop = asyncio.get_running_loop()
+        chunk_size = self.config.get('chunk_size', STREAM_CHUNK_SIZE)
+
+        def _read_metadata(file: Path) -> Optional[Dict[str, Any]]:
+            with open_source(file) as f:
+                return read_metadata(f, chunk_size=chunk_size)
+
+        for file in self.iter_files():
+            with self.metrics.time(STAGE_READ):
+                try:
+                    file_metadata = await loop.run_in_executor(None, _read_metadata, file)
+                except JsonStreamException as e:
+                    raise SourceEndpointException(f'Cannot read metadata of {file}: {e}') from e
+            self.metrics.count('files read')
+            yield TosserObject(
+                data=StreamedData(file, chunk_size=chunk_size),
+                metadata=self._metadata(file, file_metadata or {})
+            )
+
+
+    async def _iter_split_objects(self) -> AsyncGenerator[TosserObject, None]:
+        """
+        Decode each file holding one top-level array in byte ranges of whole elements on
+        `split_workers` processes, yielding an object per element in file order, see split_array.
+        Elements are records with metadata and data, or the data itself when `envelope` is false.
+        Other files, and compressed ones that can't be mapped, are decoded whole.
+        """
+
+        loop = asyncio.get_running_loop()
+        workers = self.config.get('split_workers', os.cpu_count() or 1)
+        range_size = self.config.get('split_size', SPLIT_RANGE_SIZE)
+        envelope = self.config.get('envelope', True)
+
+        def _plan(file: Path) -> Optional[List[Tuple[int, int]]]:
+            if os.path.getsize(file) == 0 or detect_file_compression(file) is not None:
+                return None
+            with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                bounds = array_bounds(mm)
+                if bounds is None:
+                    return None
+                return split_array(mm, bounds[0], bounds[1], range_size)
+
+        def _decode_whole(file: Path) -> Any:
+            with open(file, 'rb') as f:
+                return decoder.loads(decompress(f.read()))
+
+        pool: Optional[concurrent.futures.Executor] = None
+        if workers > 1:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        try:
+            for file in self.iter_files():
+                ranges = await loop.run_in_executor(None, _plan, file)
+                if ranges is None:
+                    with self.metrics.time(STAGE_DECODE):
+                        value = await loop.run_in_executor(None, _decode_whole, file)
+                    self.metrics.count('files read')
+                    if isinstance(value, list):
+                        for obj in self._element_objects(file, value, envelope):
+                            yield obj
+                        continue
+                    self.check_keys(value)
+                    yield TosserObject(data=value['data'], metadata=self._metadata(file, value['metadata']))
+                    continue
+
+                # decode a bounded window of ranges ahead of the one being yielded
+                pending: Deque[Tuple[int, int, asyncio.Future[Optional[List[Any]]]]] = collections.deque()
+                remaining = iter(ranges)
+                while True:
+                    while len(pending) < max(1, workers) * 2:
+                        byte_range = next(remaining, None)
+                        if byte_range is None:
+                            break
+                        start, end = byte_range
+                        pending.append((start, end, loop.run_in_executor(pool, decode_range, file, start, end)))
+                    if len(pending) == 0:
+                        break
+
+                    start, end, future = pending.popleft()
+                    with self.metrics.time(STAGE_DECODE):
+                        elements = await future
+                    if elements is None:
+                        raise SourceEndpointException(f'Cannot decode array in {file} from byte {start}')
+
+                    self.metrics.count('bytes read', end - start)
+                    for obj in self._element_objects(file, elements, envelope):
+                        yield obj
+                self.metrics.count('files read')
+                self.metrics.count('split ranges', len(ranges))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+
+    def _element_objects(self, file: Path, elements: List[Any], envelope: bool) -> Iterator[TosserObject]:
+        for element in elements:
+            if not envelope:
+                yield TosserObject(data=element, metadata=self._metadata(file, {}))
+                continue
+            if not isinstance(element, dict):
+                raise SourceEndpointException(f'Array element in {file} is not an object with metadata and data')
+            self.check_keys(element)
+            yield TosserObject(data=element['data'], metadata=self._metadata(file, element['metadata']))
+
+
+    def object_cache(self) -> Optional[ObjectCache]:
+        """
+        Cache of decoded files when the `cache` config is set, true keeps it in the working
+        directory and a string names the cache directory. Not used when streaming.
+        """
+
+        cache = self.config.get('cache', False)
+        if isinstance(cache, str):
+            path = Path(cache)
+        elif cache and self.work_dir is not None:
+            path = self.work_dir / OBJECT_CACHE_DIR
+        else:
+            return None
+        return ObjectCache(path, budget=self.config.get('cache_budget', OBJECT_CACHE_BUDGET))
+
+
+    def _metadata(self, file: Path, file_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {}
+
+        # include static metadata from config
+        metadata.update(self.config.get('metadata', {}))
+
+        # include metadata from the file
+        metadata.update(file_metadata)
+
+        filename_key = 'file'
+        while filename_key in metadata:
+            filename_key = f'_{filename_key}'
+        metadata[filename_key] = file.name
+        metadata['__TOSSER_filename_key'] = filename_key
+        return metadata
 
-            # TODO switch to using a FileParser here
-            data = json.loads(contents)
 
-            self.check_keys(data)
+    def shard(self, n: int) -> List[ISource]:
+        """Split the file list into at most `n` contiguous runs of files"""
 
-            metadata: Dict[str, Any] = {}
+        size = max(1, -(-len(self.file_list) // max(1, n)))
+        shards: List[ISource] = []
+        for i in range(0, len(self.file_list), size):
+            shard = copy.copy(self)
+            shard.file_list = self.file_list[i:i + size]
+            shards.append(shard)
+        return shards
 
-            # include static metadata from config
-            metadata.update(self.config.get('metadata', {}))
 
-            # include metadata from the file
-            metadata.update(data['metadata'])
+    def incremental(
+            self,
+            known: Dict[str, SourceFingerprint],
+            content_hash: bool = False
+        ) -> Tuple[ISource, Dict[str, SourceFingerprint]]:
+        """Return a source reading only new or changed files, and fingerprints of all files"""
 
-            filename_key = 'file'
-            while filename_key in metadata:
-                filename_key = f'_{filename_key}'
-            metadata[filename_key] = file.name
-            metadata['__TOSSER_filename_key'] = filename_key
+        fingerprints: Dict[str, SourceFingerprint] = {}
+        changed: List[Path] = []
+        for file in self.iter_files():
+            key = str(file.resolve())
+            previous = known.get(key)
+            fingerprint = fingerprint_file(file, previous=previous, content_hash=content_hash)
+            fingerprints[key] = fingerprint
+            if previous is None or not previous.matches(fingerprint):
+                changed.append(file)
 
-            yield TosserObject(data=data['data'], metadata=metadata)
+        self._log.debug(f'Source files new or changed: {len(changed)} of {len(fingerprints)}')
+        source = copy.copy(self)
+        source.file_list = changed
+        return source, fingerprints
 
 
-    def _expand_file_list(self, path: str) -> List[Path]:
+    def _expand_file_list(self, path: str) -> Iterator[Path]:
         if os.path.isfile(path):
-            return [Path(path)]
-        try_glob: list[str] = glob.glob(path, recursive=True)
-        path_glob = [Path(p) for p in try_glob]
-        return path_glob
-    
\ No newline at end of file
+            return iter([Path(path)])
+        file_filter = FileFilter(
+            min_size=self.config.get('min_size'),
+            max_size=self.config.get('max_size'),
+            modified_after=self.config.get('modified_after'),
+            modified_before=self.config.get('modified_before'),
+        )
+        return iter_paths(path, workers=self.config.get('discover_workers', DISCOVER_WORKERS), file_filter=file_filter)
@@ -0,0 +1,412 @@
+import os
+import re
+import copy
+import mmap
+import array
+import marshal
+import hashlib
+import asyncio
+import itertools
+import concurrent.futures
+from functools import partial
+from typing import AsyncGenerator, List, Dict, Union, Any, Tuple, Optional, Iterable, Callable
+from pathlib import Path
+import logging
+import json
+
+from tosser import decoder
+from tosser.endpoint.source import SourceDriver
+from tosser.endpoint.source.source import ISource, SourceEndpointException
+from tosser.endpoint.source.file import FileSource
+from tosser.object import TosserObject
+from tosser.fingerprint import fingerprint_file
+from tosser.metrics import STAGE_DECODE
+from tosser.parsers.compression import detect_file_compression, open_source
+from tosser.logs import LOG_ENDPOINT
+
+# TODO move to config
+NDJSON_RANGE_SIZE = 8 << 20 # bytes of lines parsed per task
+NDJSON_INDEX_STRIDE = 1024 # records between offsets kept in a line index
+NDJSON_INDEX_DIR = '.tosser_cache/index' # line indexes, under the working directory
+NDJSON_INDEX_EXT = 'idx'
+NDJSON_INDEX_MAGIC = 'tosser-line-index'
+NDJSON_INDEX_VERSION = 2
+NDJSON_COMPRESSED = -1 # end of the byte range standing for a whole compressed file
+NDJSON_COMPRESSED_BATCH = 4096 # lines of a compressed file parsed per executor hop
+
+_NEWLINE = re.compile(b'\n')
+# a line that is not blank from its first non whitespace byte, blank lines hold no record
+_RECORD = re.compile(rb'[^ \t\r\n\x0b\x0c][^\n]*')
+_BLANK_LINE = re.compile(rb'\n[ \t\r\x0b\x0c]*\n')
+
+# file and [start, end) byte offsets of a run of whole lines,
+# or records to skip and NDJSON_COMPRESSED for a compressed file
+ByteRange = Tuple[Path, int, int]
+
+
+class LineIndex:
+    """
+    Byte offset of the line of every `stride`th record of a file, and its number of records.
+    Blank lines are not records, so they are left out of the count.
+    """
+
+    def __init__(self, stride: int, offsets: 'array.array[int]', lines: int) -> None:
+        self.stride = stride
+        self.offsets = offsets
+        self.lines = lines
+
+    @staticmethod
+    def build(mm: Union[mmap.mmap, bytes], stride: int = NDJSON_INDEX_STRIDE) -> 'LineIndex':
+        if _has_blank_line(mm):
+            # blank lines are rare, only then is every record matched on its own
+            offsets = array.array('Q')
+            lines = 0
+            for lines, m in enumerate(_RECORD.finditer(mm), 1):
+                if (lines - 1) % stride == 0:
+                    offsets.append(m.start())
+            return LineIndex(stride, offsets, lines)
+
+        offsets = array.array('Q', [0])
+        newlines = _NEWLINE.finditer(mm)
+        for m in itertools.islice(newlines, stride - 1, None, stride):
+            offsets.append(m.end())
+        # the newlines after the last offset, plus a last line without one
+        tail = mm[offsets[-1]:]
+        lines = (len(offsets) - 1) * stride + tail.count(b'\n')
+        if len(tail) > 0 and not tail.endswith(b'\n'):
+            lines += 1
+        if offsets[-1] == len(mm) and len(offsets) > 1:
+            offsets.pop()
+        return LineIndex(stride, offsets, lines)
+
+    def seek(self, mm: Union[mmap.mmap, bytes], line: int) -> int:
+        """Byte offset where the line of record `line` starts, the file size past the last record"""
+
+        if line >= self.lines:
+            return len(mm)
+        block = line // self.stride
+        offset = self.offsets[block]
+        rest = line - block * self.stride
+        if rest > 0:
+            m = next(itertools.islice(_RECORD.finditer(mm, offset), rest, None))
+            offset = m.start()
+        return offset
+
+    @staticmethod
+    def entry_path(index_dir: Path, path: Path) -> Path:
+        """Index file of `path`, named by a digest of its resolved path so it never matches a source glob"""
+
+        digest = hashlib.blake2b(str(path.resolve()).encode('utf-8'), digest_size=16).hexdigest()
+        return index_dir / f'{digest}.{NDJSON_INDEX_EXT}'
+
+    def write(self, index_dir: Path, path: Path) -> None:
+        fingerprint = fingerprint_file(path)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        index_path = LineIndex.entry_path(index_dir, path)
+        temp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+        with open(temp_path, 'wb') as f:
+            marshal.dump((
+                NDJSON_INDEX_MAGIC,
+                NDJSON_INDEX_VERSION,
+                fingerprint.size,
+                fingerprint.mtime_ns,
+                self.stride,
+                self.lines,
+                self.offsets.tobytes(),
+            ), f)
+        os.replace(temp_path, index_path)
+
+    @staticmethod
+    def read(index_dir: Path, path: Path) -> Optional['LineIndex']:
+        """Stored index of `path`, None if missing or written for different file content"""
+
+        try:
+            with open(LineIndex.entry_path(index_dir, path), 'rb') as f:
+                magic, version, size, mtime_ns, stride, lines, offsets = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        fingerprint = fingerprint_file(path)
+        if (
+            magic != NDJSON_INDEX_MAGIC
+            or version != NDJSON_INDEX_VERSION
+            or size != fingerprint.size
+            or mtime_ns != fingerprint.mtime_ns
+        ):
+            return None
+        index_offsets = array.array('Q')
+        index_offsets.frombytes(offsets)
+        return LineIndex(stride, index_offsets, lines)
+
+
+def _has_blank_line(mm: Union[mmap.mmap, bytes]) -> bool:
+    """Whether any line is blank, files without one are indexed by their newlines alone"""
+
+    first = mm.find(b'\n')
+    if len(mm) > 0 and mm[:first if first != -1 else len(mm)].strip() == b'':
+        return True
+    tail = mm[mm.rfind(b'\n') + 1:]
+    if len(tail) > 0 and tail.strip() == b'':
+        return True
+    return _BLANK_LINE.search(mm) is not None
+
+
+def split_ranges(mm: Union[mmap.mmap, bytes], start: int, end: int, size: int) -> List[Tuple[int, int]]:
+    """Split [start, end) into ranges of about `size` bytes that begin and end on line boundaries"""
+
+    ranges: List[Tuple[int, int]] = []
+    while start < end:
+        stop = min(start + size, end)
+        if stop < end:
+            newline = mm.find(b'\n', stop - 1, end)
+            stop = end if newline == -1 else newline + 1
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _parse_lines(
+        path: Path,
+        lines: Iterable[bytes],
+        envelope: bool,
+        first_line: Callable[[], int]
+    ) -> List[Tuple[Dict[str, Any], Any]]:
+    """
+    Parse lines into (metadata, data) records, skipping blank ones.
+    `first_line` gives the index in the file of the first line, only called to report a bad line.
+    """
+
+    records: List[Tuple[Dict[str, Any], Any]] = []
+    for n, line in enumerate(lines):
+        if line.strip() == b'':
+            continue
+        try:
+            value = decoder.loads(line)
+        except json.JSONDecodeError as e:
+            raise SourceEndpointException(f'Cannot parse line {first_line() + n + 1} of {path}: {e}') from e
+        if envelope:
+            if not isinstance(value, dict) or 'metadata' not in value or 'data' not in value:
+                raise SourceEndpointException(
+                    f'Line {first_line() + n + 1} of {path} is not an object with metadata and data'
+                )
+            records.append((value['metadata'], value['data']))
+        else:
+            records.append(({}, value))
+    return records
+
+
+def _parse_range(path: Path, start: int, end: int, envelope: bool) -> List[Tuple[Dict[str, Any], Any]]:
+    """Parse the lines of a byte range into (metadata, data) records, runs in a worker"""
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        chunk = mm[start:end]
+
+    def _first_line() -> int:
+        lines = 0
+        left = start
+        with open(path, 'rb') as f:
+            while left > 0:
+                chunk = f.read(min(left, NDJSON_RANGE_SIZE))
+                if chunk == b'':
+                    break
+                lines += chunk.count(b'\n')
+                left -= len(chunk)
+        return lines
+
+    return _parse_lines(path, chunk.split(b'\n'), envelope, _first_line)
+
+
+class NdjsonSource(FileSource):
+    """
+    JSON Lines files, one record per line.
+    Files are memory mapped and split on newlines into byte ranges that are parsed by
+    `workers` processes, yielding records in file order or as ranges finish when not `ordered`.
+    Lines are the data of each object unless `envelope`, then each line holds metadata and data.
+    Reading starts at record `start_record` counted over all files, found through a line index
+    kept in the working directory when `index` is set, see index_dir(). Compressed files have
+    no random access, they are decompressed and parsed in batches of lines in process, in their
+    place among the ranges.
+    """
+
+    def __init__(self, config: Union[str, Dict[str, Any]]) -> None:
+        super().__init__(config)
+        self._log = logging.getLogger(LOG_ENDPOINT)
+        self.driver = SourceDriver.NDJSON
+
+        # byte ranges to read, all of every file when None
+        self.ranges: Optional[List[ByteRange]] = None
+
+
+    def index_dir(self) -> Optional[Path]:
+        """
+        Where line indexes are kept when the `index` config is set, true keeps them in the
+        working directory and a string names the directory. None when they aren't kept.
+        """
+
+        index = self.config.get('index', False)
+        if isinstance(index, str):
+            return Path(index)
+        if index and self.work_dir is not None:
+            return self.work_dir / NDJSON_INDEX_DIR
+        return None
+
+
+    def _index(self, file: Path, mm: mmap.mmap) -> LineIndex:
+        index_dir = self.index_dir()
+        if index_dir is not None:
+            index = LineIndex.read(index_dir, file)
+            if index is not None:
+                return index
+
+        index = LineIndex.build(mm, stride=self.config.get('index_stride', NDJSON_INDEX_STRIDE))
+        if index_dir is not None:
+            index.write(index_dir, file)
+        return index
+
+
+    def get_ranges(self) -> List[ByteRange]:
+        """Byte ranges of this source, starting from `start_record` if set"""
+
+        if self.ranges is not None:
+            return self.ranges
+
+        range_size = self.config.get('range_size', NDJSON_RANGE_SIZE)
+        skip = self.config.get('start_record', 0)
+        ranges: List[ByteRange] = []
+        for file in self.iter_files():
+            if os.path.getsize(file) == 0:
+                continue
+            if detect_file_compression(file) is not None:
+                # no random access into a compressed file, it is read whole from its first wanted record
+                ranges.append((file, skip, NDJSON_COMPRESSED))
+                if skip > 0:
+                    with open_source(file, 'rb') as f:
+                        skip = max(0, skip - sum(1 for line in f if line.strip() != b''))
+                continue
+            with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                start = 0
+                if skip > 0 or self.config.get('index', False):
+                    index = self._index(file, mm)
+                    start = index.seek(mm, skip)
+                    skip = max(0, skip - index.lines)
+                ranges.extend((file, a, b) for a, b in split_ranges(mm, start, len(mm), range_size))
+        return ranges
+
+
+    async def iter_objects(self) -> AsyncGenerator[TosserObject, None]:
+        ranges = self.get_ranges()
+        workers = self.config.get('workers', 1)
+        envelope = self.config.get('envelope', False)
+
+        pool: Optional[concurrent.futures.Executor] = None
+        if workers > 1 and len(ranges) > 1:
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        try:
+            for compressed, run in itertools.groupby(ranges, key=lambda byte_range: byte_range[2] == NDJSON_COMPRESSED):
+                if compressed:
+                    for file, skip, _ in run:
+                        async for obj in self._iter_compressed(file, skip, envelope):
+                            yield obj
+                    continue
+                async for obj in self._iter_ranges(list(run), pool, workers, envelope):
+                    yield obj
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+
+    async def _iter_ranges(
+            self,
+            ranges: List[ByteRange],
+            pool: Optional[concurrent.futures.Executor],
+            workers: int,
+            envelope: bool
+        ) -> AsyncGenerator[TosserObject, None]:
+        loop = asyncio.get_running_loop()
+        ordered = self.config.get('ordered', True)
+        parse = partial(_parse_range, envelope=envelope)
+
+        # keep a bounded number of ranges in flight so parsed records don't pile up
+        pending = iter(ranges)
+        in_flight: Dict[asyncio.Future[List[Tuple[Dict[str, Any], Any]]], ByteRange] = {}
+        order: List[asyncio.Future[List[Tuple[Dict[str, Any], Any]]]] = []
+
+        def _submit() -> bool:
+            byte_range = next(pending, None)
+            if byte_range is None:
+                return False
+            future = loop.run_in_executor(pool, parse, *byte_range)
+            in_flight[future] = byte_range
+            order.append(future)
+            return True
+
+        for _ in range(max(1, workers) * 2):
+            if not _submit():
+                break
+
+        while len(in_flight) > 0:
+            with self.metrics.time(STAGE_DECODE):
+                if ordered:
+                    future = order.pop(0)
+                    await asyncio.wait([future])
+                else:
+                    done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+                    future = done.pop()
+                    order.remove(future)
+            file, start, end = in_flight.pop(future)
+            records = future.result()
+            _submit()
+
+            self.metrics.count('records read', len(records))
+            self.metrics.count('bytes read', end - start)
+            for file_metadata, data in records:
+                yield TosserObject(data=data, metadata=self._metadata(file, file_metadata))
+
+
+    async def _iter_compressed(self, file: Path, skip: int, envelope: bool) -> AsyncGenerator[TosserObject, None]:
+        """
+        Records of a compressed file from record `skip` on. Lines are decompressed and parsed in
+        batches on an executor thread, so only one batch of records is held at a time.
+        """
+
+        loop = asyncio.get_running_loop()
+        with open_source(file, 'rb') as f:
+            # lines read so far, parse errors are reported by their line in the file
+            read = 0
+
+            def _next_batch() -> Tuple[int, List[Tuple[Dict[str, Any], Any]]]:
+                nonlocal read, skip
+                while skip > 0:
+                    line = f.readline()
+                    if line == b'':
+                        break
+                    read += 1
+                    if line.strip() != b'':
+                        skip -= 1
+                first_line = read
+                batch = list(itertools.islice(f, NDJSON_COMPRESSED_BATCH))
+                read += len(batch)
+                return len(batch), _parse_lines(file, batch, envelope, lambda: first_line)
+
+            while True:
+                with self.metrics.time(STAGE_DECODE):
+                    n, records = await loop.run_in_executor(None, _next_batch)
+                if n == 0:
+                    break
+                self.metrics.count('records read', len(records))
+                for file_metadata, data in records:
+                    yield TosserObject(data=data, metadata=self._metadata(file, file_metadata))
+        self.metrics.count('compressed files read')
+
+
+    def shard(self, n: int) -> List[ISource]:
+        """Split the byte ranges of all files into at most `n` contiguous runs, each read in process"""
+
+        ranges = self.get_ranges()
+        size = max(1, -(-len(ranges) // max(1, n)))
+        shards: List[ISource] = []
+        for i in range(0, len(ranges), size):
+            shard = copy.copy(self)
+            shard.config = {**self.config, 'workers': 1}
+            shard.ranges = ranges[i:i + size]
+            shards.append(shard)
+        return shards
@@ -1,14 +1,18 @@
 from enum import Enum
-from typing import Dict, Union, Any, AsyncGenerator, List
+from typing import Dict, Union, Any, AsyncGenerator, List, Tuple, Optional
+from pathlib import Path
 
 from tosser.endpoint.endpoint import IEndpoint, EndpointType
 from tosser.object import TosserObject
+from tosser.fingerprint import SourceFingerprint
+from tosser.metrics import TosserMetrics
 
 REQUIRED_FIELDS = set(['data', 'metadata'])
 
 
 class SourceDriver(Enum):
     FILE = 'file'
+    NDJSON = 'ndjson'
 
 
 class SourceEndpointException(Exception):
@@ -22,6 +26,9 @@ class ISource(IEndpoint):
         super().__init__(config)
 
         self.endpoint_type = EndpointType.SOURCE
+        self.metrics = TosserMetrics()
+        # working directory of the tosser context, for sources that keep state between runs
+        self.work_dir: Optional[Path] = None
 
     def check_keys(self, parsed_keys):
         key_set = set(parsed_keys.keys())
@@ -38,6 +45,24 @@ class ISource(IEndpoint):
             objs.append(obj)
         return objs
 
+    def shard(self, n: int) -> List['ISource']:
+        """Split into at most `n` sources yielding disjoint sets of objects"""
+
+        return [self]
+
+    def incremental(
+            self,
+            known: Dict[str, SourceFingerprint],
+            content_hash: bool = False
+        ) -> Tuple['ISource', Dict[str, SourceFingerprint]]:
+        """
+        Return a source limited to input that is new or changed compared to `known`
+        fingerprints, and the current fingerprints of all input.
+        Sources without fingerprintable input return themselves unchanged.
+        """
+
+        return self, {}
+
     async def iter_objects(self) -> AsyncGenerator[TosserObject, None]:
         """Yield objects generated by the source"""
 
@@ -0,0 +1,131 @@
+# Event-driven traversal, values of a JSON document reported as they are parsed without building it
+
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+
+from tosser.map import ProjectionNode
+from tosser.traverse import Trail, ROOT_ID, key_token, index_token
+from tosser.shape import RowAnchor
+from tosser.parsers.stream import JsonStream, JsonStreamException, STREAM_CHUNK_SIZE
+from tosser.parsers.compression import open_source
+
+# (trail, value, anchor) for each value, with trail None when the array element `anchor` closes
+Event = Tuple[Optional[Trail], Any, Optional[RowAnchor]]
+
+
+class StreamedData:
+    """Data of a source file that is traversed from the file on demand instead of held in memory"""
+
+    __slots__ = ('path', 'chunk_size')
+
+    def __init__(self, path: Path, chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def events(self, projection: Optional[ProjectionNode] = None, anchors: bool = False) -> Iterator[Event]:
+        with open_source(self.path) as f:
+            yield from iter_data_events(f, projection=projection, anchors=anchors, chunk_size=self.chunk_size)
+
+    def __repr__(self) -> str:
+        return f'<StreamedData {self.path}>'
+
+
+def iter_value_events(
+        stream: JsonStream,
+        projection: Optional[ProjectionNode] = None,
+        anchors: bool = False
+    ) -> Iterator[Event]:
+    """
+    Traverse the next value of a stream like Traverser.traverse, yielding each scalar with its trail.
+    Only the containers open around the current value are kept, so memory follows nesting depth.
+    With `anchors`, each array element gets a RowAnchor like ShapeCache.iter_values and an event closes it.
+    """
+
+    root = Trail(key_token(ROOT_ID))
+    c = stream.peek()
+    if c != '{' and c != '[':
+        yield root, stream.value(), None
+        return None
+
+    # frames are (child iterator, parent trail, children are keyed, projection node, parent anchor, next index)
+    keyed = c == '{'
+    stack: List[List[Any]] = [[stream.members() if keyed else stream.elements(), root, keyed, projection, None, 0]]
+    while len(stack) > 0:
+        frame = stack[-1]
+        items, parent, keyed, parent_node, parent_anchor, _ = frame
+        for key in items:
+            node = parent_node
+            anchor = parent_anchor
+            if keyed:
+                if parent_node is not None:
+                    node = parent_node.get(key)
+                    if node is None:
+                        if parent_node.restricted:
+                            stream.skip()
+                            continue
+                    elif node.excluded:
+                        stream.skip()
+                        continue
+                trail = Trail(key_token(key), parent)
+            else:
+                index = frame[5]
+                frame[5] = index + 1
+                trail = Trail(index_token(index), parent)
+
+            c = stream.peek()
+            if not keyed and anchors and c != '[':
+                # directly nested arrays share the row parent of the outer array
+                anchor = RowAnchor(trail.shape, parent_anchor)
+
+            if c == '{' or c == '[':
+                child_keyed = c == '{'
+                children = stream.members() if child_keyed else stream.elements()
+                stack.append([children, trail, child_keyed, node, anchor, 0])
+                break
+
+            yield trail, stream.value(), anchor
+            if anchor is not parent_anchor:
+                yield None, None, anchor
+        else:
+            stack.pop()
+            if len(stack) > 0 and anchors and not stack[-1][2] and frame[4] is not stack[-1][4]:
+                # the container was an array element with its own row
+                yield None, None, frame[4]
+    return None
+
+
+def iter_data_events(
+        f: IO[str],
+        projection: Optional[ProjectionNode] = None,
+        anchors: bool = False,
+        chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[Event]:
+    """Traverse the `data` member of a source file holding one {metadata, data} object"""
+
+    stream = JsonStream(f, chunk_size=chunk_size)
+    if stream.peek() != '{':
+        raise JsonStreamException('Event traversal needs a file holding one object with metadata and data')
+    has_data = False
+    for key in stream.members():
+        if key == 'data':
+            has_data = True
+            yield from iter_value_events(stream, projection=projection, anchors=anchors)
+        else:
+            stream.skip()
+    stream.end()
+    if not has_data:
+        raise JsonStreamException("Object missing required fields: {'data'}")
+
+
+def read_metadata(f: IO[str], chunk_size: int = STREAM_CHUNK_SIZE) -> Optional[Dict[str, Any]]:
+    """Metadata of a source file, stepping over data that comes before it without decoding it"""
+
+    stream = JsonStream(f, chunk_size=chunk_size)
+    if stream.peek() != '{':
+        return None
+    for key in stream.members():
+        if key == 'metadata':
+            metadata = stream.value()
+            return metadata if isinstance(metadata, dict) else None
+        stream.skip()
+    return None
@@ -0,0 +1,82 @@
+# Source file fingerprints for incremental schema generation
+
+import os
+import hashlib
+from pathlib import Path
+from typing import Dict, Any, Optional
+import dataclasses
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclasses.dataclass
+class SourceFingerprint:
+    """Identity of a source file at the time it was contributed"""
+
+    size: int
+    mtime_ns: int
+    hash: Optional[str] = None
+
+    def matches(self, other: 'SourceFingerprint') -> bool:
+        """True if both fingerprints describe the same file content"""
+
+        if self.size != other.size:
+            return False
+        if self.mtime_ns == other.mtime_ns:
+            return True
+
+        # touched but possibly unchanged, the content hash decides
+        return self.hash is not None and self.hash == other.hash
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'size': self.size,
+            'mtime': self.mtime_ns,
+            'hash': self.hash,
+        }
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> 'SourceFingerprint':
+        return SourceFingerprint(
+            size=obj['size'],
+            mtime_ns=obj['mtime'],
+            hash=obj.get('hash'),
+        )
+
+
+def content_hasher() -> Any:
+    """Return a new hash object of the kind used for content fingerprints"""
+
+    return hashlib.blake2b(digest_size=16)
+
+
+def fingerprint_file(
+        path: Path,
+        previous: Optional[SourceFingerprint] = None,
+        content_hash: bool = False
+    ) -> SourceFingerprint:
+    """
+    Fingerprint a file from its stat data and optionally a content hash.
+    The hash of a `previous` fingerprint is reused when size and mtime are unchanged.
+    """
+
+    stat = os.stat(path)
+    fingerprint = SourceFingerprint(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    if not content_hash:
+        return fingerprint
+
+    if (
+        previous is not None
+        and previous.hash is not None
+        and previous.size == fingerprint.size
+        and previous.mtime_ns == fingerprint.mtime_ns
+    ):
+        fingerprint.hash = previous.hash
+        return fingerprint
+
+    digest = content_hasher()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    fingerprint.hash = digest.hexdigest()
+    return fingerprint
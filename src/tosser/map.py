@@ -8,6 +8,10 @@ from tosser.schema_types import TosserSchemaType, TosserSchemaTypeVar
 from tosser.util import get_field
 
 METACHAR = '@'
+MAP_ROOT_ID = '$'
+MAP_PATH_DELIMETER = '/' # separates keys in Source and directive column paths
+MAP_WILDCARD = '*' # any one key, in a Source path also any array element
+MAP_DEEP_WILDCARD = '**' # any run of keys and array elements
 
 
 class Directive(Enum):
@@ -53,16 +57,98 @@ class MapTable:
                 if not k.startswith(METACHAR):
                     m_cols[k] = MapColumn.from_dict(v)
                 else:
-                    directives.append((Directive(k[len(METACHAR):]), v))
+                    directives.append((Directive(k[len(METACHAR):]), _as_list(v)))
 
         return MapTable(
             m_key=get_field(obj, 'key'),
-            m_source=get_field(obj, 'source'),
+            m_source=_as_list(get_field(obj, 'source')),
             m_cols=m_cols,
             m_directives=directives
         )
 
 
+def _as_list(value: Optional[str | List[str]]) -> List[str]:
+    """Map values can be a single string or a list of strings"""
+
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class ProjectionNode:
+    """
+    One key of a compiled projection, array indices pass through without a node.
+    A key is looked up in `children` first, so a literal key wins over a wildcard.
+    """
+
+    __slots__ = ('children', 'wildcard', 'deep', 'excluded', 'restricted')
+
+    def __init__(self) -> None:
+        self.children: Dict[str, 'ProjectionNode'] = {}
+        self.wildcard: Optional['ProjectionNode'] = None # any key without a child of its own
+        self.deep: Optional['ProjectionNode'] = None # any run of keys below this one
+        self.excluded = False # never walk this subtree
+        self.restricted = False # only walk keys that have a child node
+
+    def child(self, key: str) -> 'ProjectionNode':
+        if key == MAP_DEEP_WILDCARD:
+            if self.deep is None:
+                self.deep = ProjectionNode()
+                # ** keeps matching keys below itself
+                self.deep.deep = self.deep
+            return self.deep
+        if key == MAP_WILDCARD:
+            if self.wildcard is None:
+                self.wildcard = ProjectionNode()
+            return self.wildcard
+        node = self.children.get(key)
+        if node is None:
+            node = self.children[key] = ProjectionNode()
+        return node
+
+    def get(self, key: str) -> Optional['ProjectionNode']:
+        """Node of a key below this one, None if no path of the projection runs through it"""
+
+        node = self.children.get(key)
+        if node is not None:
+            return node
+        deep = self.deep
+        if deep is not None:
+            # ** matching no keys at all
+            node = deep.children.get(key)
+            if node is not None:
+                return node
+        if self.wildcard is not None:
+            return self.wildcard
+        return deep
+
+
+def _split_path(path: str) -> List[str]:
+    parts = [part for part in path.split(MAP_PATH_DELIMETER) if part != '']
+    if len(parts) > 0 and parts[0] == MAP_ROOT_ID:
+        parts = parts[1:]
+    return parts
+
+
+def _walk(nodes: List[ProjectionNode], parts: List[str], source: bool = False) -> List[ProjectionNode]:
+    """
+    Nodes at the end of a path from each of `nodes`, created as needed.
+    Array indices have no nodes, so a * in a Source path is followed both as
+    a skipped array element and as a wildcard key.
+    """
+
+    for part in parts:
+        next_nodes = []
+        for node in nodes:
+            if source and part == MAP_WILDCARD:
+                next_nodes.append(node)
+            next_nodes.append(node.child(part))
+        nodes = next_nodes
+    return nodes
+
+
 @dataclasses.dataclass
 class TosserMap:
     """Root mapping object used to translate source objects to target tables and rows"""
@@ -74,6 +160,68 @@ class TosserMap:
     m_table_delimeter: str = '_'
     m_flatten_objects: bool = True
 
+    def table_sources(self, name: str) -> List[List[str]]:
+        """Source key paths of a mapped table below the root object, empty if it can't be placed"""
+
+        table = self.m_tables.get(name)
+        if table is not None and len(table.m_source) > 0:
+            # sources starting with @ name metadata, not a path into the data
+            return [_split_path(source) for source in table.m_source if not source.startswith(METACHAR)]
+        if name == self.m_root_table:
+            return [[]]
+        return []
+
+    def projection(self) -> Optional[ProjectionNode]:
+        """
+        Compile @ignore/@keep directives of all tables into a key trie rooted at the source object.
+        Directives apply below every Source path of their table.
+        Returns None when the map has no such directives and every path is walked.
+        """
+
+        root = ProjectionNode()
+        found = False
+        for name, table in self.m_tables.items():
+            directives: List[Tuple[Directive, List[List[str]]]] = []
+            for directive, paths in table.m_directives:
+                if directive == Directive.VALUES:
+                    continue
+                # an empty path, like "@ignore": "", names nothing
+                split = [parts for parts in map(_split_path, paths) if len(parts) > 0]
+                if len(split) > 0:
+                    directives.append((directive, split))
+            if len(directives) == 0:
+                continue
+
+            table_nodes: List[ProjectionNode] = []
+            for source in self.table_sources(name):
+                table_nodes.extend(_walk([root], source, source=True))
+            if len(table_nodes) > 0:
+                found = True
+
+            kept: List[ProjectionNode] = []
+            for directive, split_paths in directives:
+                for parts in split_paths:
+                    nodes = table_nodes
+                    if directive == Directive.INCLUDE:
+                        for node in nodes:
+                            node.restricted = True
+                    for i, part in enumerate(parts):
+                        nodes = _walk(nodes, [part])
+                        if directive == Directive.INCLUDE and i < len(parts) - 1:
+                            for node in nodes:
+                                node.restricted = True
+                    if directive == Directive.EXCLUDE:
+                        for node in nodes:
+                            node.excluded = True
+                    else:
+                        kept.extend(nodes)
+
+            # a kept path is walked in full even when another kept path runs through it
+            for node in kept:
+                node.restricted = False
+
+        return root if found else None
+
     @staticmethod
     def from_dict(obj: Dict[str, Any]) -> 'TosserMap':
         table_obj = get_field(obj, 'tables')
@@ -0,0 +1,140 @@
+# Stage timers and counters for profiling generate and ingest runs
+
+import time
+import contextlib
+from typing import Dict, Any, Callable, Iterable, Iterator, TypeVar
+import dataclasses
+
+T = TypeVar('T')
+F = TypeVar('F', bound=Callable[..., Any])
+
+# stage names
+STAGE_READ = 'read'
+STAGE_DECODE = 'decode'
+STAGE_TRAVERSE = 'traverse'
+STAGE_RESOLVE = 'resolve'
+STAGE_INFER = 'infer'
+STAGE_CONTRIBUTE = 'contribute'
+STAGE_SHRED = 'shred'
+STAGE_WRITE = 'write'
+STAGE_INGEST = 'ingest'
+
+clock = time.perf_counter
+
+
+@dataclasses.dataclass
+class StageTimer:
+    """Accumulated monotonic time spent in one stage"""
+
+    calls: int = 0
+    seconds: float = 0.0
+
+
+class TosserMetrics:
+    """
+    Stage timers and counters.
+    When disabled, the timing helpers hand back the wrapped callable or iterable
+    untouched so instrumented hot paths pay nothing.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.timers: Dict[str, StageTimer] = {}
+        self.counters: Dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1) -> None:
+        timer = self.timers.get(stage)
+        if timer is None:
+            timer = self.timers[stage] = StageTimer()
+        timer.calls += calls
+        timer.seconds += seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def peak(self, name: str, n: int) -> None:
+        """Keep the highest value seen for a counter, e.g. concurrency reached"""
+
+        if self.enabled and n > self.counters.get(name, 0):
+            self.counters[name] = n
+
+    @contextlib.contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """Time the body of a `with` block as one call of `stage`"""
+
+        if not self.enabled:
+            yield
+            return
+        start = clock()
+        try:
+            yield
+        finally:
+            self.add_time(stage, clock() - start)
+
+    def timed(self, func: F, stage: str) -> F:
+        """Wrap `func` so each call is timed as `stage`"""
+
+        if not self.enabled:
+            return func
+
+        def _timed(*args: Any, **kwargs: Any) -> Any:
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_time(stage, clock() - start)
+
+        return _timed  # type: ignore
+
+    def timed_iter(self, iterable: Iterable[T], stage: str) -> Iterable[T]:
+        """Wrap `iterable` so the time spent producing each item is timed as `stage`"""
+
+        if not self.enabled:
+            return iterable
+
+        def _timed_iter() -> Iterator[T]:
+            it = iter(iterable)
+            while True:
+                start = clock()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self.add_time(stage, clock() - start, calls=0)
+                    return
+                self.add_time(stage, clock() - start)
+                yield item
+
+        return _timed_iter()
+
+    def merge(self, other: 'TosserMetrics') -> None:
+        """Add timers and counters from another run, e.g. a worker process"""
+
+        for stage, timer in other.timers.items():
+            self.add_time(stage, timer.seconds, calls=timer.calls)
+        for name, n in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        self.timers = {}
+        self.counters = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'timers': {stage: dataclasses.asdict(timer) for stage, timer in self.timers.items()},
+            'counters': dict(self.counters),
+        }
+
+    def report(self) -> str:
+        """Render timers and counters as a plain text table"""
+
+        lines = [f'{"stage":<12} {"calls":>10} {"total s":>10} {"mean us":>10}']
+        for stage, timer in self.timers.items():
+            mean = timer.seconds / timer.calls * 1e6 if timer.calls > 0 else 0.0
+            lines.append(f'{stage:<12} {timer.calls:>10} {timer.seconds:>10.3f} {mean:>10.2f}')
+        if len(self.counters) > 0:
+            lines.append('')
+            lines.append(f'{"counter":<23} {"value":>10}')
+            for name, n in self.counters.items():
+                lines.append(f'{name:<23} {n:>10}')
+        return '\n'.join(lines)
@@ -1,18 +1,24 @@
 import json
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Union, TYPE_CHECKING
 import dataclasses
 
+from tosser import decoder
+
+if TYPE_CHECKING:
+    from tosser.events import StreamedData
+
 @dataclasses.dataclass
 class TosserObject:
     metadata: Dict[str, Any]
-    data: Dict[str, Any]
+    # parsed JSON, or StreamedData that is traversed while its file is parsed
+    data: Union[Dict[str, Any], List[Any], 'StreamedData']
 
     def _quick_load(self, path: Path) -> None:
         with open(path, 'r') as file:
-            self.data = json.loads(file.read())
+            self.data = decoder.loads(file.read())
 
     def __repr__(self) -> str:
         metadata = json.dumps(self.metadata, indent=4)
-        data = json.dumps(self.data, indent=4)
+        data = json.dumps(self.data, indent=4, default=repr)
         return f'<TosserObject metadata={metadata} data={data}>'
@@ -4,6 +4,7 @@ from pathlib import Path
 
 from tosser.parsers.parser import Parser
 from tosser.parsers.parser import BaseObject
+from tosser.parsers.compression import open_source
 
 
 class FileParser(Parser):
@@ -11,7 +12,8 @@ class FileParser(Parser):
         super().__init__()
 
     def get_stream(self, path: Path) -> IO[Any]:
-        return open(path, 'rU')
+        # gzip, bz2 and xz files are decompressed as they are read
+        return open_source(path)
 
     def next_line(self):
         ...
@@ -0,0 +1,58 @@
+# Compressed input detection by magic bytes, decoded with the stdlib codecs
+
+import io
+import bz2
+import gzip
+import lzma
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+from pathlib import Path
+
+COMPRESSION_GZIP = 'gzip'
+COMPRESSION_BZ2 = 'bz2'
+COMPRESSION_XZ = 'xz'
+
+# leading bytes of each format, with its whole-buffer decompressor and its file opener
+_CODECS: Dict[str, Tuple[bytes, Callable[[bytes], bytes], Callable[..., IO[Any]]]] = {
+    COMPRESSION_GZIP: (b'\x1f\x8b', gzip.decompress, gzip.open),
+    COMPRESSION_BZ2: (b'BZh', bz2.decompress, bz2.open),
+    COMPRESSION_XZ: (b'\xfd7zXZ\x00', lzma.decompress, lzma.open),
+}
+_MAGIC_SIZE = max(len(magic) for magic, _, _ in _CODECS.values())
+
+
+def detect_compression(head: bytes) -> Optional[str]:
+    """Compression format of data starting with `head`, None if it is not compressed"""
+
+    for name, (magic, _, _) in _CODECS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def detect_file_compression(path: Path) -> Optional[str]:
+    with open(path, 'rb') as f:
+        return detect_compression(f.read(_MAGIC_SIZE))
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress a whole buffer if it is compressed, otherwise return it as is"""
+
+    compression = detect_compression(data[:_MAGIC_SIZE])
+    if compression is None:
+        return data
+    return _CODECS[compression][1](data)
+
+
+def open_source(path: Path, mode: str = 'r') -> IO[Any]:
+    """
+    Open a source file for reading, decompressing it on the fly when it is compressed.
+    Text mode reads UTF-8, data is decompressed as it is read so memory stays bounded.
+    """
+
+    compression = detect_file_compression(path)
+    if compression is None:
+        return open(path, mode, encoding='utf-8' if 'b' not in mode else None)
+    binary = _CODECS[compression][2](path, 'rb')
+    if 'b' in mode:
+        return binary
+    return io.TextIOWrapper(binary, encoding='utf-8')
@@ -0,0 +1,131 @@
+# Splitting one large JSON array into byte ranges of whole elements that decode independently
+
+import re
+import mmap
+import json
+from typing import Any, List, Optional, Tuple, Union
+from pathlib import Path
+
+from tosser import decoder
+
+SPLIT_RANGE_SIZE = 16 << 20 # bytes of elements decoded per task
+
+_WHITESPACE = b' \t\n\r'
+
+# brackets, commas and string openings, what a value's structure is made of
+_STRUCTURAL = re.compile(rb'[\[\]{}",]')
+# body and closing quote of a string whose opening quote was consumed
+_STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# every byte but quotes and brackets, dropped before counting depth
+_NOT_STRUCTURAL = bytes(b for b in range(256) if b not in b'"[]{}')
+_QUOTE = ord('"')
+_COMMA = ord(',')
+_BACKSLASH = ord('\\')
+_OPEN = (ord('{'), ord('['))
+
+Buffer = Union[mmap.mmap, bytes]
+
+
+def array_bounds(buf: Buffer) -> Optional[Tuple[int, int]]:
+    """Offsets just inside the brackets of a document that is a single array, None otherwise"""
+
+    start = 0
+    while start < len(buf) and buf[start] in _WHITESPACE:
+        start += 1
+    end = len(buf)
+    while end > start and buf[end - 1] in _WHITESPACE:
+        end -= 1
+    if end - start < 2 or buf[start] != ord('[') or buf[end - 1] != ord(']'):
+        return None
+    return start + 1, end - 1
+
+
+def _depth(buf: Buffer, start: int, end: int, limit: int) -> Tuple[int, Optional[int]]:
+    """
+    Bracket depth at `end` counted from `start`, which is outside any string, and where scanning goes on:
+    `end`, or past a string left open there, None if it doesn't close before `limit`.
+    Works on whole buffers with bytes methods, not byte by byte.
+    """
+
+    text = buf[start:end]
+    if b'\\' in text:
+        # escaped backslashes first, so the quote of \\" still closes its string
+        text = text.replace(b'\\\\', b'').replace(b'\\"', b'')
+    # empty strings go too, then quotes left pair up around strings holding brackets
+    parts = text.translate(None, _NOT_STRUCTURAL).replace(b'""', b'').split(b'"')
+    outside = b''.join(parts[::2])
+    depth = outside.count(b'{') + outside.count(b'[') - outside.count(b'}') - outside.count(b']')
+    if len(parts) % 2 == 1:
+        return depth, end
+
+    # `end` is inside a string, step over an escape cut in half and find the closing quote
+    backslashes = 0
+    while buf[end - 1 - backslashes] == _BACKSLASH:
+        backslashes += 1
+    m = _STRING_REST.match(buf, end + backslashes % 2, limit)
+    return depth, m.end() if m is not None else None
+
+
+def split_array(buf: Buffer, start: int, end: int, size: int = SPLIT_RANGE_SIZE) -> List[Tuple[int, int]]:
+    """
+    Split the contents of an array, [start, end) between its brackets, into ranges of about `size` bytes.
+    Each range ends on the first comma past `size` that separates two elements. Depth is tracked from
+    the start of the range and strings are skipped with their escapes, so a range never ends inside a value.
+    """
+
+    first = start
+    while first < end and buf[first] in _WHITESPACE:
+        first += 1
+    if first == end:
+        return []
+
+    ranges: List[Tuple[int, int]] = []
+    range_start = start
+    while range_start + size < end:
+        depth, resume = _depth(buf, range_start, range_start + size, end)
+        if resume is None:
+            # unterminated, decoding the last range reports it
+            break
+
+        # walk the rest of the element the range stopped in, token by token
+        i = resume
+        stop: Optional[int] = None
+        while True:
+            m = _STRUCTURAL.search(buf, i, end)
+            if m is None:
+                break
+            c = buf[m.start()]
+            i = m.end()
+            if c == _QUOTE:
+                s = _STRING_REST.match(buf, i, end)
+                if s is None:
+                    # unterminated, decoding the last range reports it
+                    break
+                i = s.end()
+            elif c == _COMMA:
+                if depth == 0:
+                    stop = m.start()
+                    break
+            elif c in _OPEN:
+                depth += 1
+            else:
+                depth -= 1
+        if stop is None:
+            break
+        ranges.append((range_start, stop))
+        # step over the comma
+        range_start = stop + 1
+    ranges.append((range_start, end))
+    return ranges
+
+
+def decode_range(path: Path, start: int, end: int) -> Optional[List[Any]]:
+    """Decode the elements in a byte range of a file, None if they are malformed"""
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        chunk = mm[start:end]
+    try:
+        elements: List[Any] = decoder.loads(b'[' + chunk + b']')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return elements
@@ -0,0 +1,267 @@
+import re
+import json
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+STREAM_CHUNK_SIZE = 1 << 20 # characters read from the file at once
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# body and closing quote of a string whose opening quote was consumed
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+# structural characters of a container, strings are jumped over as a whole
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_SCALAR = re.compile(r'[^\s,\]}:]+')
+
+_decoder = json.JSONDecoder()
+
+
+class JsonStreamException(Exception):
+    ...
+
+
+class JsonStream:
+    """
+    Pull parser over a text file holding one JSON document.
+    Containers near the top are walked token by token while each selected value is
+    decoded whole, so memory is bounded by the largest value rather than the file.
+    """
+
+    def __init__(self, f: IO[str], chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+        self._f = f
+        self.chunk_size = chunk_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self.consumed = 0 # characters read from the file so far
+
+    def _fill(self, at_least: int = 0) -> bool:
+        """Read another chunk, or more if a value needs it, returns False at the end of the file"""
+
+        if self._eof:
+            return False
+        if self._pos > 0:
+            # drop what has been parsed so the buffer only holds the current value
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        chunk = self._f.read(max(self.chunk_size, at_least))
+        if len(chunk) == 0:
+            self._eof = True
+            return False
+        self.consumed += len(chunk)
+        self._buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Next non whitespace character, empty at the end of the file"""
+
+        while True:
+            m = _WHITESPACE.match(self._buf, self._pos)
+            assert m is not None # the pattern matches the empty string
+            self._pos = m.end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if c == '' or c not in chars:
+            at = self.consumed - len(self._buf) + self._pos
+            raise JsonStreamException(f'Expected one of {chars!r} at character {at}, found {c!r}')
+        self._pos += 1
+        return c
+
+    def _value_end(self, start: int) -> Optional[int]:
+        """End of the value starting at `start` if it is all in the buffer"""
+
+        buf = self._buf
+        c = buf[start]
+        if c == '"':
+            m = _STRING_REST.match(buf, start + 1)
+            return m.end() if m is not None else None
+
+        if c == '{' or c == '[':
+            depth = 0
+            i = start
+            while True:
+                m = _STRUCTURAL.search(buf, i)
+                if m is None:
+                    return None
+                c = m.group()
+                if c == '"':
+                    s = _STRING_REST.match(buf, m.end())
+                    if s is None:
+                        return None
+                    i = s.end()
+                    continue
+                i = m.end()
+                if c == '{' or c == '[':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return i
+
+        m = _SCALAR.match(buf, start)
+        if m is None or (m.end() == len(buf) and not self._eof):
+            return None
+        return m.end()
+
+    def _span(self) -> Tuple[int, int]:
+        """Buffer the whole next value and return its bounds"""
+
+        if self.peek() == '':
+            raise JsonStreamException('Unexpected end of file')
+        end = self._value_end(self._pos)
+        while end is None:
+            # read at least as much again as is pending, rescanning stays linear overall
+            if not self._fill(at_least=len(self._buf) - self._pos):
+                raise JsonStreamException('Unexpected end of file inside a value')
+            end = self._value_end(self._pos)
+        return self._pos, end
+
+    def value(self) -> Any:
+        c = self.peek()
+        if c == '':
+            raise JsonStreamException('Unexpected end of file')
+
+        # most values sit inside the buffer, decode straight away and only scan for the end
+        # of values that run past it
+        start = self._pos
+        buf = self._buf
+        try:
+            value, end = _decoder.raw_decode(buf, start)
+            if self._eof or (end < len(buf) and (
+                c == '"' or c == '{' or c == '['
+                # a number cut off by the buffer, like 2. of 2.5, still decodes
+                or _SCALAR.match(buf, start).end() == end  # type: ignore
+            )):
+                self._pos = end
+                return value
+        except json.JSONDecodeError:
+            pass
+
+        start, end = self._span()
+        try:
+            value, decoded_end = _decoder.raw_decode(self._buf, start)
+        except json.JSONDecodeError as e:
+            raise JsonStreamException(f'Malformed value at character {self.consumed - len(self._buf) + e.pos}: {e.msg}')
+        if decoded_end != end:
+            raise JsonStreamException(f'Malformed value at character {self.consumed - len(self._buf) + start}')
+        self._pos = end
+        return value
+
+    def skip(self) -> None:
+        """Step over the next value without decoding it, token by token if it runs past the buffer"""
+
+        if self.peek() == '':
+            raise JsonStreamException('Unexpected end of file')
+        end = self._value_end(self._pos)
+        if end is not None:
+            self._pos = end
+            return
+
+        c = self._buf[self._pos]
+        if c != '{' and c != '[':
+            _, self._pos = self._span()
+            return
+
+        # walk the container so memory stays bounded by its largest scalar
+        stack = [self.members() if c == '{' else self.elements()]
+        while len(stack) > 0:
+            for _ in stack[-1]:
+                c = self.peek()
+                if c == '{':
+                    stack.append(self.members())
+                    break
+                if c == '[':
+                    stack.append(self.elements())
+                    break
+                _, self._pos = self._span()
+            else:
+                stack.pop()
+
+    def key(self) -> str:
+        key = self.value()
+        if not isinstance(key, str):
+            raise JsonStreamException(f'Expected an object key, found {key!r}')
+        self.expect(':')
+        return key
+
+    def members(self) -> Iterator[str]:
+        """Iterate the keys of the object about to be read, the caller reads or skips each value"""
+
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            yield self.key()
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self) -> Iterator[None]:
+        """Iterate the elements of the array about to be read, the caller reads or skips each value"""
+
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield None
+            if self.expect(',]') == ']':
+                return
+
+    def end(self) -> None:
+        if self.peek() != '':
+            raise JsonStreamException('Extra data after the JSON document')
+
+
+def iter_stream_records(f: IO[str], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[Dict[str, Any], Any]]:
+    """
+    Yield (metadata, data) records of a source file one piece at a time.
+    A top-level array yields each of its elements as a record. A single record yields
+    each element of an array `data`, or each member of an object `data` as a one key object.
+    """
+
+    stream = JsonStream(f, chunk_size=chunk_size)
+    if stream.peek() == '[':
+        for _ in stream.elements():
+            record = stream.value()
+            if not isinstance(record, dict) or 'metadata' not in record or 'data' not in record:
+                raise JsonStreamException('Array element is not an object with metadata and data')
+            yield record['metadata'], record['data']
+        stream.end()
+        return
+
+    metadata: Optional[Dict[str, Any]] = None
+    has_data = False
+    # data read before the metadata, only held when the file puts metadata last
+    held: List[Any] = []
+
+    for key in stream.members():
+        if key == 'metadata':
+            metadata = stream.value()
+            for data in held:
+                yield metadata, data
+            held = []
+        elif key == 'data':
+            has_data = True
+            c = stream.peek()
+            if c == '[':
+                pieces: Iterator[Any] = (stream.value() for _ in stream.elements())
+            elif c == '{':
+                pieces = ({member: stream.value()} for member in stream.members())
+            else:
+                pieces = iter([stream.value()])
+            for data in pieces:
+                if metadata is None:
+                    held.append(data)
+                else:
+                    yield metadata, data
+        else:
+            stream.skip()
+    stream.end()
+
+    if metadata is None or not has_data:
+        missing = {name for name, found in [('metadata', metadata is not None), ('data', has_data)] if not found}
+        raise JsonStreamException(f'Object missing required fields: {missing}')
@@ -3,10 +3,13 @@
 
 import json
 from pathlib import Path
-from typing import List, Tuple, Generator
+from typing import List, Tuple, Generator, Dict, FrozenSet, Optional
 from enum import Enum
 from dataclasses import dataclass
 
+RULE_ROOT_ID = '$'
+RULE_WILDCARD = '*' # matches any single key in a seek path, or every field in seek fields
+
 
 class TosserRuleState(Enum):
     UNKNOWN = -1
@@ -50,25 +53,161 @@ class TosserRule():
         }, indent=4)
 
 
+class _RuleNode:
+    """Trie node, one per distinct seek path prefix"""
+
+    __slots__ = ('id', 'children', 'wildcard', 'rules')
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.children: Dict[str, '_RuleNode'] = {}
+        self.wildcard: Optional['_RuleNode'] = None
+        self.rules: List[int] = []
+
+
+class TosserRuleAutomatonState:
+    """
+    Deterministic automaton state, the set of trie nodes reached by a key path.
+    Transitions are built on first use and shared by every later traversal.
+    """
+
+    __slots__ = ('automaton', 'nodes', 'matched', 'keys', 'terminal', 'transitions')
+
+    def __init__(self, automaton: 'TosserRuleAutomaton', nodes: FrozenSet[int]) -> None:
+        self.automaton = automaton
+        self.nodes = nodes
+        # rules whose seek path ends here, in rule set order
+        matched = sorted(i for n in nodes for i in automaton.nodes[n].rules)
+        self.matched: List[TosserRule] = [automaton.rules[i] for i in matched]
+        # keys with their own transition, any other key shares the transition stored under None
+        self.keys = frozenset(key for n in nodes for key in automaton.nodes[n].children)
+        # no key leads anywhere, children of a matched object need not be visited
+        self.terminal = (
+            len(self.keys) == 0
+            and not automaton._has_relative
+            and all(automaton.nodes[n].wildcard is None for n in nodes)
+        )
+        self.transitions: Dict[Optional[str], Optional[TosserRuleAutomatonState]] = {}
+
+    def step(self, key: str) -> Optional['TosserRuleAutomatonState']:
+        """Advance by one key, None when no rule can match below it"""
+
+        if key not in self.keys:
+            key = None  # type: ignore
+        try:
+            return self.transitions[key]
+        except KeyError:
+            state = self.transitions[key] = self.automaton._advance(self, key)
+            return state
+
+
+class TosserRuleAutomaton:
+    """
+    Rule seek paths compiled into a trie and walked as a lazily built DFA.
+    Absolute paths start at the root object, other paths may start at any depth.
+    Array indices do not advance the automaton, elements share their array's state.
+    """
+
+    def __init__(self, rules: List[TosserRule]) -> None:
+        self.rules = rules
+        self.nodes: List[_RuleNode] = []
+        self._root = self._new_node()
+        self._anywhere = self._new_node()
+        self._has_relative = False
+        self._states: Dict[FrozenSet[int], Optional[TosserRuleAutomatonState]] = {}
+
+        for i, rule in enumerate(rules):
+            path = rule.seek_path
+            if len(path) == 0:
+                continue
+            if rule.seek_path_is_absolute:
+                node, path = self._root, path[1:]
+            else:
+                node = self._anywhere
+                self._has_relative = True
+            for part in path:
+                if part == RULE_WILDCARD:
+                    if node.wildcard is None:
+                        node.wildcard = self._new_node()
+                    node = node.wildcard
+                else:
+                    if part not in node.children:
+                        node.children[part] = self._new_node()
+                    node = node.children[part]
+            node.rules.append(i)
+
+        start = {self._root.id}
+        if self._has_relative:
+            start.add(self._anywhere.id)
+        self.start: TosserRuleAutomatonState = self._state(frozenset(start))  # type: ignore
+
+    def _new_node(self) -> _RuleNode:
+        node = _RuleNode(len(self.nodes))
+        self.nodes.append(node)
+        return node
+
+    def _state(self, nodes: FrozenSet[int]) -> Optional[TosserRuleAutomatonState]:
+        if nodes not in self._states:
+            self._states[nodes] = TosserRuleAutomatonState(self, nodes) if len(nodes) > 0 else None
+        return self._states[nodes]
+
+    def _advance(self, state: TosserRuleAutomatonState, key: Optional[str]) -> Optional[TosserRuleAutomatonState]:
+        next_nodes = set()
+        for n in state.nodes:
+            node = self.nodes[n]
+            if key is not None and key in node.children:
+                next_nodes.add(node.children[key].id)
+            if node.wildcard is not None:
+                next_nodes.add(node.wildcard.id)
+        if self._has_relative:
+            next_nodes.add(self._anywhere.id)
+        return self._state(frozenset(next_nodes))
+
+
 class TosserRuleSet:
     def __init__(self) -> None:
-        self.rules: List[TosserRule] = []
+        self._rules: List[TosserRule] = []
+        self._automaton: Optional[TosserRuleAutomaton] = None
 
-    # Receive current context so we can trim the ruleset as we go
-    # Return list of unmatched rules
-    def _next_rules(self) -> Generator[List[TosserRule], Tuple[str, bool], List[TosserRule]]:
-        root_identifier = True
-        current_identifier = '$'
+    @property
+    def rules(self) -> List[TosserRule]:
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules: List[TosserRule]) -> None:
+        self._rules = rules
+        self._automaton = None
 
-        matched_rules = self.rules
+    def add(self, rule: TosserRule) -> None:
+        self._rules.append(rule)
+        self._automaton = None
 
-        for rule in self.rules:
-            next_id = rule.seek_id
-            print(f'{current_identifier=} {next_id=}')
+    def invalidate(self) -> None:
+        """Drop the compiled automaton after rules were changed in place"""
+
+        self._automaton = None
+
+    def compile(self) -> TosserRuleAutomaton:
+        """Compiled automaton of the current rules, built once and reused"""
+
+        if self._automaton is None:
+            self._automaton = TosserRuleAutomaton(self._rules)
+        return self._automaton
+
+    # Receive current context so we can trim the ruleset as we go
+    # Yield rules matched by the context, a root context restarts from the top
+    def _next_rules(self) -> Generator[List[TosserRule], Tuple[str, bool], List[TosserRule]]:
+        automaton = self.compile()
+        state: Optional[TosserRuleAutomatonState] = automaton.start
 
-        context: Tuple[str, bool] = yield matched_rules
+        while state is not None:
+            current_identifier, root_context = yield state.matched
+            if root_context:
+                state = automaton.start
+            else:
+                state = state.step(current_identifier)
 
-        return self.rules
+        return []
 
 
     # def _quick_load(self, path: Path) -> None:
@@ -0,0 +1,96 @@
+# Object sampling for schema generation
+
+import random
+from typing import Dict, Any, List, Optional
+import dataclasses
+from enum import Enum
+
+from tosser.object import TosserObject
+from tosser.exceptions import TosserException
+from tosser.util import get_field
+
+
+class SampleMode(Enum):
+    """How objects are picked from the source"""
+
+    ALL = 'all'
+    NTH = 'nth' # every nth object across all files
+    RESERVOIR = 'reservoir' # uniform random sample of fixed size
+
+
+@dataclasses.dataclass
+class SampleConfig:
+    """Sampling and early stop options for schema generation"""
+
+    mode: SampleMode = SampleMode.ALL
+    n: int = 1 # nth interval or reservoir size
+    converge_after: Optional[int] = None # stop after this many contributions without schema changes
+    seed: Optional[int] = None
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> 'SampleConfig':
+        return SampleConfig(
+            mode=SampleMode(get_field(obj, 'mode', default=SampleMode.ALL.value)),
+            n=get_field(obj, 'n', default=1),
+            converge_after=get_field(obj, 'convergeafter', alias=['converge_after']),
+            seed=get_field(obj, 'seed'),
+        )
+
+
+@dataclasses.dataclass
+class SampleStats:
+    """Counts reported by a sampled schema generation"""
+
+    seen: int = 0
+    contributed: int = 0
+    converged: bool = False
+
+    @property
+    def skipped(self) -> int:
+        return self.seen - self.contributed
+
+    def merge(self, other: 'SampleStats') -> None:
+        self.seen += other.seen
+        self.contributed += other.contributed
+        self.converged = self.converged and other.converged
+
+
+class Sampler:
+    """Decides which source objects are contributed to a generating schema"""
+
+    def __init__(self, config: Optional[SampleConfig] = None) -> None:
+        self.config = config if config is not None else SampleConfig()
+        if self.config.n < 1:
+            raise TosserException(f'Sample n must be at least 1, got {self.config.n}')
+
+        self.stats = SampleStats()
+        self._random = random.Random(self.config.seed)
+        self._reservoir: List[TosserObject] = []
+
+    def offer(self, obj: TosserObject) -> Optional[TosserObject]:
+        """Offer the next source object, returns it if it should be contributed now"""
+
+        i = self.stats.seen
+        self.stats.seen += 1
+
+        if self.config.mode == SampleMode.ALL:
+            return obj
+
+        if self.config.mode == SampleMode.NTH:
+            return obj if i % self.config.n == 0 else None
+
+        # reservoir objects are held until the source is exhausted
+        if len(self._reservoir) < self.config.n:
+            self._reservoir.append(obj)
+        else:
+            j = self._random.randint(0, i)
+            if j < self.config.n:
+                self._reservoir[j] = obj
+        return None
+
+    def drain(self) -> List[TosserObject]:
+        """Return objects held back until the end of the source"""
+
+        held = self._reservoir
+        self._reservoir = []
+        return held
@@ -1,22 +1,42 @@
 import os
+import sys
 import json
-from typing import Dict, Any, List, Optional, Tuple, Set
+import marshal
+import struct
+from typing import Dict, Any, List, Optional, Tuple, Set, Iterable, Iterator, BinaryIO
 from pathlib import Path
 import logging
 import dataclasses
+from collections import Counter
 
+from tosser import decoder
 from tosser.logs import LOG_MAIN
 from tosser.exceptions import TosserSchemaException
 from tosser.object import TosserObject
-from tosser.traverse import Traverser, TrailToken, TrailTokenType
-from tosser.schema_types import TosserSchemaTypeVar, TosserSchemaType, infer_type, ENUM_ELIGIBLE
+from tosser.traverse import Traverser, Trail, TrailToken, TrailTokenType, TRAIL_SHAPE_INDEX
+from tosser.schema_types import (
+    TosserSchemaTypeVar, TosserSchemaType, infer_type, infer_batch, widen_type, ENUM_ELIGIBLE
+)
 from tosser.types import TossPathT
-from tosser.util import resolve_path_ref
-from tosser.map import TosserMap
+from tosser.util import resolve_path_ref, LRUCache, CacheInfo
+from tosser.map import TosserMap, ProjectionNode
+from tosser.shape import ShapeCache, RowAnchor, ValueBlock
+from tosser.events import StreamedData
+from tosser.fingerprint import SourceFingerprint, fingerprint_file, content_hasher
+from tosser.stats import ColumnStats
+from tosser.metrics import (
+    TosserMetrics, clock as metrics_clock, STAGE_TRAVERSE, STAGE_RESOLVE, STAGE_INFER, STAGE_CONTRIBUTE
+)
 
 SCHEMA_FILE_EXT = 'toss'
 SCHEMA_DEFAULT_FILE_NAME = 'schema'
 SCHEMA_NONAME_KEY = '@value'
+SCHEMA_CACHE_EXT = 'bin' # binary cache written next to the schema file
+SCHEMA_CACHE_MAGIC = 'tosser-schema-cache'
+SCHEMA_CACHE_VERSION = 2
+
+# length prefix of each binary cache record
+_RECORD_HEADER = struct.Struct('<Q')
 
 # TODO move to config
 # schema generation
@@ -27,9 +47,53 @@ SCHEMA_ENUM_AS_HINT = True # only show enum as hint, not explicit type
 SCHEMA_ENUM_MAX = 4
 SCHEMA_VARLEN_AS_HINT = True # only constrain length as a hint, not explicit type
 SCHEMA_VARLEN_PAD = 10 # add padding to contrained length
+# column attribute resolution
+SCHEMA_RESOLUTION_CACHE_SIZE = 4096 # trail shapes remembered per schema
+SCHEMA_SHAPE_CACHE_SIZE = 1024 # object key structures remembered per schema, 0 resolves every trail
+# buffer this many values per column and infer them together, 0 handles each value directly
+SCHEMA_BATCH_SIZE = 0
+# contribute at most this many evenly spaced elements of an array of primitives, 0 takes all
+SCHEMA_ARRAY_SAMPLE = 0
+# debugging
+SCHEMA_TRACE = False # print every traversed value and its resolved attributes
+
+
+def _stream_json_dict(items: Iterable[Tuple[str, Any]], level: int) -> Iterator[str]:
+    """
+    Stream a dict the way json.dumps(indent=4) renders it at nesting `level`.
+    Values may be generators from nested calls, which are streamed in place.
+    """
+
+    pad = '\n' + ' ' * (4 * (level + 1))
+    empty = True
+    for key, value in items:
+        yield ('{' if empty else ',') + pad + json.dumps(key) + ': '
+        empty = False
+        if isinstance(value, Iterator):
+            yield from value
+        else:
+            yield json.dumps(value, indent=4).replace('\n', pad)
+    yield '{}' if empty else '\n' + ' ' * (4 * level) + '}'
+
+
+def _write_record(f: BinaryIO, obj: Any) -> None:
+    data = marshal.dumps(obj)
+    f.write(_RECORD_HEADER.pack(len(data)))
+    f.write(data)
+
 
+def _read_record(f: BinaryIO) -> Any:
+    header = f.read(_RECORD_HEADER.size)
+    if len(header) < _RECORD_HEADER.size:
+        raise EOFError('Truncated schema cache record')
+    size, = _RECORD_HEADER.unpack(header)
+    data = f.read(size)
+    if len(data) < size:
+        raise EOFError('Truncated schema cache record')
+    return marshal.loads(data)
 
-@dataclasses.dataclass()
+
+@dataclasses.dataclass(slots=True)
 class TosserSchemaColumn:
     table_name: str
     column_name: str
@@ -38,6 +102,12 @@ class TosserSchemaColumn:
     enum: Optional[Set[Any]] = None
     max_length: Optional[int] = None
 
+    # value statistics, enum and length hints are derived from these when generation ends
+    stats: Optional[ColumnStats] = dataclasses.field(default=None, repr=False)
+
+    # values waiting for batched inference
+    buffer: Optional[List[Any]] = dataclasses.field(default=None, repr=False)
+
     def __eq__(self, __value: object) -> bool:
         if not isinstance(__value, TosserSchemaColumn):
             return False
@@ -45,11 +115,14 @@ class TosserSchemaColumn:
             and __value.column_name == self.column_name
 
 
-@dataclasses.dataclass()
+@dataclasses.dataclass(slots=True)
 class TosserSchemaTable:
     table_name: str
     parent: Optional['TosserSchemaTable'] = None
 
+    # column name -> column, kept in insertion order for rendering
+    columns: Dict[str, TosserSchemaColumn] = dataclasses.field(default_factory=dict, repr=False)
+
     # probably getting rid of this
     # table_trail: Optional[List[TrailToken]] = None
 
@@ -76,6 +149,11 @@ class TosserSchema:
         ) -> None:
         self._log = logging.getLogger(LOG_MAIN)
 
+        # trail shape -> resolved column attributes, cleared whenever the map changes
+        self._resolution_cache = LRUCache(SCHEMA_RESOLUTION_CACHE_SIZE)
+        # object key structure -> column slots, cleared along with the resolution cache
+        self._shape_cache = ShapeCache(SCHEMA_SHAPE_CACHE_SIZE)
+
         # config and metadata
         self.map = map
         self.complete = True
@@ -87,65 +165,178 @@ class TosserSchema:
             self.path = resolve_path_ref(path, check=False)
             self.filename = os.path.basename(self.path)
 
-        # schema data
-        self.schema: Dict[TosserSchemaTable, List[TosserSchemaColumn]] = {}
+        # schema data, table name -> table (holding its columns by name)
+        self.schema: Dict[str, TosserSchemaTable] = {}
+
+        # source file path -> fingerprint of the file contributed to this schema
+        self.sources: Dict[str, SourceFingerprint] = {}
 
         # schema generation internal
         self._generating = False
         self._gen_n = 0
+        self.stable_n = 0 # consecutive contributions that did not change the schema
+
+        # values per column buffered before inference, see SCHEMA_BATCH_SIZE
+        self.batch_size = SCHEMA_BATCH_SIZE
+        # elements of primitive arrays contributed per array, see SCHEMA_ARRAY_SAMPLE
+        self.array_sample = SCHEMA_ARRAY_SAMPLE
+
+        # instrumentation
+        self.metrics = TosserMetrics()
+        self.trace = SCHEMA_TRACE
+
+    
+    @property
+    def map(self) -> TosserMap:
+        return self._map
+
+    @map.setter
+    def map(self, map: TosserMap) -> None:
+        self._map = map
 
         # store an instantiated root table object to avoid repeat instantiation
         self.root_table = TosserSchemaTable(
-            table_name=self.map.m_root_table,
+            table_name=map.m_root_table,
             # table_trail=[],
             parent=None
         )
+        self.invalidate_resolution_cache()
+
+    @property
+    def projection(self) -> Optional[ProjectionNode]:
+        """Compiled @ignore/@keep directives of the map, None when every path is walked"""
+
+        return self._projection
+
+    def invalidate_resolution_cache(self) -> None:
+        """Forget resolved column attributes and recompile map directives, call after mutating the map in place"""
+
+        self._resolution_cache.clear()
+        self._shape_cache.clear()
+        self._projection = self._map.projection()
+
+    def resolution_cache_info(self) -> CacheInfo:
+        """Hit/miss counters and size of the column attribute resolution cache"""
+
+        return self._resolution_cache.info()
+
+    def skipped_resolutions(self) -> int:
+        """Column lookups the shape cache answered without reaching the resolution cache"""
+
+        return self._shape_cache.skipped_resolutions
+
+    def shape_cache_info(self) -> CacheInfo:
+        """Hit/miss counters and size of the object key structure cache"""
+
+        return self._shape_cache.info()
+
+    def iter_values(self, obj: TosserObject, anchors: bool = False, blocks: bool = False) \
+        -> Iterator[Tuple[Tuple[TosserSchemaTable, str, List[TosserSchemaTable]], Any, Optional[RowAnchor]]]:
+        """
+        Yield the column attributes and row anchor of each value of an object, see ShapeCache.
+        Trails are only resolved for key structures not seen before.
+        With `blocks`, arrays of primitives may come as one ValueBlock.
+        """
+
+        resolve = self.metrics.timed(self.get_column_attributes, STAGE_RESOLVE)
+        if self._shape_cache.maxsize > 0:
+            yield from self._shape_cache.iter_values(obj, resolve, self._projection, anchors=anchors, blocks=blocks)
+            return None
+
+        if anchors:
+            raise TosserSchemaException('Row anchors need the shape cache enabled')
+        for trail, _, value in Traverser(rules=None, projection=self._projection).traverse(obj):
+            yield resolve(trail), value, None
 
-    
     # def nearest_parent_table(self, trail: List[TrailToken]) -> TosserSchemaTable:
     #     ...
 
 
     def has_table(self, table: TosserSchemaTable) -> bool:
-        return any(t == table for t in self.schema.keys())
+        return table.table_name in self.schema
+
+    def get_table(self, table_name: str) -> TosserSchemaTable:
+        return self.schema[table_name]
     
     def has_column_by_name(self, table: TosserSchemaTable, column_name: str) -> bool:
-        return any(c.column_name == column_name for c in self.schema[table])
+        return column_name in self.schema[table.table_name].columns
     
     def get_column_by_name(self, table: TosserSchemaTable, column_name: str) -> TosserSchemaColumn:
-        return next(c for c in self.schema[table] if c.column_name == column_name)
+        return self.schema[table.table_name].columns[column_name]
 
-    def begin(self) -> None:
-        """Begin a new schema generation"""
+    def add_table(self, table: TosserSchemaTable) -> None:
+        self.schema[table.table_name] = table
+
+    def add_column(self, column: TosserSchemaColumn) -> None:
+        self.schema[column.table_name].columns[column.column_name] = column
+
+    def begin(self, reset: bool = True) -> None:
+        """Begin a new schema generation, keep existing schema data to widen it if not `reset`"""
         
         self.complete = False
         self._generating = True
         self._gen_n = 0 # counting contributions
-        self.schema = {}
+        self.stable_n = 0
+        if reset:
+            self.schema = {}
+            self.sources = {}
+            # cached attributes point at tables of the previous run
+            self.root_table = TosserSchemaTable(table_name=self._map.m_root_table)
+            self.invalidate_resolution_cache()
 
-        self._log.info('Beginning new schema generation')
+        self._log.info(f'Beginning {"new" if reset else "incremental"} schema generation')
 
 
-    def contribute(self, obj: TosserObject) -> None:
-        """Contribute a TosserObject to a generating schema"""
+    def contribute(self, obj: TosserObject) -> bool:
+        """
+        Contribute a TosserObject to a generating schema.
+        Return whether it added a table or column or widened a column type.
+        StreamedData is contributed while it is parsed, values are never held as a whole.
+        """
 
         if not self._generating:
             raise TosserSchemaException('Cannot contribute an object to a non-generating TosserSchema')
-        
-        # full traverse
-        tr = Traverser(rules=None)
-        for trail, key, value in tr.traverse(obj):
-            assert trail[-1].val == key
 
-            print(f'{Traverser.get_trail_string(trail)} = {value}')
+        # full traverse, tracing needs each trail so it skips the shape cache
+        values: Iterator[Tuple[Tuple[TosserSchemaTable, str, List[TosserSchemaTable]], Any, Optional[RowAnchor]]]
+        if isinstance(obj.data, StreamedData):
+            values = self._event_values(obj.data)
+        elif self.trace:
+            values = self._trace_values(obj)
+        else:
+            values = self.iter_values(obj, blocks=True)
+        return self._contribute_values(values, obj.metadata)
+
+
+    def _contribute_values(
+            self,
+            values: Iterator[Tuple[Tuple[TosserSchemaTable, str, List[TosserSchemaTable]], Any, Any]],
+            metadata: Optional[Dict[str, Any]]
+        ) -> bool:
+        changed = False
+        trace = self.trace
+        metrics = self.metrics
+        profiling = metrics.enabled
+        if profiling:
+            contribute_start = metrics_clock()
+
+        # timing wrappers are only applied when profiling
+        infer = metrics.timed(infer_type, STAGE_INFER)
+        batch_size = self.batch_size
+        if profiling:
+            shape_info = self._shape_cache.info()
+
+        n_values = 0
+        for (next_table, next_column_name, table_deps), value, _ in metrics.timed_iter(values, STAGE_TRAVERSE):
+            n_values += 1
 
             # determine table and column data
             # if table name does not exist, create it
             # if table depends on other tables, create those tables
             # if column name does not exist, create it
-            next_table, next_column_name, table_deps = self.get_column_attributes(trail)
 
-            print('attrs:', next_table, next_column_name, table_deps)
+            if trace:
+                print('attrs:', next_table, next_column_name, table_deps)
 
             # create tables if not exists in order of dependency
             # next table -> parent table -> parent's parent table -> ...
@@ -163,19 +354,29 @@ class TosserSchema:
                 assert parent_table is None or self.has_table(parent_table)
                 assert table.parent is None or table.parent == parent_table
 
-                # note: don't think creating a duplicate table is necessary
-                # table_key = dataclasses.replace(
-                #     table,
-                #     parent=parent_table
-                # )
-
-                self.schema[table] = []
+                # resolved tables are cached across runs, the schema holds its own copy for columns
+                self.add_table(TosserSchemaTable(
+                    table_name=table.table_name,
+                    parent=self.get_table(parent_table.table_name) if parent_table is not None else None,
+                ))
+                changed = True
+
+            # arrays of primitives arrive as one block of values for the same column
+            if type(value) is ValueBlock:
+                block = value.values
+                if 0 < self.array_sample < len(block):
+                    step = -(-len(block) // self.array_sample)
+                    block = block[::step]
+                    metrics.count('array values sampled out', len(value.values) - len(block))
+                n_values += len(block) - 1
+                changed = self._contribute_block(next_table, next_column_name, block, infer) or changed
+                continue
 
             # new column initializations
             if not self.has_column_by_name(next_table, next_column_name):
                 
                 # infer initial type
-                initial_type = infer_type(value)
+                initial_type = infer(value)
                 
                 new_column = TosserSchemaColumn(
                     table_name=next_table.table_name,
@@ -183,59 +384,196 @@ class TosserSchema:
                     type_var=initial_type,
                 )
 
-                # if initial type is enum eligible, add value to initial enum tester
-                if initial_type.type in ENUM_ELIGIBLE:
-                    new_column.enum = {value}
+                new_column.stats = ColumnStats()
+                new_column.stats.add(value)
 
-                # if initial type is max length eligible, add value to initial max length tester
-                if initial_type.type in [TosserSchemaType.STRING]:
-                    new_column.max_length = len(str(value))
+                self.add_column(new_column)
+                changed = True
 
-                self.schema[next_table].append(new_column)
+            # existing column updates, batched
+            elif batch_size > 0:
+                existing_column = self.get_column_by_name(next_table, next_column_name)
+                buffer = existing_column.buffer
+                if buffer is None:
+                    buffer = existing_column.buffer = []
+                buffer.append(value)
+                if len(buffer) >= batch_size:
+                    changed = self._flush_column(existing_column) or changed
 
             # existing column updates
             else:
                 existing_column = self.get_column_by_name(next_table, next_column_name)
                 
                 # update type inference
-                existing_column.type_var = infer_type(value, inference=existing_column.type_var)
+                next_type = infer(value, inference=existing_column.type_var)
+                if next_type != existing_column.type_var:
+                    existing_column.type_var = next_type
+                    changed = True
                 
-                # update enum
-                if existing_column.enum is not None and len(existing_column.enum) < SCHEMA_ENUM_MAX:
-                        existing_column.enum.add(value)
-
-                # update max length
-                if existing_column.type_var.type in [TosserSchemaType.STRING]:
-                    if existing_column.max_length is not None:
-                        existing_column.max_length = max(existing_column.max_length, len(str(value)))
-                    else:
-                        existing_column.max_length = len(str(value))
-                else:
-                    existing_column.max_length = None
-
-            print()
+                # update value statistics, columns loaded without them start from their hints
+                if existing_column.stats is None:
+                    existing_column.stats = ColumnStats()
+                    existing_column.stats.seed(existing_column.enum, existing_column.max_length, SCHEMA_ENUM_MAX)
+                existing_column.stats.add(value)
+
+            if trace:
+                print()
         
-        file_id_str = ''
-        if (
-            obj.metadata is not None 
-            and '__TOSSER_filename_key' in obj.metadata 
-            and obj.metadata['__TOSSER_filename_key'] in obj.metadata
-        ):
-            file_id_str = f' from file {obj.metadata[obj.metadata["__TOSSER_filename_key"]]}'
-
-        self._log.debug(f'Contributed object {self._gen_n}{file_id_str} to new schema')
+        if self._log.isEnabledFor(logging.DEBUG):
+            file_id_str = ''
+            if (
+                metadata is not None 
+                and '__TOSSER_filename_key' in metadata 
+                and metadata['__TOSSER_filename_key'] in metadata
+            ):
+                file_id_str = f' from file {metadata[metadata["__TOSSER_filename_key"]]}'
+
+            self._log.debug(f'Contributed object {self._gen_n}{file_id_str} to new schema')
+
+        if profiling:
+            metrics.add_time(STAGE_CONTRIBUTE, metrics_clock() - contribute_start)
+            metrics.count('objects contributed')
+            metrics.count('values contributed', n_values)
+            shape_hits, shape_misses = self._shape_cache.info()[:2]
+            metrics.count('shape cache hits', shape_hits - shape_info.hits)
+            metrics.count('shape cache misses', shape_misses - shape_info.misses)
+            if changed:
+                metrics.count('objects changing schema')
+
         self._gen_n += 1
+        self.stable_n = 0 if changed else self.stable_n + 1
+
+        return changed
+
+    
+    def _trace_values(self, obj: TosserObject) \
+        -> Iterator[Tuple[Tuple[TosserSchemaTable, str, List[TosserSchemaTable]], Any, None]]:
+        """Resolve every trail, printing each value and its attributes"""
+
+        get_column_attributes = self.metrics.timed(self.get_column_attributes, STAGE_RESOLVE)
+        for trail, key, value in Traverser(rules=None, projection=self._projection).traverse(obj):
+            assert trail[-1].val == key
+            print(f'{Traverser.get_trail_string(trail)} = {value}')
+            yield get_column_attributes(trail), value, None
+
+
+    def _event_values(self, data: StreamedData) \
+        -> Iterator[Tuple[Tuple[TosserSchemaTable, str, List[TosserSchemaTable]], Any, None]]:
+        """Resolve each value reported while the data is parsed, see iter_value_events"""
+
+        get_column_attributes = self.metrics.timed(self.get_column_attributes, STAGE_RESOLVE)
+        for trail, value, _ in data.events(projection=self._projection):
+            # trails are only left out of the events closing array elements, which need anchors
+            assert trail is not None
+            if self.trace:
+                print(f'{Traverser.get_trail_string(trail)} = {value}')
+            yield get_column_attributes(trail), value, None
+
+
+    def _contribute_block(
+            self,
+            table: TosserSchemaTable,
+            column_name: str,
+            values: List[Any],
+            infer: Any
+        ) -> bool:
+        """Contribute values of one column together, buffered up to the batch size if batching"""
+
+        changed = False
+        if not self.has_column_by_name(table, column_name):
+            first = values[0]
+            column = TosserSchemaColumn(
+                table_name=table.table_name,
+                column_name=column_name,
+                type_var=infer(first),
+            )
+            column.stats = ColumnStats()
+            column.stats.add(first)
+            self.add_column(column)
+            changed = True
+            values = values[1:]
+        else:
+            column = self.get_column_by_name(table, column_name)
+
+        if column.buffer is None:
+            column.buffer = list(values)
+        else:
+            column.buffer.extend(values)
+        if self.batch_size <= 0 or len(column.buffer) >= self.batch_size:
+            changed = self._flush_column(column) or changed
+        return changed
+
+
+    def _flush_column(self, column: TosserSchemaColumn) -> bool:
+        """Infer and record buffered column values in one pass, return whether the type widened"""
+
+        values = column.buffer
+        column.buffer = None
+        if not values:
+            return False
+
+        # distinct values carry all the information inference and the sketches need,
+        # keyed by type as well so 1, 1.0 and True are not folded together
+        counts = Counter(zip(map(type, values), values))
+        distinct = [value for _, value in counts]
+        next_type = self.metrics.timed(infer_batch, STAGE_INFER)(distinct, column.type_var)
+
+        if column.stats is None:
+            column.stats = ColumnStats()
+            column.stats.seed(column.enum, column.max_length, SCHEMA_ENUM_MAX)
+        column.stats.add_counts(zip(distinct, counts.values()))
+
+        if next_type != column.type_var:
+            column.type_var = next_type
+            return True
+        return False
 
+    
+    def is_converged(self, k: int) -> bool:
+        """
+        True once the last `k` contributions left the schema unchanged.
+        Buffered values are inferred first, a type they widen starts the count over.
+        """
+
+        if self._gen_n == 0 or self.stable_n < k:
+            return False
+        changed = False
+        for table in self.schema.values():
+            for column in table.columns.values():
+                if column.buffer:
+                    changed = self._flush_column(column) or changed
+        if changed:
+            self.stable_n = 0
+        return not changed
 
-    def get_column_attributes(self, trail: List[TrailToken]) \
+
+    def get_column_attributes(self, trail: Trail | List[TrailToken]) \
         -> Tuple[TosserSchemaTable, str, List[TosserSchemaTable]]:
         """
         Determine column attiributes from a given traversal trail.
         Includes table data object, column name, and table dependencies.
 
         This data is independent of the schema data structure and type inference.
+        Results are cached by trail shape, array indices do not affect the outcome.
         """
 
+        if isinstance(trail, Trail):
+            shape = trail.shape
+        else:
+            shape = tuple(
+                token.val if token.type == TrailTokenType.KEY else TRAIL_SHAPE_INDEX
+                for token in trail
+            )
+        attributes: Optional[Tuple[TosserSchemaTable, str, List[TosserSchemaTable]]] = self._resolution_cache.get(shape)
+        if attributes is None:
+            attributes = self._resolve_column_attributes(list(trail))
+            self._resolution_cache.put(shape, attributes)
+        return attributes
+
+
+    def _resolve_column_attributes(self, trail: List[TrailToken]) \
+        -> Tuple[TosserSchemaTable, str, List[TosserSchemaTable]]:
+
         root_table = self.map.m_root_table
         delim = self.map.m_table_delimeter
         SCHEMA_PREPEND_ROOT = False
@@ -293,7 +631,6 @@ class TosserSchema:
 
             next_table_parts = []
             next_column_parts = []
-            is_last_token = trail_idx == len(traverse_trail) - 1
 
             # this is going to help look ahead for array relationship table names
             def _get_next_part(n=1) -> Optional[TrailToken]:
@@ -326,7 +663,8 @@ class TosserSchema:
                     if seek_part is not None:
                         list_deps.append(seek_part)
                 
-                print('list deps:', list_deps)
+                if self.trace:
+                    print('list deps:', list_deps)
                 for list_dep in list_deps:
                     next_table_parts.append(list_dep.val)
 
@@ -374,9 +712,11 @@ class TosserSchema:
         if self.complete or not self._generating:
             raise TosserSchemaException('Cannot end an already complete TosserSchema')
         
-        # close out all enum hints
-
-        # finalize length hints
+        # close out enum and length hints
+        for table in self.schema.values():
+            for column in table.columns.values():
+                self._flush_column(column)
+                self._finalize_column(column)
 
         self.complete = True
         self._generating = False
@@ -384,70 +724,296 @@ class TosserSchema:
         self._log.info(f'Ending new schema generation: contributed {self._gen_n} objects')
 
 
+    def _finalize_column(self, column: TosserSchemaColumn) -> None:
+        """Derive enum and length hints of a column from its statistics"""
+
+        stats = column.stats
+        if stats is None:
+            return
+
+        column.enum = stats.enum(SCHEMA_ENUM_MAX) if column.type_var.type in ENUM_ELIGIBLE else None
+
+        if column.type_var.type in [TosserSchemaType.STRING]:
+            column.max_length = stats.max_length
+            if column.max_length is not None and SCHEMA_VARLEN_AS_HINT:
+                column.hint_type_var = TosserSchemaTypeVar(
+                    type=TosserSchemaType.STRING,
+                    length=column.max_length + SCHEMA_VARLEN_PAD
+                )
+        else:
+            column.max_length = None
+
+
+    def merge(self, other: 'TosserSchema') -> None:
+        """
+        Merge another (partial) schema into this one.
+        Types are widened, enums are unioned, max lengths take the larger value
+        and missing table parents are filled in. The merged content does not
+        depend on the order partial schemas are merged in.
+        """
+
+        for table_name, other_table in other.schema.items():
+            if table_name not in self.schema:
+                self.add_table(TosserSchemaTable(table_name=table_name))
+            table = self.schema[table_name]
+
+            if other_table.parent is not None and (
+                table.parent is None or other_table.parent.table_name < table.parent.table_name
+            ):
+                table.parent = TosserSchemaTable(table_name=other_table.parent.table_name)
+
+            for column_name, other_column in other_table.columns.items():
+                if column_name not in table.columns:
+                    stats = None
+                    if other_column.stats is not None:
+                        stats = ColumnStats()
+                        stats.merge(other_column.stats)
+                    self.add_column(dataclasses.replace(
+                        other_column,
+                        enum=set(other_column.enum) if other_column.enum is not None else None,
+                        stats=stats,
+                        buffer=None,
+                    ))
+                else:
+                    self._merge_column(table.columns[column_name], other_column)
+
+        # point parents at this schema's table objects
+        for table in self.schema.values():
+            if table.parent is not None and table.parent.table_name in self.schema:
+                table.parent = self.schema[table.parent.table_name]
+
+        self._gen_n += other._gen_n
+
+
+    def _merge_column(self, column: TosserSchemaColumn, other: TosserSchemaColumn) -> None:
+        column.type_var = widen_type(column.type_var, other.type_var)
+
+        if column.hint_type_var is None or other.hint_type_var is None:
+            column.hint_type_var = column.hint_type_var or other.hint_type_var
+        else:
+            column.hint_type_var = widen_type(column.hint_type_var, other.hint_type_var)
+
+        if column.stats is not None or other.stats is not None:
+            stats = ColumnStats()
+            for side in [column, other]:
+                if side.stats is not None:
+                    stats.merge(side.stats)
+                else:
+                    stats.seed(side.enum, side.max_length, SCHEMA_ENUM_MAX)
+            column.stats = stats
+            self._finalize_column(column)
+            return
+
+        # columns without statistics fall back to combining their hints,
+        # keeping a deterministic subset once the union passes the enum cap
+        if column.enum is not None or other.enum is not None:
+            enum = (column.enum or set()) | (other.enum or set())
+            if len(enum) > SCHEMA_ENUM_MAX:
+                enum = set(sorted(enum, key=lambda v: (type(v).__name__, repr(v)))[:SCHEMA_ENUM_MAX])
+            column.enum = enum
+
+        if column.type_var.type in [TosserSchemaType.STRING]:
+            lengths = [n for n in (column.max_length, other.max_length) if n is not None]
+            column.max_length = max(lengths) if len(lengths) > 0 else None
+        else:
+            column.max_length = None
+
+
     def load_file(self) -> None:
-        """Load schema from file"""
+        """Load schema from file, using the binary cache when it matches the file"""
         
         self._log.info(f'Loading schema from file: {self.filename}')
-        with open(self.path, 'r') as f:
-            data = json.load(f)
+        cached = self._read_cache()
+        if cached is not None:
+            self._log.debug(f'Using schema cache: {self.cache_path()}')
+            metadata, tables = cached
+            self._load_data(metadata, tables)
+            return
+
+        with open(self.path, 'rb') as f:
+            data = decoder.load(f)
 
         if any(k not in data for k in [TosserSchema.DATA_KEY, TosserSchema.METADATA_KEY]):
             self._log.info('Schema file is missing required keys, skipping')
             return
 
-        version = None
-        if TosserSchema.METADATA_KEY in data:
-            metadata = data[TosserSchema.METADATA_KEY]
-            version = metadata['version']
+        self._load_data(data[TosserSchema.METADATA_KEY], data[TosserSchema.DATA_KEY].items())
+        self._write_cache(fingerprint_file(self.path, content_hash=True))
+
+
+    def _load_data(self, metadata: Dict[str, Any], tables: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        version = metadata['version']
+        self.sources = {
+            path: SourceFingerprint.from_dict(fingerprint)
+            for path, fingerprint in metadata.get('sources', {}).items()
+        }
         self._log.debug(f'Loaded schema version: {version}')
         
-        self.schema = {
-            table_name: [
-                TosserSchemaColumn(
+        self.schema = {}
+        for table_name, columns in tables:
+            self.add_table(TosserSchemaTable(table_name=table_name))
+            for column_name, column_data in columns.items():
+                hint = column_data['hint']
+                self.add_column(TosserSchemaColumn(
                     table_name=table_name,
                     column_name=column_name,
                     type_var=TosserSchemaTypeVar.from_string(column_data['type']),
-                    hint_type_var=TosserSchemaTypeVar.from_string(column_data['hint']) if column_data['hint'] is not None else None,
+                    hint_type_var=TosserSchemaTypeVar.from_string(hint) if hint is not None else None,
                     enum=set(column_data['enum']) if column_data['enum'] is not None else None,
                     max_length=column_data['max_length'],
-                )
-                for column_name, column_data in columns.items()
-            ]
-            for table_name, columns in data[TosserSchema.DATA_KEY].items()
-        }
+                    stats=ColumnStats.from_dict(column_data['stats']) if column_data.get('stats') is not None else None,
+                ))
 
 
     def write_file(self, work_dir: Path) -> None:
-        """Write schema to file"""
+        """Stream schema to file and refresh its binary cache"""
 
         filepath = work_dir / self.filename
         self._log.info(f'Writing schema to file: {filepath}')
-        with open(filepath, 'w') as f:
-            f.write(self._render())
 
+        # render to a temporary file so a failed render leaves no partial schema
+        temp_path = filepath.with_name(f'{filepath.name}.tmp')
+        digest = content_hasher()
+        try:
+            with open(temp_path, 'w') as f:
+                for chunk in self._iter_render():
+                    f.write(chunk)
+                    digest.update(chunk.encode('utf-8'))
+        except TypeError:
+            self._log.error('Failed to render schema to JSON')
+            os.remove(temp_path)
+            with open(filepath, 'w') as f:
+                f.write('{}')
+            return
+        os.replace(temp_path, filepath)
+
+        stat = os.stat(filepath)
+        self._write_cache(
+            SourceFingerprint(size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=digest.hexdigest()),
+            path=filepath
+        )
 
-    def _render(self) -> str:
-        data: Dict[str, Any] = {
-            TosserSchema.DATA_KEY: {
-                table.table_name: {
-                    column.column_name: {
-                        'type': str(column.type_var),
-                        'hint': str(column.hint_type_var) if column.hint_type_var is not None else None,
-                        'enum': list(column.enum) if column.enum is not None else None,
-                        'max_length': column.max_length,
-                    }
-                    for column in columns
-                }
-                for table, columns in self.schema.items()
-            }
+
+    def cache_path(self, path: Optional[Path] = None) -> Path:
+        """Path of the binary cache kept next to a schema file"""
+
+        path = path if path is not None else self.path
+        return path.with_name(f'{path.name}.{SCHEMA_CACHE_EXT}')
+
+
+    def _write_cache(self, fingerprint: SourceFingerprint, path: Optional[Path] = None) -> None:
+        """
+        Write the binary cache as a sequence of length prefixed marshal records: a header holding
+        the fingerprint of the schema file it mirrors, the metadata, one record
+        per table and a closing None.
+        """
+
+        cache_path = self.cache_path(path)
+        temp_path = cache_path.with_name(f'{cache_path.name}.tmp')
+        try:
+            with open(temp_path, 'wb') as f:
+                _write_record(f, (
+                    SCHEMA_CACHE_MAGIC,
+                    SCHEMA_CACHE_VERSION,
+                    tuple(sys.version_info[:2]),
+                    fingerprint.size,
+                    fingerprint.mtime_ns,
+                    fingerprint.hash,
+                ))
+                _write_record(f, self._metadata())
+                for table in self.schema.values():
+                    _write_record(f, (
+                        table.table_name,
+                        {
+                            column.column_name: self._column_data(column, registers=True)
+                            for column in table.columns.values()
+                        },
+                    ))
+                _write_record(f, None)
+            os.replace(temp_path, cache_path)
+        except (OSError, ValueError) as e:
+            self._log.warning(f'Failed to write schema cache {cache_path}: {e}')
+
+
+    def _read_cache(self) -> Optional[Tuple[Dict[str, Any], List[Tuple[str, Dict[str, Any]]]]]:
+        """Return cached metadata and tables if the cache matches the schema file"""
+
+        cache_path = self.cache_path()
+        if not cache_path.exists():
+            return None
+
+        try:
+            with open(cache_path, 'rb') as f:
+                magic, version, py_version, size, mtime_ns, file_hash = _read_record(f)
+                if (
+                    magic != SCHEMA_CACHE_MAGIC
+                    or version != SCHEMA_CACHE_VERSION
+                    or tuple(py_version) != tuple(sys.version_info[:2])
+                ):
+                    return None
+
+                # content is only hashed when size and mtime can't vouch for the file
+                cached = SourceFingerprint(size=size, mtime_ns=mtime_ns, hash=file_hash)
+                if not cached.matches(fingerprint_file(self.path, previous=cached, content_hash=True)):
+                    self._log.debug(f'Schema cache is stale: {cache_path}')
+                    return None
+
+                metadata = _read_record(f)
+                tables = []
+                while (record := _read_record(f)) is not None:
+                    tables.append(record)
+            return metadata, tables
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            self._log.warning(f'Failed to read schema cache {cache_path}: {e}')
+            return None
+
+
+    def _column_data(self, column: TosserSchemaColumn, registers: bool = False) -> Dict[str, Any]:
+        return {
+            'type': str(column.type_var),
+            'hint': str(column.hint_type_var) if column.hint_type_var is not None else None,
+            'enum': list(column.enum) if column.enum is not None else None,
+            'max_length': column.max_length,
+            'stats': column.stats.to_dict(registers) if column.stats is not None else None,
         }
 
-        data[TosserSchema.METADATA_KEY] = {
+
+    def _metadata(self) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {
             'version': 1
         }
+        if len(self.sources) > 0:
+            metadata['sources'] = {
+                path: fingerprint.to_dict()
+                for path, fingerprint in self.sources.items()
+            }
+        return metadata
+
+
+    def _iter_render(self) -> Iterator[str]:
+        """Stream the schema as JSON, identical to json.dumps(..., indent=4) of the whole schema"""
 
+        metadata = self._metadata()
+        sources = metadata.pop('sources', None)
+        metadata_items: List[Tuple[str, Any]] = list(metadata.items())
+        if sources is not None:
+            metadata_items.append(('sources', _stream_json_dict(sources.items(), 2)))
+
+        yield from _stream_json_dict([
+            (TosserSchema.DATA_KEY, _stream_json_dict((
+                (table.table_name, _stream_json_dict((
+                    (column.column_name, self._column_data(column))
+                    for column in table.columns.values()
+                ), 2))
+                for table in self.schema.values()
+            ), 1)),
+            (TosserSchema.METADATA_KEY, _stream_json_dict(metadata_items, 1)),
+        ], 0)
+
+
+    def _render(self) -> str:
         try:
-            return json.dumps(data, indent=4)
+            return ''.join(self._iter_render())
         except TypeError:
             self._log.error('Failed to render schema to JSON')
             return '{}'
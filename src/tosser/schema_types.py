@@ -1,7 +1,12 @@
-from typing import Optional
+import re
+from typing import Optional, Dict, Any, Tuple, FrozenSet, Iterable
 from enum import Enum
+from functools import lru_cache
 import dataclasses
 
+INFER_CACHE_SIZE = 8192 # recent string values remembered by inference
+INFER_MAX_MATCH_LENGTH = 40 # longer strings are never numeric or temporal
+
 
 class TosserSchemaType(Enum):
     """Schema type enum"""
@@ -22,7 +27,7 @@ ENUM_ELIGIBLE = [
     TosserSchemaType.STRING,
 ]
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class TosserSchemaTypeVar:
     """Wrap schema types with metadata"""
     
@@ -38,9 +43,13 @@ class TosserSchemaTypeVar:
             return f'{self.type.value}({self.length})'
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def from_string(type_str: str) -> 'TosserSchemaTypeVar':
         """Create a TosserSchemaTypeVar from a string"""
 
+        if '(' not in type_str:
+            return TYPE_VARS[TosserSchemaType(type_str)]
+
         length = None
         length_part = type_str.split('(')
         if len(length_part) > 1:
@@ -53,9 +62,113 @@ class TosserSchemaTypeVar:
         )
 
 
-def infer_type(value, inference=Optional[TosserSchemaTypeVar]) -> TosserSchemaTypeVar:
+# shared instances for unsized types, type vars are immutable
+TYPE_VARS: Dict[TosserSchemaType, TosserSchemaTypeVar] = {
+    t: TosserSchemaTypeVar(type=t) for t in TosserSchemaType
+}
+
+# python types of decoded JSON values
+_PY_TYPES: Dict[type, TosserSchemaTypeVar] = {
+    type(None): TYPE_VARS[TosserSchemaType.NULL],
+    bool: TYPE_VARS[TosserSchemaType.BOOLEAN],
+    int: TYPE_VARS[TosserSchemaType.INTEGER],
+    float: TYPE_VARS[TosserSchemaType.DECIMAL],
+    dict: TYPE_VARS[TosserSchemaType.OBJECT],
+    list: TYPE_VARS[TosserSchemaType.ARRAY],
+}
+
+_DATE = r'\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01])'
+_TIME = r'(?:[01]\d|2[0-3]):[0-5]\d(?::[0-5]\d(?:\.\d+)?)?'
+
+# one pass over a string picks the first alternative matching it whole
+_STRING_MATCHER = re.compile(
+    r'(?P<integer>-?(?:0|[1-9]\d*))'
+    r'|(?P<decimal>-?(?:0|[1-9]\d*)(?:\.\d+(?:[eE][+-]?\d+)?|[eE][+-]?\d+))'
+    rf'|(?P<datetime>{_DATE}[T ]{_TIME}(?:Z|[+-](?:[01]\d|2[0-3]):?[0-5]\d)?)'
+    rf'|(?P<date>{_DATE})'
+    rf'|(?P<time>{_TIME})'
+)
+
+# only strings starting with these can match
+_MATCH_FIRST_CHARS: FrozenSet[str] = frozenset('-0123456789')
+
+_STRING = TYPE_VARS[TosserSchemaType.STRING]
+
+# type pairs that widen to something narrower than a string
+_WIDENINGS: Dict[FrozenSet[TosserSchemaType], TosserSchemaType] = {
+    frozenset([TosserSchemaType.INTEGER, TosserSchemaType.DECIMAL]): TosserSchemaType.DECIMAL,
+    frozenset([TosserSchemaType.DATE, TosserSchemaType.DATETIME]): TosserSchemaType.DATETIME,
+}
+
+
+@lru_cache(maxsize=INFER_CACHE_SIZE)
+def _infer_string(value: str) -> TosserSchemaTypeVar:
+    match = _STRING_MATCHER.fullmatch(value)
+    if match is None:
+        return _STRING
+    assert match.lastgroup is not None
+    return TYPE_VARS[TosserSchemaType(match.lastgroup)]
+
+
+def infer_type(value: Any, inference: Optional[TosserSchemaTypeVar] = None) -> TosserSchemaTypeVar:
     """
     Infer the type of a value
-    Accept optional `inference` argument holding existing inference data
+    Accept optional `inference` argument holding existing inference data,
+    the result is then `inference` widened to also hold `value`
     """
-    return TosserSchemaTypeVar.from_string('string')
+
+    # nothing is wider than a string, no need to look at the value
+    if inference is not None and inference.type == TosserSchemaType.STRING:
+        return inference
+
+    value_type = type(value)
+    if value_type is str:
+        if len(value) == 0 or len(value) > INFER_MAX_MATCH_LENGTH or value[0] not in _MATCH_FIRST_CHARS:
+            inferred = _STRING
+        else:
+            inferred = _infer_string(value)
+    else:
+        inferred = _PY_TYPES.get(value_type, TYPE_VARS[TosserSchemaType.UNKNOWN])
+
+    if inference is None or inferred.type == inference.type:
+        return inference or inferred
+    return widen_type(inference, inferred)
+
+
+def infer_batch(values: Iterable[Any], inference: Optional[TosserSchemaTypeVar] = None) -> TosserSchemaTypeVar:
+    """
+    Infer the type holding all `values`, widening `inference` if given.
+    Callers should pass distinct values, repeats add nothing.
+    """
+
+    inferred = inference
+    for value in values:
+        inferred = infer_type(value, inference=inferred)
+        if inferred.type == TosserSchemaType.STRING:
+            break
+    if inferred is None:
+        return TYPE_VARS[TosserSchemaType.NULL]
+    return inferred
+
+
+def infer_cache_info() -> Tuple[int, int, Optional[int], int]:
+    """Hit/miss counters of the string inference cache"""
+
+    return _infer_string.cache_info()
+
+
+def widen_type(a: TosserSchemaTypeVar, b: TosserSchemaTypeVar) -> TosserSchemaTypeVar:
+    """Return the narrowest type able to hold values of both `a` and `b`"""
+
+    if a.type == b.type:
+        if a.length is None or b.length is None:
+            return TosserSchemaTypeVar(type=a.type, length=a.length if b.length is None else b.length)
+        return TosserSchemaTypeVar(type=a.type, length=max(a.length, b.length))
+    if a.type == TosserSchemaType.NULL:
+        return b
+    if b.type == TosserSchemaType.NULL:
+        return a
+    widened = _WIDENINGS.get(frozenset([a.type, b.type]))
+    if widened is not None:
+        return TYPE_VARS[widened]
+    return _STRING
@@ -0,0 +1,228 @@
+# Shape plans, resolved column slots reused by objects that share a key structure
+
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Callable
+
+from tosser.map import ProjectionNode
+from tosser.object import TosserObject
+from tosser.traverse import Traverser, TrailToken, ROOT_ID, TRAIL_SHAPE_INDEX, key_token, index_token
+from tosser.util import LRUCache, CacheInfo
+
+# signature markers following each key, JSON keys are always strings so these never collide
+_LEAF = 0
+_LIST = 1
+_DICT = 2
+_END = 3 # closes a nested dict
+
+ROOT_SHAPE: Tuple[Any, ...] = (ROOT_ID,)
+
+# element types of arrays handed out as one block
+_PRIMITIVE_TYPES = frozenset((str, int, float, bool, type(None)))
+
+# resolves a trail to (table, column, table deps), see TosserSchema.get_column_attributes
+Resolver = Callable[[List[TrailToken]], Tuple[Any, str, List[Any]]]
+
+
+class RowAnchor:
+    """Array element, or the root object when None, that values are emitted under"""
+
+    __slots__ = ('shape', 'parent')
+
+    def __init__(self, shape: Tuple[Any, ...], parent: Optional['RowAnchor']) -> None:
+        self.shape = shape
+        self.parent = parent
+
+
+class ValueBlock:
+    """Every element of an array of primitives, all in the same column and each its own row"""
+
+    __slots__ = ('values',)
+
+    def __init__(self, values: List[Any]) -> None:
+        self.values = values
+
+
+def _is_primitive_array(values: List[Any]) -> bool:
+    return len(values) > 0 and set(map(type, values)) <= _PRIMITIVE_TYPES
+
+
+def shape_trail(shape: Tuple[Any, ...]) -> List[TrailToken]:
+    """Trail standing in for every trail of a shape, enough to resolve column attributes"""
+
+    return [index_token(0) if val is TRAIL_SHAPE_INDEX else key_token(val) for val in shape]
+
+
+def _scan(data: Dict[str, Any], node: Optional[ProjectionNode]) -> Tuple[Tuple[Any, ...], List[Any]]:
+    """
+    Key structure of a dict down to its arrays and its leaf and array values in traversal order.
+    Array contents are left out, their elements are planned on their own.
+    """
+
+    sig: List[Any] = []
+    items: List[Any] = []
+    stack = [(iter(data.items()), node)]
+    while len(stack) > 0:
+        it, parent_node = stack[-1]
+        for key, value in it:
+            child_node = parent_node
+            if parent_node is not None:
+                child_node = parent_node.get(key)
+                if child_node is None:
+                    if parent_node.restricted:
+                        continue
+                elif child_node.excluded:
+                    continue
+
+            sig.append(key)
+            if isinstance(value, dict):
+                sig.append(_DICT)
+                stack.append((iter(value.items()), child_node))
+                break
+            sig.append(_LIST if isinstance(value, list) else _LEAF)
+            items.append(value)
+        else:
+            stack.pop()
+            sig.append(_END)
+    return tuple(sig), items
+
+
+def _compile(
+        shape: Tuple[Any, ...],
+        data: Dict[str, Any],
+        node: Optional[ProjectionNode],
+        resolve: Resolver
+    ) -> List[Tuple[bool, Any]]:
+    """Slot per item of `_scan`, resolved attributes of a leaf or (shape, projection node) of an array"""
+
+    steps: List[Tuple[bool, Any]] = []
+    stack = [(iter(data.items()), shape, node)]
+    while len(stack) > 0:
+        it, parent_shape, parent_node = stack[-1]
+        for key, value in it:
+            child_node = parent_node
+            if parent_node is not None:
+                child_node = parent_node.get(key)
+                if child_node is None:
+                    if parent_node.restricted:
+                        continue
+                elif child_node.excluded:
+                    continue
+
+            child_shape = parent_shape + (key,)
+            if isinstance(value, dict):
+                stack.append((iter(value.items()), child_shape, child_node))
+                break
+            if isinstance(value, list):
+                steps.append((True, (child_shape, child_node)))
+            else:
+                steps.append((False, resolve(shape_trail(child_shape))))
+        else:
+            stack.pop()
+    return steps
+
+
+class ShapeCache:
+    """
+    Bounded cache of column slots by (position shape, key structure) of the root object and of array elements.
+    On a hit only the values are visited, no trails are built and nothing is resolved.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self._plans = LRUCache(maxsize)
+        # column lookups answered from cached plans without consulting the resolver
+        self.skipped_resolutions = 0
+
+    @property
+    def maxsize(self) -> int:
+        return self._plans.maxsize
+
+    def info(self) -> CacheInfo:
+        return self._plans.info()
+
+    def clear(self) -> None:
+        self._plans.clear()
+        self.skipped_resolutions = 0
+
+    def _plan(self, shape: Tuple[Any, ...], data: Dict[str, Any], node: Optional[ProjectionNode], resolve: Resolver) \
+        -> Iterator[Tuple[Tuple[bool, Any], Any]]:
+
+        sig, items = _scan(data, node)
+        key = (shape, sig)
+        plan = self._plans.get(key)
+        if plan is None:
+            steps = _compile(shape, data, node, resolve)
+            plan = (steps, sum(1 for is_list, _ in steps if not is_list))
+            self._plans.put(key, plan)
+        else:
+            self.skipped_resolutions += plan[1]
+        return zip(plan[0], items)
+
+    def _scalar(self, shape: Tuple[Any, ...], resolve: Resolver) -> Any:
+        key = (shape, None)
+        attributes = self._plans.get(key)
+        if attributes is None:
+            attributes = resolve(shape_trail(shape))
+            self._plans.put(key, attributes)
+        else:
+            self.skipped_resolutions += 1
+        return attributes
+
+    def iter_values(
+            self,
+            obj: TosserObject,
+            resolve: Resolver,
+            projection: Optional[ProjectionNode] = None,
+            anchors: bool = False,
+            blocks: bool = False
+        ) -> Iterator[Tuple[Any, Any, Optional[RowAnchor]]]:
+        """
+        Yield (column attributes, value, row anchor) for each value in traversal order.
+        Anchors are only created when asked for, otherwise every value is yielded with None.
+        With `blocks`, an array of primitives is yielded once as a ValueBlock with the anchor of its parent row.
+        """
+
+        data = obj.data
+        if not isinstance(data, dict):
+            # not a shape the schema can place, let resolution report it
+            for trail, _, value in Traverser(projection=projection).traverse(obj):
+                yield resolve(trail.to_list()), value, None
+            return None
+
+        # frames are (True, slot iterator, anchor) for dicts
+        # and (False, element iterator, element shape, projection node, parent anchor) for arrays
+        stack: List[Tuple[Any, ...]] = [(True, self._plan(ROOT_SHAPE, data, projection, resolve), None)]
+        while len(stack) > 0:
+            frame = stack[-1]
+            if frame[0]:
+                _, slots, anchor = frame
+                for (is_list, slot), value in slots:
+                    if is_list:
+                        list_shape, list_node = slot
+                        element_shape = list_shape + (TRAIL_SHAPE_INDEX,)
+                        if blocks and _is_primitive_array(value):
+                            yield self._scalar(element_shape, resolve), ValueBlock(value), anchor
+                            continue
+                        stack.append((False, iter(value), element_shape, list_node, anchor))
+                        break
+                    yield slot, value, anchor
+                else:
+                    stack.pop()
+            else:
+                _, elements, shape, node, parent_anchor = frame
+                for element in elements:
+                    if isinstance(element, list):
+                        # directly nested arrays share the row parent of the outer array
+                        element_shape = shape + (TRAIL_SHAPE_INDEX,)
+                        if blocks and _is_primitive_array(element):
+                            yield self._scalar(element_shape, resolve), ValueBlock(element), parent_anchor
+                            continue
+                        stack.append((False, iter(element), element_shape, node, parent_anchor))
+                        break
+                    anchor = RowAnchor(shape, parent_anchor) if anchors else None
+                    if isinstance(element, dict):
+                        stack.append((True, self._plan(shape, element, node, resolve), anchor))
+                        break
+                    yield self._scalar(shape, resolve), element, anchor
+                else:
+                    stack.pop()
+
+        return None
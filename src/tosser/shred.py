@@ -0,0 +1,224 @@
+# Record shredding, turning source objects into rows of the schema's tables
+
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+
+from tosser.exceptions import TosserException
+from tosser.object import TosserObject
+from tosser.schema import TosserSchema
+from tosser.traverse import TosserResult
+from tosser.shape import RowAnchor, ValueBlock, shape_trail
+from tosser.events import StreamedData
+from tosser.metrics import STAGE_SHRED, STAGE_RESOLVE
+
+# TODO move to config
+SHRED_BATCH_SIZE = 1000 # rows per table handed out at once
+
+
+Row = Dict[str, Any]
+
+
+class TosserShredder:
+    """
+    Emit the rows of every table an object touches in a single traversal.
+    Values come from the schema's shape cache, see TosserSchema.iter_values.
+    Each array element is a row of its array's table, linked to the row of the enclosing
+    array element (or the root object) through key columns named by the map's key template.
+    Rows are collected per table and handed out in batches.
+    """
+
+    def __init__(self, schema: TosserSchema, batch_size: int = SHRED_BATCH_SIZE, dynamic: bool = False) -> None:
+        self.schema = schema
+        self.batch_size = batch_size
+        # keep values of tables and columns the schema does not know
+        self.dynamic = dynamic
+
+        # table name -> next surrogate key
+        self._next_key: Dict[str, int] = {}
+        # table name -> rows waiting for a full batch
+        self._pending: Dict[str, List[Row]] = {}
+        # table name -> table its rows link to
+        self._parents: Dict[str, str] = {}
+        self.dropped = 0
+
+    def key_column(self, table_name: str) -> str:
+        return self.schema.map.m_key_templ.format(table=table_name)
+
+    def _new_row(self, table_name: str, parent: Optional[Tuple[str, Row]], rows: Optional[Dict[str, List[Row]]]) -> Row:
+        key = self._next_key.get(table_name, 1)
+        self._next_key[table_name] = key + 1
+
+        row: Row = {self.key_column(table_name): key}
+        if parent is not None:
+            parent_table, parent_row = parent
+            self._parents[table_name] = parent_table
+            parent_column = self.key_column(parent_table)
+            row[parent_column] = parent_row[parent_column]
+
+        if rows is not None:
+            table_rows = rows.get(table_name)
+            if table_rows is None:
+                table_rows = rows[table_name] = []
+            table_rows.append(row)
+        return row
+
+    def _row_of(
+            self,
+            anchor: Optional[RowAnchor],
+            anchors: Dict[Optional[int], Tuple[Optional[RowAnchor], str, Row]],
+            rows: Optional[Dict[str, List[Row]]]
+        ) -> Tuple[str, Row]:
+        """
+        Row that values under `anchor` go in, creating it and any missing ancestor rows top down.
+        `anchors` maps the id of each anchor with a row to (anchor, table name, row), the root row is under None.
+        """
+
+        # walk up to the nearest array element that already has a row
+        missing: List[RowAnchor] = []
+        entry = None
+        while anchor is not None:
+            entry = anchors.get(id(anchor))
+            if entry is not None:
+                break
+            missing.append(anchor)
+            anchor = anchor.parent
+
+        if entry is None:
+            entry = anchors.get(None)
+            if entry is None:
+                root_name = self.schema.root_table.table_name
+                entry = anchors[None] = (None, root_name, self._new_row(root_name, None, rows))
+        found = (entry[1], entry[2])
+
+        # create rows top down so each child can take its parent's key
+        get_column_attributes = self.schema.get_column_attributes
+        for anchor in reversed(missing):
+            table_name = get_column_attributes(shape_trail(anchor.shape))[0].table_name
+            found = (table_name, self._new_row(table_name, found, rows))
+            anchors[id(anchor)] = (anchor, found[0], found[1])
+        return found
+
+    def _keeps(self, table: Any, column: str, n: int = 1) -> bool:
+        if self.dynamic:
+            return True
+        known = self.schema.schema.get(table.table_name)
+        if known is None or column not in known.columns:
+            self.dropped += n
+            return False
+        return True
+
+    def shred(self, obj: TosserObject) -> Dict[str, List[Row]]:
+        """Rows of one object by table name, parents are created before their children"""
+
+        schema = self.schema
+        metrics = schema.metrics
+
+        rows: Dict[str, List[Row]] = {}
+        # the anchors are kept alive alongside their ids
+        anchors: Dict[Optional[int], Tuple[Optional[RowAnchor], str, Row]] = {}
+
+        values = metrics.timed_iter(schema.iter_values(obj, anchors=True, blocks=True), STAGE_SHRED)
+        for (table, column, _), value, anchor in values:
+            block = type(value) is ValueBlock
+            if not self._keeps(table, column, len(value.values) if block else 1):
+                continue
+
+            if block:
+                # a row per element, all children of the row holding the array
+                parent = self._row_of(anchor, anchors, rows)
+                table_name = table.table_name
+                for element in value.values:
+                    self._new_row(table_name, parent, rows)[column] = element
+                continue
+
+            _, row = self._row_of(anchor, anchors, rows)
+            row[column] = value
+
+        if metrics.enabled:
+            metrics.count('rows emitted', sum(map(len, rows.values())))
+        return rows
+
+    def stream(self, data: StreamedData) -> Iterator[TosserResult]:
+        """
+        Shred data while it is parsed, yielding each batch as it fills, see tosser.events.
+        Only rows of the array elements open around the current value are held, a row is
+        handed out when its element closes, so unlike add() child rows come before their parent.
+        Rows left short of a batch stay pending until flush().
+        """
+
+        schema = self.schema
+        metrics = schema.metrics
+        get_column_attributes = metrics.timed(schema.get_column_attributes, STAGE_RESOLVE)
+        anchors: Dict[Optional[int], Tuple[Optional[RowAnchor], str, Row]] = {}
+
+        def _emit(table_name: str, row: Row) -> Iterator[TosserResult]:
+            metrics.count('rows emitted')
+            pending = self._pending.get(table_name)
+            if pending is None:
+                pending = self._pending[table_name] = []
+            pending.append(row)
+            if len(pending) >= self.batch_size:
+                yield TosserResult(rows=pending, table=table_name)
+                self._pending[table_name] = []
+
+        events = metrics.timed_iter(data.events(projection=schema.projection, anchors=True), STAGE_SHRED)
+        for trail, value, anchor in events:
+            if trail is None:
+                entry = anchors.pop(id(anchor), None)
+                if entry is not None:
+                    yield from _emit(entry[1], entry[2])
+                continue
+
+            table, column, _ = get_column_attributes(trail)
+            if not self._keeps(table, column):
+                continue
+            _, row = self._row_of(anchor, anchors, None)
+            row[column] = value
+
+        root = anchors.pop(None, None)
+        if root is not None:
+            yield from _emit(root[1], root[2])
+
+    def add(self, obj: TosserObject) -> List[TosserResult]:
+        """
+        Shred an object, returns the batches of tables that filled up.
+        Pending rows of their parent tables are handed out first so every key refers back to a row already out.
+        Streamed data has to be shredded with stream(), which hands batches out while it is parsed.
+        """
+
+        if isinstance(obj.data, StreamedData):
+            raise TosserException(f'Cannot add {obj.data}, shred streamed data with stream()')
+
+        full: List[TosserResult] = []
+        for table_name, table_rows in self.shred(obj).items():
+            pending = self._pending.get(table_name)
+            if pending is None:
+                pending = self._pending[table_name] = []
+            pending.extend(table_rows)
+            if len(pending) < self.batch_size:
+                continue
+
+            ancestors = []
+            parent = self._parents.get(table_name)
+            while parent is not None:
+                ancestors.append(parent)
+                parent = self._parents.get(parent)
+            for ancestor in reversed(ancestors):
+                if len(self._pending.get(ancestor, [])) > 0:
+                    full.append(TosserResult(rows=self._pending[ancestor], table=ancestor))
+                    self._pending[ancestor] = []
+
+            while len(pending) >= self.batch_size:
+                full.append(TosserResult(rows=pending[:self.batch_size], table=table_name))
+                del pending[:self.batch_size]
+        return full
+
+    def flush(self) -> List[TosserResult]:
+        """Hand out every pending row, parent tables first"""
+
+        batches = [
+            TosserResult(rows=pending, table=table_name)
+            for table_name, pending in self._pending.items()
+            if len(pending) > 0
+        ]
+        self._pending = {}
+        return batches
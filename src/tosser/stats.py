@@ -0,0 +1,283 @@
+# Fixed-size, mergeable column statistics used to derive schema hints
+
+import math
+import zlib
+from typing import Dict, Any, List, Optional, Set, Iterable, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional, batches fall back to builtins
+    np = None
+
+HLL_PRECISION = 10 # 2^p registers, ~3% standard error
+TOPK_CAPACITY = 8 # most frequent values tracked per column
+LENGTH_BUCKETS = 33 # power of two buckets, last one collects everything longer
+NUMPY_MIN_DISTINCT = 256 # smaller batches are not worth converting to arrays
+
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15 # 2^64 / golden ratio, spreads a 32 bit checksum over the high bits
+_HASH_MASK = (1 << 64) - 1
+
+
+def _hash64(value: Any) -> int:
+    """Stable 64 bit hash so sketches merge across processes and runs"""
+
+    if type(value) is str:
+        data = value.encode('utf-8', 'surrogatepass')
+    else:
+        data = b'\x00' + repr(value).encode('utf-8')
+    # multiplicative hashing, HyperLogLog reads the register index from the top bits
+    return (zlib.crc32(data) * _HASH_MULTIPLIER) & _HASH_MASK
+
+
+class HyperLogLog:
+    """Approximate distinct counter"""
+
+    __slots__ = ('p', 'registers')
+
+    def __init__(self, p: int = HLL_PRECISION) -> None:
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def add(self, value: Any) -> None:
+        h = _hash64(value)
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other.p != self.p:
+            raise ValueError(f'Cannot merge HyperLogLog of precision {other.p} into {self.p}')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros > 0:
+            # linear counting is more accurate for small cardinalities
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+class TopK:
+    """Space-saving frequent value tracker, exact while no value has been evicted"""
+
+    __slots__ = ('capacity', 'counts', 'overflowed')
+
+    def __init__(self, capacity: int = TOPK_CAPACITY) -> None:
+        self.capacity = capacity
+        self.counts: Dict[Any, int] = {}
+        self.overflowed = False
+
+    def add(self, value: Any, n: int = 1) -> None:
+        counts = self.counts
+        if value in counts:
+            counts[value] += n
+        elif len(counts) < self.capacity:
+            counts[value] = n
+        else:
+            # replace the least frequent value, inheriting its count as error
+            evict = min(counts, key=counts.__getitem__)
+            counts[value] = counts.pop(evict) + n
+            self.overflowed = True
+
+    def merge(self, other: 'TopK') -> None:
+        counts = dict(self.counts)
+        for value, n in other.counts.items():
+            counts[value] = counts.get(value, 0) + n
+        self.overflowed = self.overflowed or other.overflowed or len(counts) > self.capacity
+        if len(counts) > self.capacity:
+            keep = sorted(counts.items(), key=lambda item: (-item[1], type(item[0]).__name__, repr(item[0])))
+            counts = dict(keep[:self.capacity])
+        self.counts = counts
+
+    def most_common(self) -> List[List[Any]]:
+        return [[value, n] for value, n in sorted(self.counts.items(), key=lambda item: -item[1])]
+
+
+class ColumnStats:
+    """
+    Constant memory statistics of the values seen in one column.
+    Values are only hashed into the HyperLogLog once the TopK tracker overflows,
+    until then it counts distinct values exactly.
+    """
+
+    __slots__ = ('count', 'nulls', 'min', 'max', 'max_length', 'lengths', 'top', 'hll', 'distinct_floor')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.nulls = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.max_length: Optional[int] = None
+        self.lengths = [0] * LENGTH_BUCKETS
+        self.top = TopK()
+        self.hll = HyperLogLog()
+        # lower bound on the distinct estimate, from a loaded schema
+        self.distinct_floor = 0
+
+    def _track(self, value: Any, n: int = 1) -> None:
+        top = self.top
+        if top.overflowed:
+            self.hll.add(value)
+        elif value not in top.counts and len(top.counts) >= top.capacity:
+            # about to evict, catch the HyperLogLog up on every value kept so far
+            for seen in top.counts:
+                self.hll.add(seen)
+            self.hll.add(value)
+        top.add(value, n)
+
+    def add(self, value: Any) -> None:
+        self.count += 1
+        if value is None:
+            self.nulls += 1
+            return
+
+        value_type = type(value)
+        if value_type is str:
+            length = len(value)
+        else:
+            length = len(str(value))
+            if value_type is int or value_type is float:
+                if self.min is None or value < self.min:
+                    self.min = value
+                if self.max is None or value > self.max:
+                    self.max = value
+
+        self.lengths[min(length.bit_length(), LENGTH_BUCKETS - 1)] += 1
+        if self.max_length is None or length > self.max_length:
+            self.max_length = length
+
+        self._track(value)
+
+    def add_counts(self, counts: Iterable[Tuple[Any, int]]) -> None:
+        """
+        Add a batch of values given as (value, number of occurrences) pairs.
+        Values that compare equal across types, like 1 and 1.0, may come as separate pairs.
+        """
+
+        values: List[Any] = []
+        weights: List[int] = []
+        for value, n in counts:
+            self.count += n
+            if value is None:
+                self.nulls += n
+            else:
+                values.append(value)
+                weights.append(n)
+
+        if len(values) == 0:
+            return
+        lengths = [len(value) if type(value) is str else len(str(value)) for value in values]
+        numbers = [value for value in values if type(value) is int or type(value) is float]
+
+        if np is not None and len(values) >= NUMPY_MIN_DISTINCT:
+            # bit length of a positive int is the frexp exponent
+            buckets = np.minimum(np.frexp(np.asarray(lengths, dtype=np.float64))[1], LENGTH_BUCKETS - 1)
+            histogram = np.bincount(buckets, weights=weights, minlength=LENGTH_BUCKETS)
+            self.lengths = [a + int(b) for a, b in zip(self.lengths, histogram)]
+        else:
+            for length, n in zip(lengths, weights):
+                self.lengths[min(length.bit_length(), LENGTH_BUCKETS - 1)] += n
+
+        max_length = max(lengths)
+        if self.max_length is None or max_length > self.max_length:
+            self.max_length = max_length
+
+        if len(numbers) > 0:
+            low, high = min(numbers), max(numbers)
+            if self.min is None or low < self.min:
+                self.min = low
+            if self.max is None or high > self.max:
+                self.max = high
+
+        for value, n in zip(values, weights):
+            self._track(value, n)
+
+    def seed(self, enum: Optional[Set[Any]], max_length: Optional[int], enum_max: int) -> None:
+        """Start from the hints of a schema written without statistics"""
+
+        for value in enum or set():
+            self.top.add(value)
+            self.hll.add(value)
+        if enum is None or len(enum) >= enum_max:
+            # the saved enum may have been cut off, it can't be trusted as complete
+            self.top.overflowed = True
+        if max_length is not None and (self.max_length is None or max_length > self.max_length):
+            self.max_length = max_length
+
+    def merge(self, other: 'ColumnStats') -> None:
+        self.count += other.count
+        self.nulls += other.nulls
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if other.max_length is not None and (self.max_length is None or other.max_length > self.max_length):
+            self.max_length = other.max_length
+        self.lengths = [a + b for a, b in zip(self.lengths, other.lengths)]
+        self.distinct_floor = max(self.distinct_floor, other.distinct_floor)
+        exact = [side.top.counts for side in (self, other) if not side.top.overflowed]
+        self.top.merge(other.top)
+        self.hll.merge(other.hll)
+        if self.top.overflowed:
+            # exact sides were never hashed
+            for counts in exact:
+                for value in counts:
+                    self.hll.add(value)
+
+    @property
+    def distinct(self) -> int:
+        """Approximate number of distinct non-null values"""
+
+        if not self.top.overflowed:
+            return len(self.top.counts)
+        return max(self.hll.estimate(), self.distinct_floor)
+
+    def enum(self, limit: int) -> Optional[Set[Any]]:
+        """All distinct values if there are at most `limit` of them"""
+
+        if self.top.overflowed or len(self.top.counts) == 0 or len(self.top.counts) > limit:
+            return None
+        return set(self.top.counts)
+
+    def to_dict(self, registers: bool = False) -> Dict[str, Any]:
+        """Statistics as written to the schema file, with the raw HyperLogLog registers for the binary cache"""
+
+        data: Dict[str, Any] = {
+            'count': self.count,
+            'nulls': self.nulls,
+            'distinct': self.distinct,
+            'min': self.min,
+            'max': self.max,
+            'max_length': self.max_length,
+            'lengths': {str(1 << i >> 1): n for i, n in enumerate(self.lengths) if n > 0},
+            'top': self.top.most_common(),
+            'top_exact': not self.top.overflowed,
+        }
+        if registers:
+            data['hll'] = bytes(self.hll.registers) if self.top.overflowed else None
+        return data
+
+    @staticmethod
+    def from_dict(obj: Dict[str, Any]) -> 'ColumnStats':
+        stats = ColumnStats()
+        stats.count = obj['count']
+        stats.nulls = obj['nulls']
+        stats.min = obj['min']
+        stats.max = obj['max']
+        stats.max_length = obj['max_length']
+        for bucket_floor, n in obj['lengths'].items():
+            stats.lengths[int(bucket_floor).bit_length()] = n
+        stats.top.counts = {value: n for value, n in obj['top']}
+        stats.top.overflowed = not obj['top_exact']
+        if stats.top.overflowed:
+            # the schema file keeps no registers, its estimate stands in for them
+            stats.distinct_floor = obj['distinct']
+        registers = obj.get('hll')
+        if isinstance(registers, bytes):
+            stats.hll.registers = bytearray(registers)
+        return stats
@@ -1,23 +1,84 @@
 import os
-import json
-from typing import Optional, Union, Dict, Any
+from typing import Optional, Union, Dict, Any, Tuple
 from pathlib import Path
 import logging
 from dotenv import load_dotenv
 import asyncio
 import concurrent.futures
+import dataclasses
 from functools import partial
 import time
+from tosser import decoder
 from tosser.logs import LOG_MAIN, LOG_DEBUG
 from tosser.exceptions import TosserException
 import tosser.endpoint.source as endpoint_source
 import tosser.endpoint.target as endpoint_target
 from tosser.schema import TosserSchema
+from tosser.fingerprint import SourceFingerprint
+from tosser.object import TosserObject
+from tosser.sampling import Sampler, SampleConfig, SampleMode, SampleStats
+from tosser.metrics import TosserMetrics, STAGE_WRITE, STAGE_INGEST
 from tosser.map import TosserMap
 from tosser.types import TossPathT
 from tosser.util import *
 from tosser.configd import ConfigExtender
 
+# more shards than workers keeps the pool busy when shard sizes are uneven
+GENERATE_SHARDS_PER_WORKER = 4
+
+
+async def _contribute_source(
+        schema: TosserSchema,
+        source: endpoint_source.ISource,
+        sampling: SampleConfig
+    ) -> SampleStats:
+    """Contribute sampled source objects to a generating schema until the source ends or it converges"""
+
+    sampler = Sampler(sampling)
+
+    def _contribute(obj: TosserObject) -> bool:
+        schema.contribute(obj)
+        sampler.stats.contributed += 1
+        if sampling.converge_after is not None and schema.is_converged(sampling.converge_after):
+            sampler.stats.converged = True
+        return sampler.stats.converged
+
+    async for obj in source.iter_objects():
+        selected = sampler.offer(obj)
+        if selected is not None and _contribute(selected):
+            break
+
+    if not sampler.stats.converged:
+        for held in sampler.drain():
+            if _contribute(held):
+                break
+
+    return sampler.stats
+
+
+def _generate_partial(
+        map: TosserMap,
+        source: endpoint_source.ISource,
+        sampling: SampleConfig,
+        profiling: bool = False,
+        batch_size: int = 0,
+        array_sample: int = 0
+    ) -> Tuple[TosserSchema, SampleStats]:
+    """Build a partial schema from one source shard, runs in a worker process"""
+
+    schema = TosserSchema(map=map)
+    schema.batch_size = batch_size
+    schema.array_sample = array_sample
+    schema.metrics = source.metrics = TosserMetrics(enabled=profiling)
+    schema.begin()
+    stats = asyncio.run(_contribute_source(schema, source, sampling))
+    schema.end()
+
+    # resolution results are cheap to rebuild, don't ship them back
+    schema.invalidate_resolution_cache()
+    return schema, stats
+
+
 class Tosser:
     """Context object for tosser operations"""
 
@@ -43,6 +104,9 @@ class Tosser:
         self.map: Optional[TosserMap] = None
         self.config: Dict[str, Any] = {}
 
+        # Instrumentation, disabled until profile() is called
+        self.metrics = TosserMetrics()
+
         # Workspace setup
         self._work_dir: Path = Path('.')
 
@@ -68,10 +132,28 @@ class Tosser:
 
 
     # API
+    def profile(self, enabled: bool = True) -> None:
+        """Enable or disable stage timers and counters for following operations"""
+
+        self.metrics.enabled = enabled
+        self.metrics.reset()
+
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return stage timers and counters collected since profiling was enabled"""
+
+        return self.metrics.to_dict()
+
+
     @_with_schema
     async def ingest(self):
         """Ingest objects"""
 
+        with self.metrics.time(STAGE_INGEST):
+            await self._ingest()
+
+
+    async def _ingest(self):
         max_workers = self.config.get('max_threads', 10)
 
         # use the loop this coroutine was called in
@@ -94,26 +176,123 @@ class Tosser:
         print(results)
 
         
-    async def generate(self) -> None:
-        """Generate schema using source objects"""
+    async def generate(
+            self,
+            workers: Optional[int] = None,
+            sampling: Optional[SampleConfig] = None,
+            incremental: bool = False,
+            content_hash: bool = False,
+            batch_size: Optional[int] = None,
+            array_sample: Optional[int] = None
+        ) -> SampleStats:
+        """
+        Generate schema using source objects, optionally sharded over worker processes.
+        Objects are picked according to `sampling`, by default every object is contributed.
+
+        With `incremental`, the existing schema file is loaded and widened using only
+        source files that are new or changed since their recorded fingerprints.
+        Every object has to be contributed for a file to be recorded, so sampling and
+        convergence can't be combined with it.
+        A `batch_size` above 0 buffers that many values per column before inferring them.
+        An `array_sample` above 0 caps how many elements of each array of primitives are contributed.
+        """
 
         self.require_source('generate schema')
 
+        if workers is None:
+            workers = self.config.get('max_processes', 1)
+        assert workers is not None
+        if sampling is None:
+            sampling = SampleConfig.from_dict(self.config.get('sample', {}))
+        if incremental and (sampling.mode != SampleMode.ALL or sampling.converge_after is not None):
+            raise TosserException('Incremental generation cannot be combined with sampling or converge_after')
+
         if self.schema is None:
             assert self.map is not None
             schema = TosserSchema(path=self.schema_file, map=self.map)
         else:
             schema = self.schema
+        schema.metrics = self.metrics
+        self.source.metrics = self.metrics
+        if batch_size is not None:
+            schema.batch_size = batch_size
+        else:
+            schema.batch_size = self.config.get('batch_size', schema.batch_size)
+        if array_sample is not None:
+            schema.array_sample = array_sample
+        else:
+            schema.array_sample = self.config.get('array_sample', schema.array_sample)
+
+        source = self.source
+        fingerprints: Dict[str, SourceFingerprint] = {}
+        if incremental and self.schema_file.exists():
+            schema.load_file()
+            source, fingerprints = self.source.incremental(schema.sources, content_hash=content_hash)
+            schema.begin(reset=False)
+        elif incremental:
+            source, fingerprints = self.source.incremental({}, content_hash=content_hash)
+            schema.begin()
+        else:
+            schema.begin()
+
+        if workers > 1:
+            stats = await self._generate_parallel(schema, source, workers, sampling)
+        else:
+            stats = await _contribute_source(schema, source, sampling)
+        schema.sources = fingerprints
+        schema.end()
+        with self.metrics.time(STAGE_WRITE):
+            schema.write_file(self._work_dir)
 
-        schema.begin()
+        self._log.info(
+            f'Schema generation saw {stats.seen} objects, contributed {stats.contributed}, '
+            f'skipped {stats.skipped}{" (converged)" if stats.converged else ""}'
+        )
+        return stats
 
-        async def _iter() -> None:
-            async for obj in self.source.iter_objects():
-                schema.contribute(obj)
 
-        await _iter()
-        schema.end()
-        schema.write_file(self._work_dir)
+    async def _generate_parallel(
+            self,
+            schema: TosserSchema,
+            source: endpoint_source.ISource,
+            workers: int,
+            sampling: SampleConfig
+        ) -> SampleStats:
+        """Contribute source shards in a process pool and merge the partial schemas"""
+
+        loop = asyncio.get_running_loop()
+        shards = source.shard(workers * GENERATE_SHARDS_PER_WORKER)
+        self._log.info(f'Generating schema from {len(shards)} source shards on {workers} processes')
+
+        # split the reservoir between shards so the total sample size roughly holds
+        if sampling.mode == SampleMode.RESERVOIR and len(shards) > 0:
+            sampling = dataclasses.replace(sampling, n=max(1, -(-sampling.n // len(shards))))
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                loop.run_in_executor(
+                    pool,
+                    partial(
+                        _generate_partial,
+                        schema.map,
+                        shard,
+                        sampling,
+                        profiling=self.metrics.enabled,
+                        batch_size=schema.batch_size,
+                        array_sample=schema.array_sample
+                    )
+                )
+                for shard in shards
+            ]
+            results = await asyncio.gather(*futures)
+
+        # merge in shard order so column order follows the source order
+        stats = SampleStats(converged=len(results) > 0)
+        for partial_schema, partial_stats in results:
+            schema.merge(partial_schema)
+            stats.merge(partial_stats)
+            self.metrics.merge(partial_schema.metrics)
+        return stats
         
 
     def set_source(self, endpoint: Union[endpoint_source.ISource, str]) -> None:
@@ -121,6 +300,7 @@ class Tosser:
 
         if isinstance(endpoint, endpoint_source.ISource):
             self.source = endpoint
+            self.source.work_dir = self._work_dir
             return
 
         temp_source = endpoint_source.ISource(endpoint)
@@ -133,6 +313,7 @@ class Tosser:
         driver_class = endpoint_source.SOURCE_DRIVERS[driver]
         self._debug.debug(f'Source driver: {driver} [{driver_class}]')
         self.source = driver_class(endpoint)
+        self.source.work_dir = self._work_dir
 
 
     def set_target(self, endpoint: Union[endpoint_target.ITarget, str]) -> None:
@@ -192,8 +373,10 @@ class Tosser:
 
         if not self.map_file:
             raise TosserException('Cannot reload map before setting map file')
-        ext = ConfigExtender(self.map_file, json.load)
+        ext = ConfigExtender(self.map_file, decoder.load)
         self.map = TosserMap.from_dict(ext.render())
+        if self.schema is not None:
+            self.schema.map = self.map
 
         
     def reload_config(self) -> None:
@@ -202,7 +385,7 @@ class Tosser:
         if not self.config_file:
             raise TosserException('Cannot reload config before setting config file')
         with open(self.config_file, 'r') as f:
-            self.config = json.load(f)
+            self.config = decoder.load(f)
 
 
     def setup(
@@ -1,11 +1,12 @@
 import os
 from pathlib import Path
-from typing import Generator, List, Dict, Any, Optional, Tuple, Iterator, Union
+from typing import Generator, List, Dict, Any, Optional, Tuple, Iterator, Iterable, Union
 from dataclasses import dataclass
 from enum import Enum
 
 from tosser.object import TosserObject
-from tosser.rules import TosserRuleSet, TosserRule
+from tosser.map import ProjectionNode
+from tosser.rules import TosserRuleSet, TosserRule, TosserRuleAutomatonState
 
 
 ROOT_ID = '$'
@@ -20,12 +21,126 @@ class TrailTokenType(Enum):
     INDEX = 'index'
 
 
-@dataclass
+# TODO move to config
+TRAIL_INTERN_MAX_KEYS = 1 << 16 # key tokens kept for reuse, dynamic keys past this are not interned
+TRAIL_INTERN_MAX_INDEX = 1 << 16 # index tokens kept for reuse, higher indices get a token each time
+TRAIL_SHAPE_INDEX = None # stands in for any array index in a trail shape
+
+
 class TrailToken:
     """Traversal trail token is a value and a type"""
 
-    val: str | int
-    type: TrailTokenType
+    __slots__ = ('val', 'type')
+
+    def __init__(self, val: str | int, type: TrailTokenType) -> None:
+        self.val = val
+        self.type = type
+
+    def __eq__(self, other: Any) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, TrailToken):
+            return NotImplemented
+        return self.val == other.val and self.type == other.type
+
+    def __hash__(self) -> int:
+        return hash((self.val, self.type))
+
+    def __repr__(self) -> str:
+        return f'TrailToken(val={self.val!r}, type={self.type})'
+
+
+_key_tokens: Dict[str, TrailToken] = {}
+_index_tokens: List[TrailToken] = []
+
+
+def key_token(key: str) -> TrailToken:
+    """Shared token for a dict key"""
+
+    token = _key_tokens.get(key)
+    if token is None:
+        token = TrailToken(key, TrailTokenType.KEY)
+        if len(_key_tokens) < TRAIL_INTERN_MAX_KEYS:
+            _key_tokens[key] = token
+    return token
+
+
+def index_token(i: int) -> TrailToken:
+    """Shared token for an array index"""
+
+    if i < len(_index_tokens):
+        return _index_tokens[i]
+    if i >= TRAIL_INTERN_MAX_INDEX:
+        return TrailToken(i, TrailTokenType.INDEX)
+    _index_tokens.extend(TrailToken(j, TrailTokenType.INDEX) for j in range(len(_index_tokens), i + 1))
+    return _index_tokens[i]
+
+
+class Trail:
+    """
+    Persistent trail, each node holds its last token and links to its parent.
+    Siblings share every node above them so extending a trail is O(1),
+    a list is only built when a consumer indexes or iterates past the last token.
+    """
+
+    __slots__ = ('token', 'parent', 'depth', '_shape')
+
+    def __init__(self, token: TrailToken, parent: Optional['Trail'] = None) -> None:
+        self.token = token
+        self.parent = parent
+        self.depth: int = 1 if parent is None else parent.depth + 1
+        self._shape: Optional[Tuple[Any, ...]] = None
+
+    def to_list(self) -> List[TrailToken]:
+        # placeholder fill, every slot is overwritten walking up the parents
+        tokens = [self.token] * self.depth
+        node: Optional[Trail] = self
+        i = self.depth
+        while node is not None:
+            i -= 1
+            tokens[i] = node.token
+            node = node.parent
+        return tokens
+
+    @property
+    def shape(self) -> Tuple[Any, ...]:
+        """Key values of the trail with every index replaced by TRAIL_SHAPE_INDEX"""
+
+        if self._shape is not None:
+            return self._shape
+
+        # walk up to the nearest cached prefix, then cache each shape on the way down
+        pending: List[Trail] = []
+        node: Optional[Trail] = self
+        while node is not None and node._shape is None:
+            pending.append(node)
+            node = node.parent
+        shape: Tuple[Any, ...] = () if node is None or node._shape is None else node._shape
+        for node in reversed(pending):
+            token = node.token
+            shape = node._shape = shape + (token.val if token.type is TrailTokenType.KEY else TRAIL_SHAPE_INDEX,)
+        return shape
+
+    def __len__(self) -> int:
+        return self.depth
+
+    def __getitem__(self, i: Any) -> Any:
+        if i == -1:
+            return self.token
+        return self.to_list()[i]
+
+    def __iter__(self) -> Iterator[TrailToken]:
+        return iter(self.to_list())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Trail):
+            return self.depth == other.depth and self.to_list() == other.to_list()
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'Trail({self.to_list()!r})'
 
 
 @dataclass
@@ -33,6 +148,8 @@ class TosserResult:
     """Result struct generated by Traverser"""
 
     rows: List[Dict[str, Any]]
+    rule: Optional[TosserRule] = None
+    table: Optional[str] = None
 
     def __iter__(self):
         return iter(self.rows)
@@ -41,71 +158,136 @@ class TosserResult:
 class Traverser:
     """Traverse an object and generate TosserResult objects according to rules"""
 
-    def __init__(self, rules: Optional[TosserRuleSet] = None) -> None:
+    def __init__(self, rules: Optional[TosserRuleSet] = None, projection: Optional[ProjectionNode] = None) -> None:
         self._rules: Optional[TosserRuleSet] = rules
+        # compiled map directives, see TosserMap.projection
+        self._projection = projection
 
 
-    def traverse(self, obj: TosserObject) -> Generator[Tuple[List[TrailToken], str, Any], None, None]:
-        """Traverse the object and yield each value"""
+    def traverse(self, obj: TosserObject) -> Generator[Tuple[Trail, str | int, Any], None, None]:
+        """Traverse the object and yield each value, skipping subtrees excluded by the projection"""
 
         data = obj.data
-
-        def _inner_traverse(_data: Any, trail: List[TrailToken]):
-            if isinstance(_data, dict):
-                for key, obj in _data.items():
-                    next_trail = trail.copy()
-                    next_trail.append(TrailToken(key, TrailTokenType.KEY))
-                    yield from _inner_traverse(obj, next_trail)
-            elif isinstance(_data, list):
-                for i, obj in enumerate(_data):
-                    next_trail = trail.copy()
-                    next_trail.append(TrailToken(i, TrailTokenType.INDEX))
-                    yield from _inner_traverse(obj, next_trail)
+        root = Trail(key_token(ROOT_ID))
+        projection = self._projection
+
+        # explicit stack of (child iterator, parent trail, children are keyed, parent projection node)
+        stack: List[Tuple[Iterator[Tuple[Any, Any]], Trail, bool, Optional[ProjectionNode]]]
+        if isinstance(data, dict):
+            stack = [(iter(data.items()), root, True, projection)]
+        elif isinstance(data, list):
+            stack = [(enumerate(data), root, False, projection)]
+        else:
+            yield (root, ROOT_ID, data)
+            return None
+
+        while len(stack) > 0:
+            items, parent, keyed, parent_node = stack[-1]
+            for key, value in items:
+                node = parent_node
+                if parent_node is not None and keyed:
+                    node = parent_node.get(key)
+                    if node is None:
+                        if parent_node.restricted:
+                            continue
+                    elif node.excluded:
+                        continue
+
+                trail = Trail(key_token(key) if keyed else index_token(key), parent)
+                if isinstance(value, dict):
+                    stack.append((iter(value.items()), trail, True, node))
+                    break
+                elif isinstance(value, list):
+                    stack.append((enumerate(value), trail, False, node))
+                    break
+                yield (trail, key, value)
             else:
-                yield (trail, trail[-1].val, _data)
-
-
-        yield from _inner_traverse(data, [TrailToken(ROOT_ID, TrailTokenType.KEY)])
+                stack.pop()
 
         return None
 
 
-    def traverse_and_capture(self, obj: TosserObject, rules: Optional[TosserRuleSet] = None) -> Generator[TosserResult | None, None, None]:
-        """Traverse the object and yield """
+    def traverse_and_capture(self, obj: TosserObject, rules: Optional[TosserRuleSet] = None) \
+        -> Generator[TosserResult, None, None]:
+        """
+        Traverse the object once and yield a result per matched rule, in rule order.
+        Subtrees no rule can reach are skipped. A matched object becomes a row of its
+        seek fields, a matched array contributes a row per element.
+        """
 
         if rules is not None:
             self._rules = rules
         assert self._rules is not None
         rs: TosserRuleSet = self._rules
 
-        root_context: bool = True
-        context_identifier: str = ROOT_ID
-        context_trail: List[str] = []
-        matched_rules_gen = rs._next_rules()
+        start = rs.compile().start
+        captured: Dict[int, List[Dict[str, Any]]] = {}
 
-        def _inner_traverse(_raw_obj: Dict[str, Any]):
-            print(f'[traverse] eval ctx={context_identifier}')
+        def _capture(state: TosserRuleAutomatonState, key: str, value: Any) -> None:
+            for rule in state.matched:
+                row = self._capture_row(rule, key, value)
+                if row is not None:
+                    captured.setdefault(id(rule), []).append(row)
 
-            # Check current context against rules
-            matched_rules = next(matched_rules_gen)
+        # explicit stack of (child iterator, parent state, children are keyed, parent key),
+        # the iterator yields (key, value) pairs of an object or the elements of an array
+        stack: List[Tuple[Union[Iterator[Tuple[str, Any]], Iterator[Any]], TosserRuleAutomatonState, bool, str]] = []
 
-            try:
-                matched_rules_gen.send((context_identifier, root_context))
-            except StopIteration as e:
-                print(e)
+        data = obj.data
+        if start.matched and not isinstance(data, list):
+            _capture(start, ROOT_ID, data)
+        if isinstance(data, dict):
+            if not start.terminal:
+                stack.append((iter(data.items()), start, True, ROOT_ID))
+        elif isinstance(data, list):
+            stack.append((iter(data), start, False, ROOT_ID))
+
+        while len(stack) > 0:
+            items, parent_state, keyed, parent_key = stack[-1]
+            for child in items:
+                if keyed:
+                    key, value = child
+                    state = parent_state.step(key)
+                    if state is None:
+                        continue
+                else:
+                    # array elements stay in the state of their array
+                    key, value, state = parent_key, child, parent_state
+
+                if isinstance(value, list):
+                    stack.append((iter(value), state, False, key))
+                    break
+                if state.matched:
+                    _capture(state, key, value)
+                if isinstance(value, dict) and not state.terminal:
+                    stack.append((iter(value.items()), state, True, key))
+                    break
+            else:
+                stack.pop()
 
-            yield matched_rules
+        for rule in rs.rules:
+            rows = captured.get(id(rule))
+            if rows is not None:
+                yield TosserResult(rows=rows, rule=rule)
 
-            # Iterate subobjects
-            # yield from self._traverse(...)
+        return None
 
-        yield from _inner_traverse(obj.data)
 
+    @staticmethod
+    def _capture_row(rule: TosserRule, key: str, value: Any) -> Optional[Dict[str, Any]]:
+        if isinstance(value, dict):
+            if rule.seek_is_all_fields:
+                return {k: v for k, v in value.items() if not isinstance(v, (dict, list))}
+            return {field: value.get(field) for field in rule.seek_fields}
+
+        # a matched scalar is a row of one field named by its key
+        if rule.seek_is_all_fields or key in rule.seek_fields:
+            return {key: value}
         return None
-    
-    
+
+
     @staticmethod
-    def get_trail_string(trail: List[TrailToken]) -> str:
+    def get_trail_string(trail: Iterable[TrailToken]) -> str:
         """Return a string representation of the trail"""
 
         def _token_to_str(token: TrailToken) -> str:
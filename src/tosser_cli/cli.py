@@ -11,6 +11,7 @@ import asyncio
 
 from tosser import Tosser
 from tosser.logs import LOGGING_CONFIG
+from tosser.sampling import SampleConfig, SampleMode
 
 logging.config.dictConfig(LOGGING_CONFIG)
 
@@ -23,21 +24,83 @@ app = typer.Typer(
 @app.command()
 def generate(
         source: Annotated[Optional[str], typer.Option(help='Source endpoint config file or JSON')] = None,
-        files: Annotated[Optional[str], typer.Option(help='Quick way to set a file glob as the source')] = None
+        files: Annotated[Optional[str], typer.Option(help='Quick way to set a file glob as the source')] = None,
+        stream: Annotated[bool, typer.Option(
+            help='Parse --files in chunks, yielding each data member or array element'
+        )] = False,
+        events: Annotated[bool, typer.Option(
+            help='Traverse --files as they are parsed without holding their data in memory'
+        )] = False,
+        cache: Annotated[bool, typer.Option(
+            help='Keep decoded --files in the working directory to load them faster next run'
+        )] = False,
+        workers: Annotated[Optional[int], typer.Option(help='Number of processes to generate the schema with')] = None,
+        sample_every: Annotated[Optional[int], typer.Option(help='Only contribute every nth source object')] = None,
+        sample_size: Annotated[Optional[int], typer.Option(
+            help='Contribute a random sample of this many objects'
+        )] = None,
+        converge_after: Annotated[Optional[int], typer.Option(
+            help='Stop once this many objects in a row change nothing'
+        )] = None,
+        incremental: Annotated[bool, typer.Option(
+            help='Only contribute source files new or changed since the last run'
+        )] = False,
+        content_hash: Annotated[bool, typer.Option(
+            help='Fingerprint source files by content hash as well as size and mtime'
+        )] = False,
+        batch_size: Annotated[Optional[int], typer.Option(
+            help='Buffer this many values per column and infer them together'
+        )] = None,
+        array_sample: Annotated[Optional[int], typer.Option(
+            help='Contribute at most this many elements of each array of primitive values'
+        )] = None,
+        profile: Annotated[bool, typer.Option(help='Print stage timings and counters when done')] = False
     ):
 
     if files is not None:
         source = json.dumps({
             'driver': 'file',
-            'path': files
+            'path': files,
+            'stream': stream,
+            'events': events,
+            'cache': cache
         })
     if source is None:
         print('Error: source must be set', file=sys.stderr)
         sys.exit(1)
 
+    if sample_every is not None and sample_size is not None:
+        print('Error: only one of --sample-every and --sample-size can be set', file=sys.stderr)
+        sys.exit(1)
+
+    if incremental and any(opt is not None for opt in [sample_every, sample_size, converge_after]):
+        print('Error: --incremental cannot be combined with sampling or --converge-after', file=sys.stderr)
+        sys.exit(1)
+
     tosser = Tosser()
     tosser.set_source(source)
-    asyncio.run(tosser.generate())
+    if profile:
+        tosser.profile()
+
+    sampling = None
+    if any(opt is not None for opt in [sample_every, sample_size, converge_after]):
+        sampling = SampleConfig(converge_after=converge_after)
+        if sample_every is not None:
+            sampling.mode, sampling.n = SampleMode.NTH, sample_every
+        elif sample_size is not None:
+            sampling.mode, sampling.n = SampleMode.RESERVOIR, sample_size
+
+    stats = asyncio.run(tosser.generate(
+        workers=workers,
+        sampling=sampling,
+        incremental=incremental,
+        content_hash=content_hash,
+        batch_size=batch_size,
+        array_sample=array_sample
+    ))
+    print(f'Objects seen: {stats.seen}, skipped: {stats.skipped}')
+    if profile:
+        print(tosser.metrics.report())
 
 
 @app.command(name='open')
@@ -65,9 +128,15 @@ def _open(
 
 
 @app.command(name='in')
-def _in():
+def _in(
+    profile: Annotated[bool, typer.Option(help='Print stage timings and counters when done')] = False
+):
     ts = Tosser()
+    if profile:
+        ts.profile()
     asyncio.run(ts.ingest())
+    if profile:
+        print(ts.metrics.report())
 
 
 def main():
@@ -0,0 +1,75 @@
+import json
+import asyncio
+
+import pytest
+
+from tosser import Tosser
+from tosser.exceptions import TosserException
+from tosser.endpoint.source import FileSource
+from tosser.map import TosserMap
+from tosser.object import TosserObject
+from tosser.sampling import Sampler, SampleConfig, SampleMode
+from tosser.schema import TosserSchema
+
+
+def _objs(n):
+    return [TosserObject(metadata={}, data={'i': str(i)}) for i in range(n)]
+
+
+def test_sampler_nth():
+    sampler = Sampler(SampleConfig(mode=SampleMode.NTH, n=3))
+    picked = [obj for obj in _objs(10) if sampler.offer(obj) is not None]
+    assert [obj.data['i'] for obj in picked] == ['0', '3', '6', '9']
+    assert sampler.stats.seen == 10
+
+
+def test_sampler_reservoir():
+    sampler = Sampler(SampleConfig(mode=SampleMode.RESERVOIR, n=4, seed=1))
+    assert all(sampler.offer(obj) is None for obj in _objs(100))
+    held = sampler.drain()
+    assert len(held) == 4
+    assert len({obj.data['i'] for obj in held}) == 4
+
+
+def test_schema_converges(tmp_path):
+    schema_map = TosserMap(m_schema='data', m_root_table='root', m_key_templ='{table}_id', m_tables={})
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    assert schema.contribute(TosserObject(metadata={}, data={'a': 'x'}))
+    assert not schema.contribute(TosserObject(metadata={}, data={'a': 'y'}))
+    assert not schema.is_converged(2)
+    assert not schema.contribute(TosserObject(metadata={}, data={'a': 'z'}))
+    assert schema.is_converged(2)
+    assert schema.contribute(TosserObject(metadata={}, data={'b': 'x'}))
+    assert schema.stable_n == 0
+
+
+def test_schema_converges_batched(tmp_path):
+    schema_map = TosserMap(m_schema='data', m_root_table='root', m_key_templ='{table}_id', m_tables={})
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.batch_size = 100
+    schema.begin()
+    assert schema.contribute(TosserObject(metadata={}, data={'a': 1}))
+    for _ in range(3):
+        assert not schema.contribute(TosserObject(metadata={}, data={'a': 2}))
+    # the buffered value widens the type, it is not converged yet
+    assert not schema.contribute(TosserObject(metadata={}, data={'a': 'x'}))
+    assert not schema.is_converged(2)
+    assert str(schema.get_column_by_name(schema.get_table('root'), 'a').type_var) == 'string'
+    assert schema.stable_n == 0
+    for _ in range(2):
+        assert not schema.contribute(TosserObject(metadata={}, data={'a': 'y'}))
+    assert schema.is_converged(2)
+
+
+def test_incremental_refuses_sampling(tmp_path):
+    (tmp_path / 'a.json').write_text(json.dumps({'metadata': {}, 'data': {'a': 'x'}}))
+    (tmp_path / 'map.tosser.json').write_text(json.dumps({'Defaults': {'Schema': 'data', 'RootTable': 'root'}}))
+    (tmp_path / 'config.tosser.json').write_text('{}')
+    tosser = Tosser(work_dir=tmp_path)
+    tosser.set_source(FileSource({'driver': 'file', 'path': str(tmp_path / 'a.json')}))
+
+    # files only partly contributed must not be recorded as seen
+    for sampling in [SampleConfig(mode=SampleMode.NTH, n=2), SampleConfig(converge_after=10)]:
+        with pytest.raises(TosserException):
+            asyncio.run(tosser.generate(sampling=sampling, incremental=True))
@@ -1,7 +1,353 @@
+import json
+import asyncio
+from pathlib import Path
+
 import pytest
 
 from tosser import Tosser
+from tosser import decoder
+from tosser.map import TosserMap
+from tosser.configd import ConfigExtender
+from tosser.traverse import Traverser
+from tosser.object import TosserObject
+from tosser.schema import TosserSchema
+from tosser.metrics import TosserMetrics
+from tosser.endpoint.source import FileSource
+
+
+@pytest.fixture
+def schema_map():
+    return TosserMap(
+        m_schema='data',
+        m_root_table='root',
+        m_key_templ='{table}_id',
+        m_tables={},
+    )
+
 
 def test_schema():
     ts = Tosser()
     assert True
+
+
+def test_schema_indexed_lookup(schema_map, tmp_path):
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    schema.contribute(TosserObject(metadata={}, data={'a': 'x', 'b': {'c': 'y'}, 'd': ['z']}))
+    schema.end()
+
+    root = schema.get_table('root')
+    assert schema.has_table(root)
+    assert list(root.columns.keys()) == ['a', 'b_c']
+    assert schema.has_column_by_name(root, 'b_c')
+    assert not schema.has_column_by_name(root, 'missing')
+    assert schema.get_column_by_name(schema.get_table('d'), '@value').max_length == 1
+
+
+def test_schema_render_load_roundtrip(schema_map, tmp_path):
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    schema.contribute(TosserObject(metadata={}, data={'a': 'x', 'b': [{'c': 'yy'}]}))
+    schema.end()
+    schema.write_file(tmp_path)
+
+    loaded = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    loaded.load_file()
+    assert loaded._render() == schema._render()
+
+
+def test_schema_resolution_cache(schema_map, tmp_path):
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    schema.contribute(TosserObject(metadata={}, data={'items': [{'name': str(i)} for i in range(100)]}))
+    schema.end()
+
+    # element plans of the shape cache answer the other lookups in front of the resolution cache
+    info = schema.resolution_cache_info()
+    assert info.misses == 1
+    assert info.hits + schema.skipped_resolutions() == 99
+    assert list(schema.get_table('items').columns.keys()) == ['name']
+
+    schema.map = TosserMap(
+        m_schema='data',
+        m_root_table='root',
+        m_key_templ='{table}_id',
+        m_tables={},
+        m_table_delimeter='__',
+    )
+    assert schema.resolution_cache_info().currsize == 0
+
+
+@pytest.mark.parametrize('shape_cache_size', [0, 1024])
+def test_schema_resolution_cache_behind_shape_cache(schema_map, tmp_path, monkeypatch, shape_cache_size):
+    monkeypatch.setattr('tosser.schema.SCHEMA_SHAPE_CACHE_SIZE', shape_cache_size)
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    schema.contribute(TosserObject(metadata={}, data={'items': [{'name': str(i)} for i in range(100)]}))
+    schema.end()
+
+    info = schema.resolution_cache_info()
+    shape_info = schema.shape_cache_info()
+    assert info.misses == 1
+    if shape_cache_size > 0:
+        # every element after the first reuses its plan and never reaches the resolution cache
+        assert (info.hits, schema.skipped_resolutions()) == (0, 99)
+        assert shape_info.hits == 99 and shape_info.currsize > 0
+    else:
+        assert (info.hits, schema.skipped_resolutions()) == (99, 0)
+        assert shape_info.hits == 0 and shape_info.currsize == 0
+
+    schema.map = schema_map
+    assert schema.skipped_resolutions() == 0
+    assert schema.shape_cache_info().currsize == 0
+
+
+def test_schema_generate_resets_between_runs(tmp_path):
+    (tmp_path / 'map.tosser.json').write_text(json.dumps({'Defaults': {'Schema': 'data', 'RootTable': 'root'}}))
+    (tmp_path / 'config.tosser.json').write_text('{}')
+    tosser = Tosser(work_dir=tmp_path)
+    assert tosser.map is not None
+    # one schema object across runs, the way it is kept after loading it
+    tosser.schema = TosserSchema(path=tosser.schema_file, map=tosser.map)
+
+    def _generate(name, data):
+        path = tmp_path / f'{name}.json'
+        path.write_text(json.dumps({'metadata': {}, 'data': data}))
+        tosser.set_source(FileSource({'driver': 'file', 'path': str(path)}))
+        asyncio.run(tosser.generate())
+        assert tosser.schema is not None
+        return {
+            (table.table_name, column.column_name): str(column.type_var)
+            for table in tosser.schema.schema.values()
+            for column in table.columns.values()
+        }
+
+    _generate('a', {'a': 'x', 't': {'x': 'y'}, 'arr': [{'q': 'text'}]})
+    columns = _generate('b', {'b': 'x', 'arr': [{'q': 1}]})
+    assert [column for table, column in columns if table == 'root'] == ['b']
+    assert columns[('arr', 'q')] == 'integer'
+
+
+def test_schema_merge_order_independent(schema_map, tmp_path):
+    objs = [
+        {'a': 'x', 'b': [{'c': 'y'}]},
+        {'a': 'longer value', 'd': 'z'},
+        {'a': 'q', 'b': [{'c': 'yyy', 'e': 'w'}]},
+    ]
+
+    def _partial(obj):
+        partial = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+        partial.begin()
+        partial.contribute(TosserObject(metadata={}, data=obj))
+        partial.end()
+        return partial
+
+    def _merged(order):
+        merged = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+        for i in order:
+            merged.merge(_partial(objs[i]))
+        return merged
+
+    forward = _merged([0, 1, 2])
+    backward = _merged([2, 1, 0])
+
+    def _columns(schema):
+        return {
+            (table.table_name, column.column_name): (str(column.type_var), column.enum, column.max_length)
+            for table in schema.schema.values()
+            for column in table.columns.values()
+        }
+
+    assert _columns(forward) == _columns(backward)
+    assert forward.get_column_by_name(forward.get_table('root'), 'a').max_length == len('longer value')
+    assert forward.get_column_by_name(forward.get_table('b'), 'c').enum == {'y', 'yyy'}
+    assert forward._gen_n == 3
+
+
+def test_schema_source_fingerprints(schema_map, tmp_path):
+    source_file = tmp_path / 'a.json'
+    source_file.write_text('{"metadata": {}, "data": {"a": "x"}}')
+
+    source = FileSource({'driver': 'file', 'path': str(source_file)})
+    changed, fingerprints = source.incremental({}, content_hash=True)
+    assert changed.file_list == [source_file]
+
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    schema.sources = fingerprints
+    schema.end()
+    schema.write_file(tmp_path)
+
+    loaded = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    loaded.load_file()
+    assert loaded.sources == fingerprints
+
+    unchanged, _ = source.incremental(loaded.sources, content_hash=True)
+    assert unchanged.file_list == []
+
+
+def test_schema_profiling(schema_map, tmp_path, capsys):
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    assert schema.metrics.timed(schema.get_column_attributes, 'resolve') == schema.get_column_attributes
+
+    schema.metrics = TosserMetrics(enabled=True)
+    schema.begin()
+    schema.contribute(TosserObject(metadata={}, data={'a': 'x', 'b': ['y', 'z']}))
+    schema.end()
+
+    assert capsys.readouterr().out == ''
+    # the array of primitives is resolved and traversed once as a block
+    assert schema.metrics.timers['resolve'].calls == 2
+    assert schema.metrics.timers['traverse'].calls == 2
+    assert schema.metrics.counters['values contributed'] == 3
+    assert schema.metrics.counters['shape cache misses'] == 2
+
+
+def test_schema_shape_cache(schema_map, tmp_path, monkeypatch):
+    objs = [
+        {'id': i, 'user': {'name': str(i)}, 'items': [{'sku': str(j), 'tags': ['x'] * j} for j in range(i % 4)]}
+        for i in range(50)
+    ]
+
+    def _render(size):
+        monkeypatch.setattr('tosser.schema.SCHEMA_SHAPE_CACHE_SIZE', size)
+        schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+        schema.begin()
+        for obj in objs:
+            schema.contribute(TosserObject(metadata={}, data=obj))
+        schema.end()
+        return schema
+
+    cached = _render(64)
+    assert cached._render() == _render(0)._render()
+
+    info = cached.shape_cache_info()
+    assert info.currsize <= 64
+    assert info.hit_rate > 0.9
+
+
+@pytest.mark.parametrize('batch_size', [0, 3])
+def test_schema_primitive_array_blocks(schema_map, tmp_path, monkeypatch, batch_size):
+    objs = [{'readings': [i * 0.5, i, None], 'tags': ['a', 'bb', str(i)]} for i in range(10)]
+
+    def _render(shape_cache_size, array_sample=0):
+        monkeypatch.setattr('tosser.schema.SCHEMA_SHAPE_CACHE_SIZE', shape_cache_size)
+        schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+        schema.batch_size = batch_size
+        schema.array_sample = array_sample
+        schema.begin()
+        for obj in objs:
+            schema.contribute(TosserObject(metadata={}, data=obj))
+        schema.end()
+        return schema
+
+    assert _render(64)._render() == _render(0)._render()
+
+    sampled = _render(64, array_sample=2)
+    column = sampled.schema['readings'].columns['@value']
+    assert column.stats.count == 20
+
+
+@pytest.mark.parametrize('batch_size', [1, 4, 1000])
+def test_schema_batched_matches_direct(schema_map, tmp_path, batch_size):
+    objs = [
+        {
+            'n': i,
+            'kind': ['a', 'b'][i % 2],
+            'mixed': [1, '2.5', None][i % 3],
+            # equal values of different types must not collapse into one distinct value
+            'flag': [5, 1, True][i % 3],
+            'ratio': [5, 1, 1.0][i % 3],
+        }
+        for i in range(20)
+    ]
+
+    def _render(size):
+        schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+        schema.batch_size = size
+        schema.begin()
+        for obj in objs:
+            schema.contribute(TosserObject(metadata={}, data=obj))
+        schema.end()
+        return schema._render()
+
+    assert _render(batch_size) == _render(0)
+
+
+def test_schema_binary_cache(schema_map, tmp_path):
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    schema.contribute(TosserObject(metadata={}, data={'a': 'x', 'b': [{'c': 1}]}))
+    schema.end()
+    schema.write_file(tmp_path)
+    assert schema.cache_path().exists()
+
+    loaded = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    assert loaded._read_cache() is not None
+    loaded.load_file()
+    assert loaded._render() == schema._render()
+
+    # editing the schema file by hand invalidates the cache
+    edited = (tmp_path / 'schema.toss').read_text().replace('"integer"', '"decimal"')
+    (tmp_path / 'schema.toss').write_text(edited)
+    assert loaded._read_cache() is None
+    loaded.load_file()
+    assert str(loaded.get_column_by_name(loaded.get_table('b'), 'c').type_var) == 'decimal'
+    assert loaded._read_cache() is not None
+
+
+def test_schema_map_directives_prune_traversal(tmp_path):
+    schema_map = TosserMap.from_dict({
+        'Defaults': {'Schema': 'data', 'RootTable': 'root'},
+        'Tables': {
+            'root': {'columns': {'@ignore': ['html', 'meta/raw']}},
+            'root_user': {'source': ['user'], 'columns': {'@keep': ['id', 'address/city']}},
+        },
+    })
+    schema = TosserSchema(map=schema_map, path=tmp_path / 'schema.toss')
+    schema.begin()
+    schema.contribute(TosserObject(metadata={}, data={
+        'id': 1,
+        'html': '<html></html>',
+        'meta': {'raw': 'blob', 'page': 2},
+        'user': {'id': 3, 'name': 'n', 'address': {'city': 'c', 'zip': 'z'}},
+    }))
+    schema.end()
+
+    columns = {
+        (table.table_name, column.column_name)
+        for table in schema.schema.values()
+        for column in table.columns.values()
+    }
+    assert ('root', 'html') not in columns
+    assert all('raw' not in column and 'name' not in column and 'zip' not in column for _, column in columns)
+    assert any('page' in column for _, column in columns)
+    assert any('city' in column for _, column in columns)
+
+
+def test_schema_map_projection_sample_map():
+    map_file = Path(__file__).parent.parent / 'configs' / 'schema' / 'basic' / 'map.json'
+    schema_map = TosserMap.from_dict(ConfigExtender(map_file, decoder.load).render())
+    projection = schema_map.projection()
+    assert projection is not None
+
+    # "users/*/friends" is a path with a wildcard, "@keep": "first_name" a single column
+    friends = projection.get('users').get('friends')
+    assert friends.restricted
+    assert list(friends.children) == ['first_name']
+    assert friends.wildcard.excluded
+    assert '@meta' not in projection.children
+
+    data = {
+        'id': 1,
+        'users': [
+            {'height': 180, 'friends': [{'first_name': 'a', 'last_name': 'b', 'address': {'city': 'c'}}]},
+        ],
+    }
+    keys = {
+        Traverser.get_trail_string(trail)
+        for trail, _, _ in Traverser(projection=projection).traverse(TosserObject(metadata={}, data=data))
+    }
+    assert len(keys) == 3
+    assert not any('last_name' in key or 'city' in key for key in keys)
+    assert any('first_name' in key for key in keys)
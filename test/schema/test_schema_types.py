@@ -0,0 +1,36 @@
+import pytest
+
+from tosser.schema_types import TosserSchemaType, infer_type
+
+
+@pytest.mark.parametrize('value,expected', [
+    (None, TosserSchemaType.NULL),
+    (True, TosserSchemaType.BOOLEAN),
+    (3, TosserSchemaType.INTEGER),
+    (2.5, TosserSchemaType.DECIMAL),
+    ('42', TosserSchemaType.INTEGER),
+    ('007', TosserSchemaType.STRING),
+    ('-1.25e3', TosserSchemaType.DECIMAL),
+    ('2023-01-31', TosserSchemaType.DATE),
+    ('2023-13-01', TosserSchemaType.STRING),
+    ('2023-01-31T12:30:00.123+02:00', TosserSchemaType.DATETIME),
+    ('12:30', TosserSchemaType.TIME),
+    ('hello', TosserSchemaType.STRING),
+])
+def test_infer_type(value, expected):
+    assert infer_type(value).type == expected
+
+
+def test_infer_type_widens():
+    inference = infer_type(None)
+    for value, expected in [
+        (1, TosserSchemaType.INTEGER),
+        ('2.5', TosserSchemaType.DECIMAL),
+        (None, TosserSchemaType.DECIMAL),
+        ('n/a', TosserSchemaType.STRING),
+        (3, TosserSchemaType.STRING),
+    ]:
+        inference = infer_type(value, inference=inference)
+        assert inference.type == expected
+
+    assert infer_type('2023-01-31T00:00', inference=infer_type('2023-01-31')).type == TosserSchemaType.DATETIME
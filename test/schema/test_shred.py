@@ -0,0 +1,58 @@
+from tosser.map import TosserMap
+from tosser.object import TosserObject
+from tosser.schema import TosserSchema
+from tosser.shred import TosserShredder
+
+
+def _schema(objects):
+    schema = TosserSchema(map=TosserMap(m_schema='data', m_root_table='root', m_key_templ='{table}_id', m_tables={}))
+    schema.begin()
+    for data in objects:
+        schema.contribute(TosserObject(metadata={}, data=data))
+    schema.end()
+    return schema
+
+
+def test_shred_rows_with_keys():
+    data = {
+        'id': 7,
+        'meta': {'page': 1},
+        'users': [
+            {'name': 'a', 'tags': ['x', 'y']},
+            {'name': 'b', 'tags': []},
+        ],
+    }
+    schema = _schema([data])
+    rows = TosserShredder(schema).shred(TosserObject(metadata={}, data=data))
+
+    assert list(rows) == ['root', 'users', 'users_tags']
+    assert rows['root'] == [{'root_id': 1, 'id': 7, 'meta_page': 1}]
+    assert rows['users'] == [
+        {'users_id': 1, 'root_id': 1, 'name': 'a'},
+        {'users_id': 2, 'root_id': 1, 'name': 'b'},
+    ]
+    assert rows['users_tags'] == [
+        {'users_tags_id': 1, 'users_id': 1, '@value': 'x'},
+        {'users_tags_id': 2, 'users_id': 1, '@value': 'y'},
+    ]
+
+
+def test_shred_drops_unknown_columns_unless_dynamic():
+    schema = _schema([{'a': 1}])
+    obj = TosserObject(metadata={}, data={'a': 2, 'b': 3})
+
+    strict = TosserShredder(schema)
+    assert strict.shred(obj) == {'root': [{'root_id': 1, 'a': 2}]}
+    assert strict.dropped == 1
+    assert TosserShredder(schema, dynamic=True).shred(obj) == {'root': [{'root_id': 1, 'a': 2, 'b': 3}]}
+
+
+def test_shred_batches_parents_first():
+    data = {'id': 1, 'items': [{'v': 1}, {'v': 2}, {'v': 3}]}
+    schema = _schema([data])
+    shredder = TosserShredder(schema, batch_size=2)
+
+    batches = shredder.add(TosserObject(metadata={}, data=data))
+    assert [(batch.table, len(batch.rows)) for batch in batches] == [('root', 1), ('items', 2)]
+    batches = shredder.flush()
+    assert [(batch.table, len(batch.rows)) for batch in batches] == [('items', 1)]
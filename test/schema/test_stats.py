@@ -0,0 +1,48 @@
+from tosser.stats import ColumnStats
+
+
+def test_column_stats_enum_and_lengths():
+    stats = ColumnStats()
+    for value in ['a', 'bb', 'a', None, 'ccc']:
+        stats.add(value)
+
+    assert stats.count == 5
+    assert stats.nulls == 1
+    assert stats.max_length == 3
+    assert stats.enum(4) == {'a', 'bb', 'ccc'}
+    assert stats.enum(2) is None
+
+
+def test_column_stats_merge_and_roundtrip():
+    left, right = ColumnStats(), ColumnStats()
+    for i in range(5000):
+        left.add(i)
+        right.add(i + 2500)
+
+    left.merge(right)
+    assert left.min == 0
+    assert left.max == 7499
+    assert left.enum(4) is None
+    assert abs(left.distinct - 7500) < 7500 * 0.1
+
+    loaded = ColumnStats.from_dict(left.to_dict(registers=True))
+    assert loaded.to_dict(registers=True) == left.to_dict(registers=True)
+
+
+def test_column_stats_registers_stay_out_of_schema_file():
+    stats = ColumnStats()
+    for i in range(3):
+        stats.add(i)
+    assert stats.hll.registers.count(0) == len(stats.hll.registers)
+
+    for i in range(3, 2000):
+        stats.add(i)
+    assert 'hll' not in stats.to_dict()
+
+    cached = ColumnStats.from_dict(stats.to_dict(registers=True))
+    assert cached.hll.registers == stats.hll.registers
+    loaded = ColumnStats.from_dict(stats.to_dict())
+    assert loaded.distinct == stats.distinct
+
+    loaded.merge(cached)
+    assert loaded.distinct == stats.distinct
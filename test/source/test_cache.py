@@ -0,0 +1,72 @@
+import os
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from tosser.endpoint.source import FileSource
+from tosser.endpoint.source.cache import ObjectCache, OBJECT_CACHE_DIR
+from tosser.fingerprint import fingerprint_file
+from tosser.metrics import TosserMetrics
+
+
+def _collect(tmp_path, work_dir):
+    source = FileSource({'driver': 'file', 'path': str(tmp_path / '*.json'), 'cache': True})
+    source.work_dir = work_dir
+    source.metrics = TosserMetrics(enabled=True)
+    objs = asyncio.run(source.collect_objects())
+    return sorted((obj.metadata['file'], json.dumps(obj.data)) for obj in objs), source.metrics.counters
+
+
+def test_file_source_object_cache(tmp_path):
+    work_dir = tmp_path / 'work'
+    for i in range(3):
+        (tmp_path / f'{i}.json').write_text(json.dumps({'metadata': {'i': i}, 'data': {'v': [i, 'x', None]}}))
+
+    first, counters = _collect(tmp_path, work_dir)
+    assert counters['object cache misses'] == 3
+    assert len(list((work_dir / OBJECT_CACHE_DIR).iterdir())) == 3
+
+    second, counters = _collect(tmp_path, work_dir)
+    assert second == first
+    assert counters['object cache hits'] == 3
+
+    # a rewritten file is decoded again
+    (tmp_path / '0.json').write_text(json.dumps({'metadata': {}, 'data': {'v': 'new'}}))
+    third, counters = _collect(tmp_path, work_dir)
+    assert counters['object cache hits'] == 2 and counters['object cache misses'] == 1
+    assert ('0.json', json.dumps({'v': 'new'})) in third
+
+
+def test_object_cache_evicts_least_recently_used(tmp_path):
+    cache = ObjectCache(tmp_path / 'cache', budget=400)
+    files = []
+    for i in range(4):
+        path = tmp_path / f'{i}.json'
+        path.write_text('{}')
+        files.append(path)
+        cache.put(path, fingerprint_file(path), {'pad': 'x' * 100})
+        os.utime(cache.entry_path(path, fingerprint_file(path)), ns=(i * 10**9, i * 10**9))
+        # reading the first entry keeps it fresh
+        cache.get(files[0])
+
+    assert cache.size() <= 400
+    assert cache.get(files[0])[1] == {'pad': 'x' * 100}
+    assert cache.get(files[1])[1] is None
+
+    cache.clear()
+    assert cache.size() == 0
+
+
+def test_object_cache_concurrent_puts(tmp_path):
+    cache = ObjectCache(tmp_path / 'cache', budget=2000)
+    files = []
+    for i in range(64):
+        path = tmp_path / f'{i}.json'
+        path.write_text('{}')
+        files.append(path)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda path: cache.put(path, fingerprint_file(path), {'pad': 'x' * 100}), files))
+
+    assert cache._size == cache.size()
+    assert cache.size() <= 2000
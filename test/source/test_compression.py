@@ -0,0 +1,71 @@
+import bz2
+import gzip
+import lzma
+import json
+import asyncio
+
+import pytest
+
+from tosser.endpoint.source import FileSource, NdjsonSource
+from tosser.endpoint.source import ndjson
+from tosser.parsers.compression import detect_file_compression, open_source
+
+CODECS = {'gzip': gzip.compress, 'bz2': bz2.compress, 'xz': lzma.compress}
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS))
+def test_open_source_decompresses(tmp_path, codec):
+    path = tmp_path / 'a.json'
+    path.write_bytes(CODECS[codec]('{"é": 1}\n'.encode('utf-8')))
+    assert detect_file_compression(path) == codec
+    with open_source(path) as f:
+        assert f.read() == '{"é": 1}\n'
+
+
+@pytest.mark.parametrize('codec', sorted(CODECS))
+@pytest.mark.parametrize('stream', [False, True])
+def test_file_source_reads_compressed(tmp_path, codec, stream):
+    doc = {'metadata': {'m': 1}, 'data': [{'a': i} for i in range(5)]}
+    (tmp_path / 'plain.json').write_text(json.dumps(doc))
+    (tmp_path / 'packed.json').write_bytes(CODECS[codec](json.dumps(doc).encode('utf-8')))
+
+    objs = asyncio.run(FileSource({'driver': 'file', 'path': str(tmp_path / '*.json'), 'stream': stream}).collect_objects())
+    by_file = {}
+    for obj in objs:
+        by_file.setdefault(obj.metadata['file'], []).append(obj.data)
+    assert by_file['packed.json'] == by_file['plain.json']
+
+
+def test_ndjson_reads_compressed(tmp_path):
+    lines = ''.join(json.dumps({'n': i}) + '\n' for i in range(20))
+    (tmp_path / 'a.jsonl.gz').write_bytes(gzip.compress(lines.encode('utf-8')))
+    (tmp_path / 'b.jsonl.xz').write_bytes(lzma.compress(lines.encode('utf-8')))
+    config = {'driver': 'ndjson', 'path': str(tmp_path / '*.jsonl.*')}
+
+    full = [obj.data for obj in asyncio.run(NdjsonSource(config).collect_objects())]
+    assert len(full) == 40
+    resumed = [obj.data for obj in asyncio.run(NdjsonSource({**config, 'start_record': 25}).collect_objects())]
+    assert resumed == full[25:]
+
+
+def test_ndjson_compressed_in_batches(tmp_path, monkeypatch):
+    lines = ''.join(json.dumps({'n': i}) + '\n' for i in range(20))
+    (tmp_path / 'a.jsonl').write_text(lines)
+    (tmp_path / 'b.jsonl.gz').write_bytes(gzip.compress(lines.encode('utf-8')))
+    (tmp_path / 'c.jsonl').write_text(lines)
+
+    parsed = []
+    parse_lines = ndjson._parse_lines
+    monkeypatch.setattr(ndjson, 'NDJSON_COMPRESSED_BATCH', 6)
+
+    def _parse_batch(path, batch, *args):
+        parsed.append((path.name, len(batch)))
+        return parse_lines(path, batch, *args)
+    monkeypatch.setattr(ndjson, '_parse_lines', _parse_batch)
+
+    config = {'driver': 'ndjson', 'path': str(tmp_path / '*'), 'workers': 2, 'range_size': 64}
+    objs = asyncio.run(NdjsonSource(config).collect_objects())
+    assert [obj.data['n'] for obj in objs] == list(range(20)) * 3
+    assert [obj.metadata['file'] for obj in objs[20:40]] == ['b.jsonl.gz'] * 20
+    # 20 lines in batches of 6, never all records of the file at once
+    assert [n for name, n in parsed if name == 'b.jsonl.gz' and n > 0] == [6, 6, 6, 2]
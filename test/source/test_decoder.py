@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from tosser import decoder
+
+
+@pytest.fixture(autouse=True)
+def restore_decoder():
+    yield
+    decoder.set_decoder('json')
+
+
+@pytest.mark.parametrize('name', decoder.available_decoders())
+def test_decoders_match_stdlib(name):
+    assert decoder.set_decoder(name).name == name
+    doc = '{"a": [1, 2.5, -3e-7, null, true], "é": "\\u00e9\\n", "big": 123456789012345678901234567890, "nan": NaN}'
+    assert json.dumps(decoder.loads(doc)) == json.dumps(json.loads(doc))
+    assert decoder.loads(doc.encode('utf-8'))['é'] == 'é\n'
+
+    with pytest.raises(json.JSONDecodeError):
+        decoder.loads('{"a": }')
+
+
+def test_decoder_falls_back_when_missing(monkeypatch):
+    def _missing():
+        raise ImportError('not installed')
+
+    monkeypatch.setitem(decoder.JSON_DECODERS, 'ujson', _missing)
+    assert decoder.set_decoder('ujson').name == decoder.available_decoders()[0]
+    assert decoder.available_decoders()[-1] == 'json'
@@ -0,0 +1,49 @@
+import os
+import glob
+import time
+
+import pytest
+
+from tosser.endpoint.source import FileSource
+from tosser.endpoint.source.discover import iter_paths, FileFilter
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for d in ['a', 'a/b', 'a/b/c', 'd', '.hidden', 'a/.cache']:
+        (tmp_path / d).mkdir(parents=True, exist_ok=True)
+    for f in ['x.json', 'a/y.json', 'a/b/z.json', 'a/b/c/w.json', 'a/b/c/v.txt', 'd/u.json', '.hidden/t.json',
+              'a/.cache/s.json', 'a/.dot.json', *[f'd/n{i}.json' for i in range(30)]]:
+        (tmp_path / f).write_text('{}')
+    return tmp_path
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+@pytest.mark.parametrize('pattern', ['*.json', '**/*.json', 'a/**', 'a/*/*.json', '*/b/**/*.json', 'a/.*.json', '**/n1?.json', 'd/n[0-2].json'])
+def test_discover_matches_glob(tree, monkeypatch, workers, pattern):
+    monkeypatch.setattr('tosser.endpoint.source.discover.DISCOVER_BATCH', 4)
+    full = os.path.join(str(tree), pattern)
+    expected = sorted(p for p in glob.glob(full, recursive=True) if os.path.isfile(p))
+    found = [str(p) for p in iter_paths(full, workers=workers)]
+    assert len(found) == len(set(found))
+    assert sorted(found) == expected
+
+
+def test_discover_relative_and_literal(tree, monkeypatch):
+    monkeypatch.chdir(tree)
+    assert sorted(str(p) for p in iter_paths('a/**/*.json')) == sorted(glob.glob('a/**/*.json', recursive=True))
+    assert [str(p) for p in iter_paths('x.json')] == ['x.json']
+    assert list(iter_paths('missing/*.json')) == []
+
+
+def test_discover_filters(tree):
+    (tree / 'big.json').write_text('{"a": "' + 'x' * 100 + '"}')
+    old = tree / 'x.json'
+    os.utime(old, (time.time() - 3600, time.time() - 3600))
+
+    assert [p.name for p in iter_paths(str(tree / '*.json'), file_filter=FileFilter(min_size=10))] == ['big.json']
+    recent = FileFilter(modified_after=time.time() - 60)
+    assert sorted(p.name for p in iter_paths(str(tree / '*.json'), file_filter=recent)) == ['big.json']
+
+    source = FileSource({'driver': 'file', 'path': str(tree / '**/*.json'), 'max_size': 2})
+    assert 'big.json' not in {p.name for p in source.iter_files()}
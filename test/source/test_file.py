@@ -0,0 +1,51 @@
+import json
+import asyncio
+
+import pytest
+
+from tosser.endpoint.source import FileSource
+from tosser.endpoint.source.source import SourceEndpointException
+from tosser.metrics import TosserMetrics
+
+
+@pytest.mark.parametrize('read_ahead', [1, 4])
+def test_file_source_read_ahead_keeps_order(tmp_path, read_ahead):
+    for i in range(10):
+        # larger files first so later ones finish decoding sooner
+        (tmp_path / f'{i}.json').write_text(json.dumps({'metadata': {}, 'data': {'n': i, 'pad': 'x' * (10 - i) * 10000}}))
+
+    source = FileSource({'driver': 'file', 'path': str(tmp_path / '*.json'), 'read_ahead': read_ahead})
+    source.metrics = TosserMetrics(enabled=True)
+    objs = asyncio.run(source.collect_objects())
+
+    assert [obj.metadata['file'] for obj in objs] == [f.name for f in source.file_list]
+    assert source.metrics.counters['files read'] == 10
+    assert source.metrics.counters['files in flight'] == read_ahead
+
+
+def test_file_source_read_ahead_raises_in_order(tmp_path):
+    (tmp_path / 'a.json').write_text('{"metadata": {}, "data": 1}')
+    (tmp_path / 'b.json').write_text('{"data": 2}')
+
+    source = FileSource({'driver': 'file', 'path': str(tmp_path / 'a.json')})
+    source.file_list = [tmp_path / 'a.json', tmp_path / 'b.json']
+
+    async def _collect(seen):
+        async for obj in source.iter_objects():
+            seen.append(obj.data)
+
+    seen = []
+    with pytest.raises(SourceEndpointException):
+        asyncio.run(_collect(seen))
+    assert seen == [1]
+
+
+def test_file_source_events_defers_data(tmp_path):
+    (tmp_path / 'a.json').write_text(json.dumps({'data': {'n': [1, 2]}, 'metadata': {'source': 'x'}}))
+
+    source = FileSource({'driver': 'file', 'path': str(tmp_path / 'a.json'), 'events': True})
+    objs = asyncio.run(source.collect_objects())
+
+    assert len(objs) == 1
+    assert objs[0].metadata['source'] == 'x'
+    assert [value for trail, value, _ in objs[0].data.events() if trail is not None] == [1, 2]
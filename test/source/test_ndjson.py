@@ -0,0 +1,123 @@
+import re
+import gzip
+import json
+import asyncio
+
+import pytest
+
+from tosser.endpoint.source import NdjsonSource, SOURCE_DRIVERS
+from tosser.endpoint.source.source import SourceEndpointException
+from tosser.endpoint.source.ndjson import LineIndex, split_ranges, NDJSON_INDEX_DIR
+
+
+@pytest.fixture
+def lines_file(tmp_path):
+    path = tmp_path / 'a.jsonl'
+    path.write_text(''.join(json.dumps({'n': i, 's': 'x' * (i % 7)}) + '\n' for i in range(100)))
+    return path
+
+
+def _data(config, work_dir=None):
+    source = NdjsonSource(config)
+    source.work_dir = work_dir
+    return [obj.data for obj in asyncio.run(source.collect_objects())]
+
+
+def test_ndjson_driver_registered():
+    assert SOURCE_DRIVERS['ndjson'] is NdjsonSource
+
+
+def test_split_ranges_on_line_boundaries():
+    text = b'a\nbb\n\nccc\nd'
+    ranges = split_ranges(text, 0, len(text), 3)
+    assert b''.join(text[a:b] for a, b in ranges) == text
+    assert all(text[b - 1:b] == b'\n' for _, b in ranges[:-1])
+
+
+@pytest.mark.parametrize('workers,ordered', [(1, True), (2, True), (2, False)])
+def test_ndjson_reads_every_line(lines_file, workers, ordered):
+    data = _data({'driver': 'ndjson', 'path': str(lines_file), 'range_size': 64, 'workers': workers, 'ordered': ordered})
+    expected = [{'n': i, 's': 'x' * (i % 7)} for i in range(100)]
+    if ordered:
+        assert data == expected
+    else:
+        assert sorted(data, key=lambda d: d['n']) == expected
+
+
+def test_ndjson_envelope(tmp_path):
+    path = tmp_path / 'a.jsonl'
+    path.write_text('{"metadata": {"m": 1}, "data": {"a": 2}}\n\n{"metadata": {}, "data": [3]}')
+
+    objs = asyncio.run(NdjsonSource({'driver': 'ndjson', 'path': str(path), 'envelope': True}).collect_objects())
+    assert [obj.data for obj in objs] == [{'a': 2}, [3]]
+    assert objs[0].metadata['m'] == 1 and objs[0].metadata['file'] == 'a.jsonl'
+
+    path.write_text('{"a": 1}\n')
+    with pytest.raises(SourceEndpointException):
+        _data({'driver': 'ndjson', 'path': str(path), 'envelope': True})
+
+
+def test_ndjson_shards_cover_file(lines_file):
+    source = NdjsonSource({'driver': 'ndjson', 'path': str(lines_file), 'range_size': 64})
+    shards = source.shard(3)
+    assert len(shards) == 3
+    data = [obj.data for shard in shards for obj in asyncio.run(shard.collect_objects())]
+    assert data == _data({'driver': 'ndjson', 'path': str(lines_file)})
+
+
+def test_ndjson_line_index_resume(lines_file, tmp_path):
+    index = LineIndex.build(lines_file.read_bytes(), stride=8)
+    assert index.lines == 100
+
+    second = tmp_path / 'b.jsonl'
+    second.write_text('{"n": 100}\n{"n": 101}')
+    config = {'driver': 'ndjson', 'path': str(tmp_path / '*.jsonl'), 'index': True, 'index_stride': 8}
+    work_dir = tmp_path / 'work'
+    index_dir = work_dir / NDJSON_INDEX_DIR
+
+    full = _data(config, work_dir)
+    assert len(full) == 102
+    assert _data({**config, 'start_record': 37}, work_dir) == full[37:]
+    assert _data({**config, 'start_record': 101}, work_dir) == full[101:]
+    assert LineIndex.entry_path(index_dir, lines_file).exists()
+
+    # a rewritten file does not reuse its stale index
+    lines_file.write_text('{"n": -1}\n')
+    assert sorted(d['n'] for d in _data({**config, 'start_record': 0}, work_dir)) == [-1, 100, 101]
+    assert LineIndex.read(index_dir, lines_file).lines == 1
+
+
+def test_ndjson_line_index_not_read_as_source(tmp_path):
+    source_dir = tmp_path / 'src'
+    source_dir.mkdir()
+    (source_dir / 'a.jsonl').write_text('{"n": 1}\n{"n": 2}\n')
+    config = {'driver': 'ndjson', 'path': str(source_dir / '*'), 'index': True}
+
+    # the second run would parse an index left next to the file as another source
+    for _ in range(2):
+        assert _data({**config, 'start_record': 1}, tmp_path / 'work') == [{'n': 2}]
+    assert [path.name for path in source_dir.iterdir()] == ['a.jsonl']
+
+
+def test_ndjson_start_record_skips_blank_lines(tmp_path):
+    text = '\n{"n": 0}\n  \n{"n": 1}\n\n\n{"n": 2}\n{"n": 3}\n\n'
+    (tmp_path / 'a.jsonl').write_text(text)
+    (tmp_path / 'b.jsonl.gz').write_bytes(gzip.compress(text.replace('"n": ', '"n": 1').encode('utf-8')))
+    config = {'driver': 'ndjson', 'path': str(tmp_path / '*'), 'range_size': 8}
+
+    index = LineIndex.build(text.encode('utf-8'), stride=2)
+    assert index.lines == 4
+    for start in range(9):
+        expected = [0, 1, 2, 3, 10, 11, 12, 13][start:]
+        assert [d['n'] for d in _data({**config, 'start_record': start})] == expected
+        assert [d['n'] for d in _data({**config, 'start_record': start, 'index_stride': 3})] == expected
+
+
+@pytest.mark.parametrize('name', ['a.jsonl', 'a.jsonl.gz'])
+def test_ndjson_parse_error_reports_file_line(tmp_path, name):
+    text = ''.join(json.dumps({'n': i}) + '\n' for i in range(30)) + '\n{"n": \n'
+    path = tmp_path / name
+    path.write_bytes(gzip.compress(text.encode('utf-8')) if name.endswith('.gz') else text.encode('utf-8'))
+
+    with pytest.raises(SourceEndpointException, match=re.escape(f'line 32 of {path}')):
+        _data({'driver': 'ndjson', 'path': str(path), 'range_size': 64})
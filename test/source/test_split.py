@@ -0,0 +1,80 @@
+import gzip
+import json
+import asyncio
+
+import pytest
+
+from tosser.endpoint.source import FileSource
+from tosser.endpoint.source.source import SourceEndpointException
+from tosser.parsers.split import array_bounds, split_array, decode_range
+
+
+def _ranges(tmp_path, text, size):
+    path = tmp_path / 'a.json'
+    path.write_bytes(text.encode('utf-8'))
+    raw = path.read_bytes()
+    start, end = array_bounds(raw)
+    return path, split_array(raw, start, end, size)
+
+
+def _decode_all(path, ranges):
+    decoded = []
+    for start, end in ranges:
+        part = decode_range(path, start, end)
+        # boundaries never land inside a string or a nested value
+        assert part is not None
+        decoded.extend(part)
+    return decoded
+
+
+def test_split_array_ranges_decode_to_elements(tmp_path):
+    elements = [{'i': i, 's': 'a},{"b' * (i % 3), 'n': [{'x': i}, {'y': '\\"},{', 'z': '\\\\'}]} for i in range(50)]
+    text = json.dumps(elements, indent=1)
+    # every size lands the cut somewhere else, inside strings, escapes and nested values
+    for size in range(1, 80):
+        path, ranges = _ranges(tmp_path, text, size)
+        assert len(ranges) > 5
+        assert _decode_all(path, ranges) == elements
+
+
+def test_split_array_nested_records(tmp_path):
+    elements = [{'id': i, 'items': [{'k': j, 'tags': ['a', '[', '{"'], 'more': [[j], {}]} for j in range(i % 7)]} for i in range(300)]
+    path, ranges = _ranges(tmp_path, json.dumps(elements), 200)
+    assert all(end - start >= 200 for start, end in ranges[:-1])
+    assert _decode_all(path, ranges) == elements
+
+
+@pytest.mark.parametrize('text', ['[]', '  [ ] ', '[1, "a,b", [2, 3], null]'])
+def test_split_array_small(tmp_path, text):
+    path, ranges = _ranges(tmp_path, text, 1)
+    assert _decode_all(path, ranges) == json.loads(text)
+
+
+def test_array_bounds_rejects_objects():
+    assert array_bounds(b' {"data": []} ') is None
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_file_source_split(tmp_path, workers):
+    records = [{'metadata': {'n': i}, 'data': {'v': 'x' * i, 'q': '},{'}} for i in range(200)]
+    (tmp_path / 'big.json').write_text(json.dumps(records))
+    (tmp_path / 'packed.json').write_bytes(gzip.compress(json.dumps(records[:3]).encode('utf-8')))
+    (tmp_path / 'one.json').write_text(json.dumps(records[0]))
+
+    source = FileSource({'driver': 'file', 'path': str(tmp_path / '*.json'), 'split': True, 'split_size': 256, 'split_workers': workers})
+    by_file = {}
+    for obj in asyncio.run(source.collect_objects()):
+        by_file.setdefault(obj.metadata['file'], []).append((obj.metadata['n'], obj.data))
+
+    expected = [(r['metadata']['n'], r['data']) for r in records]
+    assert by_file == {'big.json': expected, 'packed.json': expected[:3], 'one.json': expected[:1]}
+
+
+def test_file_source_split_raw_elements(tmp_path):
+    (tmp_path / 'a.json').write_text(json.dumps([{'v': i} for i in range(30)]))
+    source = FileSource({'driver': 'file', 'path': str(tmp_path / 'a.json'), 'split': True, 'split_size': 16, 'split_workers': 1, 'envelope': False})
+    assert [obj.data for obj in asyncio.run(source.collect_objects())] == [{'v': i} for i in range(30)]
+
+    (tmp_path / 'a.json').write_text('[{"v": 1}, {"v": 2},, {"v": 3}]')
+    with pytest.raises(SourceEndpointException):
+        asyncio.run(source.collect_objects())
@@ -0,0 +1,48 @@
+import io
+import json
+import asyncio
+
+import pytest
+
+from tosser.endpoint.source import FileSource
+from tosser.parsers.stream import iter_stream_records, JsonStreamException
+
+
+def _records(text, chunk_size=7):
+    return list(iter_stream_records(io.StringIO(text), chunk_size=chunk_size))
+
+
+def test_stream_object_data_members():
+    doc = {'metadata': {'m': 1}, 'data': {'a': 'x "quoted" ]}', 'b': {'c': [1, 2, {'d': None}]}, 'e': 1.5e3}}
+    assert _records(json.dumps(doc, indent=2)) == [
+        ({'m': 1}, {'a': 'x "quoted" ]}'}),
+        ({'m': 1}, {'b': {'c': [1, 2, {'d': None}]}}),
+        ({'m': 1}, {'e': 1.5e3}),
+    ]
+
+
+def test_stream_array_data_and_late_metadata():
+    text = '{"data": [{"a": "\\\\"}, [], true], "extra": {"skip": [1]}, "metadata": {}}'
+    assert _records(text) == [({}, {'a': '\\'}), ({}, []), ({}, True)]
+
+
+def test_stream_top_level_array():
+    records = [{'metadata': {'n': i}, 'data': {'v': 'é' * i}} for i in range(5)]
+    assert _records(json.dumps(records), chunk_size=3) == [(r['metadata'], r['data']) for r in records]
+
+
+@pytest.mark.parametrize('text', ['{"data": {"a": 1}}', '{"metadata": {}, "data": {"a": }', '[{"data": 1}]', '{"metadata": {}, "data": 1} 1'])
+def test_stream_rejects_bad_documents(text):
+    with pytest.raises(JsonStreamException):
+        _records(text)
+
+
+def test_file_source_stream_matches_full_read(tmp_path):
+    path = tmp_path / 'a.json'
+    path.write_text(json.dumps({'metadata': {'m': 1}, 'data': {'a': [1, 2], 'b': {'c': 'd'}}}))
+
+    full = asyncio.run(FileSource({'driver': 'file', 'path': str(path)}).collect_objects())
+    streamed = asyncio.run(FileSource({'driver': 'file', 'path': str(path), 'stream': True, 'chunk_size': 4}).collect_objects())
+
+    assert [obj.data for obj in streamed] == [{'a': [1, 2]}, {'b': {'c': 'd'}}]
+    assert all(obj.metadata == full[0].metadata for obj in streamed)
@@ -0,0 +1,149 @@
+import io
+import json
+
+import pytest
+
+from tosser.exceptions import TosserException
+from tosser.map import TosserMap, ProjectionNode
+from tosser.object import TosserObject
+from tosser.schema import TosserSchema
+from tosser.shred import TosserShredder
+from tosser.events import StreamedData, iter_value_events, iter_data_events, read_metadata
+from tosser.parsers.stream import JsonStream
+
+
+DATA = {
+    'id': 7,
+    'meta': {'page': 1, 'empty': {}},
+    'users': [
+        {'name': 'a', 'tags': ['x', 'y'], 'address': {'city': 'p'}},
+        {'name': 'b', 'tags': []},
+    ],
+    'blob': {'nested': [{'deep': 'v' * 100} for _ in range(20)]},
+}
+
+
+def _map():
+    return TosserMap(m_schema='data', m_root_table='root', m_key_templ='{table}_id', m_tables={})
+
+
+def _write(tmp_path, data, metadata=None, name='a.json'):
+    path = tmp_path / name
+    # data first so reading the metadata has to step over it
+    path.write_text(json.dumps({'data': data, 'metadata': metadata or {}}))
+    return path
+
+
+def _contributed(obj):
+    schema = TosserSchema(map=_map())
+    schema.begin()
+    schema.contribute(obj)
+    schema.end()
+    return schema
+
+
+def _path(trail):
+    return tuple(token.val for token in trail)
+
+
+def _sorted_rows(batches):
+    tables = {}
+    for batch in batches:
+        tables.setdefault(batch.table, []).extend(batch.rows)
+    return {table: sorted(rows, key=lambda row: sorted(row.items())) for table, rows in tables.items()}
+
+
+def test_events_values_and_closes():
+    stream = JsonStream(io.StringIO(json.dumps({'a': 1, 'b': [{'c': 2}, 3]})))
+    events = list(iter_value_events(stream, anchors=True))
+
+    values = [(_path(trail) if trail is not None else None, value) for trail, value, _ in events]
+    assert values == [
+        (('$', 'a'), 1),
+        (('$', 'b', 0, 'c'), 2),
+        (None, None),
+        (('$', 'b', 1), 3),
+        (None, None),
+    ]
+    # every element anchor opened is closed once
+    opened = {id(anchor) for trail, _, anchor in events if trail is not None and anchor is not None}
+    closed = [id(anchor) for trail, _, anchor in events if trail is None]
+    assert sorted(closed) == sorted(opened)
+
+
+def test_events_projection_skips_subtrees():
+    projection = ProjectionNode()
+    projection.child('blob').excluded = True
+    users = projection.child('users')
+    users.restricted = True
+    users.child('name')
+
+    with io.StringIO(json.dumps({'data': DATA, 'metadata': {}})) as f:
+        keys = {_path(trail) for trail, _, _ in iter_data_events(f, projection=projection, chunk_size=16)}
+    assert ('$', 'id') in keys
+    assert ('$', 'users', 0, 'name') in keys
+    assert not any('blob' in key or 'tags' in key for key in keys)
+
+
+def test_events_small_chunks(tmp_path):
+    path = _write(tmp_path, DATA, metadata={'source': 'x'})
+
+    with open(path) as f:
+        assert read_metadata(f, chunk_size=8) == {'source': 'x'}
+    small = [(_path(trail), value) for trail, value, _ in StreamedData(path, chunk_size=8).events()]
+    large = [(_path(trail), value) for trail, value, _ in StreamedData(path, chunk_size=1 << 16).events()]
+    assert small == large
+
+
+def test_events_contribute_matches_schema(tmp_path):
+    path = _write(tmp_path, DATA)
+    streamed = _contributed(TosserObject(metadata={}, data=StreamedData(path, chunk_size=32)))
+    loaded = _contributed(TosserObject(metadata={}, data=DATA))
+    assert streamed._render() == loaded._render()
+
+
+def test_events_shred_matches_rows(tmp_path):
+    path = _write(tmp_path, DATA)
+    schema = _contributed(TosserObject(metadata={}, data=DATA))
+
+    shredder = TosserShredder(schema, batch_size=2)
+    with pytest.raises(TosserException):
+        shredder.add(TosserObject(metadata={}, data=StreamedData(path)))
+    batches = list(shredder.stream(StreamedData(path, chunk_size=32)))
+    assert all(len(batch.rows) == 2 for batch in batches)
+    batches += shredder.flush()
+
+    direct = TosserShredder(schema)
+    direct.add(TosserObject(metadata={}, data=DATA))
+    assert _sorted_rows(batches) == _sorted_rows(direct.flush())
+
+
+class _TrackedData(StreamedData):
+    """Records how far into the file the parser has read as each event comes out"""
+
+    def events(self, projection=None, anchors=False):
+        self.consumed = []
+        with open(self.path) as f:
+            for event in iter_data_events(f, projection=projection, anchors=anchors, chunk_size=self.chunk_size):
+                self.consumed.append(f.tell())
+                yield event
+
+
+def test_events_shred_batches_before_end(tmp_path):
+    path = _write(tmp_path, {'items': [{'v': i} for i in range(1000)]})
+    schema = _contributed(TosserObject(metadata={}, data={'items': [{'v': 0}]}))
+
+    data = _TrackedData(path, chunk_size=64)
+    first = next(TosserShredder(schema, batch_size=10).stream(data))
+    assert len(first.rows) == 10
+    assert data.consumed[-1] < path.stat().st_size // 10
+
+
+def test_events_numbers_across_chunks(tmp_path):
+    data = {'values': [{'x': 1.5 + i, 'y': -2.25e-3 * i, 'z': 10 ** (i % 7), 'ok': i % 2 == 0} for i in range(50)]}
+    path = _write(tmp_path, data)
+
+    expected = [(_path(trail), value) for trail, value, _ in StreamedData(path, chunk_size=1 << 16).events()]
+    # every chunk size up to a record puts some boundary inside a number or literal
+    for chunk_size in range(1, 24):
+        assert [(_path(trail), value) for trail, value, _ in StreamedData(path, chunk_size=chunk_size).events()] == expected
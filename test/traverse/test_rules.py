@@ -0,0 +1,61 @@
+from tosser.object import TosserObject
+from tosser.rules import TosserRule, TosserRuleSet, TosserRuleState
+from tosser.traverse import Traverser
+
+
+DATA = {
+    'users': [
+        {'id': 1, 'name': 'a', 'address': {'city': 'x'}},
+        {'id': 2, 'name': 'b', 'address': {'city': 'y'}},
+    ],
+    'meta': {'page': 1, 'address': {'city': 'z'}},
+}
+
+
+def _capture(*rules):
+    rs = TosserRuleSet()
+    for rule in rules:
+        rs.add(rule)
+    return {tuple(result.rule.seek_path): result.rows for result in Traverser().traverse_and_capture(TosserObject(metadata={}, data=DATA), rs)}
+
+
+def test_capture_absolute_rules():
+    results = _capture(
+        TosserRule(['$', 'users'], ['*']),
+        TosserRule(['$', 'meta'], ['page', 'missing']),
+        TosserRule(['$', 'nothing'], ['*']),
+    )
+
+    assert results == {
+        ('$', 'users'): [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}],
+        ('$', 'meta'): [{'page': 1, 'missing': None}],
+    }
+
+
+def test_capture_relative_and_wildcard_rules():
+    results = _capture(
+        TosserRule(['address'], ['city']),
+        TosserRule(['$', '*', 'page'], ['*']),
+    )
+
+    assert results == {
+        ('address',): [{'city': 'x'}, {'city': 'y'}, {'city': 'z'}],
+        ('$', '*', 'page'): [{'page': 1}],
+    }
+
+
+def test_rule_automaton_skips_unmatched_subtrees():
+    rs = TosserRuleSet()
+    rs.add(TosserRule(['$', 'meta', 'address'], ['city']))
+    automaton = rs.compile()
+
+    assert automaton.start.step('users') is None
+    meta = automaton.start.step('meta')
+    assert meta is not None and meta.matched == []
+    address = meta.step('address')
+    assert address.terminal and address.matched == rs.rules
+    assert automaton.start.step('meta') is meta
+
+
+def test_rule_state_default():
+    assert TosserRule(['$', 'users'], ['*']).state is TosserRuleState.UNKNOWN
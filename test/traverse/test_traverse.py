@@ -0,0 +1,61 @@
+from tosser.object import TosserObject
+from tosser import traverse
+from tosser.traverse import Traverser, TrailToken, TrailTokenType, ROOT_ID, index_token
+
+
+def _flatten(trail):
+    return [(token.val, token.type) for token in trail]
+
+
+def test_traverse_trails():
+    data = {'a': 1, 'b': {'c': [2, {'d': 3}], 'e': {}}, 'f': []}
+    results = [(_flatten(trail), key, value) for trail, key, value in Traverser().traverse(TosserObject(metadata={}, data=data))]
+
+    K, I = TrailTokenType.KEY, TrailTokenType.INDEX
+    assert results == [
+        ([(ROOT_ID, K), ('a', K)], 'a', 1),
+        ([(ROOT_ID, K), ('b', K), ('c', K), (0, I)], 0, 2),
+        ([(ROOT_ID, K), ('b', K), ('c', K), (1, I), ('d', K)], 'd', 3),
+    ]
+
+
+def test_traverse_shared_tokens_and_shape():
+    data = {'items': [{'x': 1}, {'x': 2}]}
+    (first, _, _), (second, _, _) = Traverser().traverse(TosserObject(metadata={}, data=data))
+
+    assert first[-1] is second[-1]
+    assert first.parent is not second.parent
+    assert first.parent.parent is second.parent.parent
+    assert first.shape == second.shape == (ROOT_ID, 'items', None, 'x')
+    assert first.to_list() == [
+        TrailToken(ROOT_ID, TrailTokenType.KEY),
+        TrailToken('items', TrailTokenType.KEY),
+        TrailToken(0, TrailTokenType.INDEX),
+        TrailToken('x', TrailTokenType.KEY),
+    ]
+    assert Traverser.get_trail_string(second) == '$.items.[1].x'
+
+
+def test_index_tokens_capped(monkeypatch):
+    monkeypatch.setattr(traverse, 'TRAIL_INTERN_MAX_INDEX', 8)
+    monkeypatch.setattr(traverse, '_index_tokens', [])
+
+    assert index_token(3) is index_token(3)
+    # tokens past the cap are made on demand and not kept
+    assert index_token(100) == TrailToken(100, TrailTokenType.INDEX)
+    assert index_token(100) is not index_token(100)
+    assert len(traverse._index_tokens) == 4
+
+
+def test_traverse_deep_nesting():
+    depth = 5000
+    data = value = {}
+    for _ in range(depth):
+        value['n'] = {}
+        value = value['n']
+    value['leaf'] = True
+
+    (trail, key, leaf), = Traverser().traverse(TosserObject(metadata={}, data=data))
+    assert key == 'leaf' and leaf is True
+    assert len(trail) == depth + 2
+    assert trail.shape[-2:] == ('n', 'leaf')